@@ -0,0 +1,80 @@
+// DeltaGrid.js
+// Client side of delta_viz.py: keeps the layout and the drivers in memory
+// and applies the per-step diffs sent by the server.
+
+const DeltaGridModule = function (canvas_width, canvas_height, grid_width, grid_height) {
+  const parent = document.getElementById("elements");
+  const canvas = document.createElement("canvas");
+  Object.assign(canvas, {
+    width: canvas_width,
+    height: canvas_height,
+    style: "border:1px dotted",
+  });
+  parent.appendChild(canvas);
+  const ctx = canvas.getContext("2d");
+
+  let width = grid_width;
+  let height = grid_height;
+  let staticCells = [];
+  let bays = {};
+  let drivers = {};
+
+  const drawCell = function (cell) {
+    // cell = [x, y, shape, color, size, text]
+    const cw = canvas.width / width;
+    const ch = canvas.height / height;
+    const x = cell[0];
+    // Mesa draws y = 0 at the bottom
+    const y = height - 1 - cell[1];
+    const shape = cell[2];
+    const size = cell[4];
+
+    ctx.fillStyle = cell[3];
+    if (shape === "circle") {
+      ctx.beginPath();
+      ctx.arc((x + 0.5) * cw, (y + 0.5) * ch, (size * Math.min(cw, ch)) / 2, 0, 2 * Math.PI);
+      ctx.fill();
+    } else {
+      const w = size * cw;
+      const h = size * ch;
+      ctx.fillRect((x + 0.5) * cw - w / 2, (y + 0.5) * ch - h / 2, w, h);
+    }
+    if (cell[5]) {
+      ctx.fillStyle = "white";
+      ctx.textAlign = "center";
+      ctx.textBaseline = "middle";
+      ctx.fillText(cell[5], (x + 0.5) * cw, (y + 0.5) * ch);
+    }
+  };
+
+  const redraw = function () {
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    Object.values(bays).forEach(drawCell);
+    staticCells.forEach(drawCell);
+    Object.values(drivers).forEach(drawCell);
+  };
+
+  this.render = function (data) {
+    if (data.full) {
+      width = data.width;
+      height = data.height;
+      staticCells = data.static;
+      bays = data.bays;
+      drivers = data.drivers;
+    } else {
+      Object.assign(bays, data.bays);
+      Object.assign(drivers, data.moved);
+      data.removed.forEach(function (id) {
+        delete drivers[id];
+      });
+    }
+    redraw();
+  };
+
+  this.reset = function () {
+    staticCells = [];
+    bays = {};
+    drivers = {};
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+  };
+};
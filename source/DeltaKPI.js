@@ -0,0 +1,41 @@
+// DeltaKPI.js
+// Client side of delta_viz.DeltaKPIPanel: a KPI table updated with only the
+// values that changed.
+
+const DeltaKPIModule = function (labels) {
+  const parent = document.getElementById("elements");
+  const panel = document.createElement("div");
+  panel.style.cssText =
+    "position: fixed; top: 100px; left: 20px; width: 280px; background-color: white;" +
+    "border: 1px solid #ddd; border-radius: 8px; font-family: monospace; font-size: 13px;" +
+    "padding: 15px; z-index: 1000;";
+  const table = document.createElement("table");
+  table.style.width = "100%";
+  const cells = {};
+  labels.forEach(function (pair) {
+    const row = table.insertRow();
+    row.insertCell().textContent = pair[1];
+    const value = row.insertCell();
+    value.style.textAlign = "right";
+    cells[pair[0]] = value;
+  });
+  panel.appendChild(table);
+  parent.appendChild(panel);
+
+  this.render = function (data) {
+    if (data.full) {
+      Object.values(cells).forEach(function (cell) {
+        cell.textContent = "";
+      });
+    }
+    Object.keys(data.values).forEach(function (key) {
+      if (cells[key]) cells[key].textContent = data.values[key];
+    });
+  };
+
+  this.reset = function () {
+    Object.values(cells).forEach(function (cell) {
+      cell.textContent = "";
+    });
+  };
+};
@@ -0,0 +1,118 @@
+# bench_startup.py
+"""
+Cold-start benchmark for headless workers.
+
+Each repeat starts a fresh interpreter and imports the target module, the
+way a spawned pool worker does. It records the wall time of the whole
+process and the time spent in the import. One extra run with
+`-X importtime` lists the top-level packages that cost the most. Any
+visualization or export module that really got imported (rather than
+deferred by lazy_imports.py) is an error.
+
+    python bench_startup.py                         # import headless, 7 repeats, 350 ms budget
+    python bench_startup.py --target district --budget-ms 400
+    python bench_startup.py --eager                 # same with deferral off, for comparison
+
+The exit status is 1 if the median process time exceeds --budget-ms or a
+heavy module was loaded.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Must not be imported by a headless worker unless used
+HEAVY_MODULES = ["mesa_viz_tornado", "tornado", "pandas", "networkx", "pyarrow", "matplotlib", "server", "delta_viz"]
+
+_CHILD = """
+import json, sys, time
+t = time.perf_counter()
+import {target}
+import_ms = (time.perf_counter() - t) * 1000
+import lazy_imports
+print(json.dumps({{
+    "import_ms": import_ms,
+    "modules": len(sys.modules),
+    "loaded": [n for n in {heavy!r} if lazy_imports.is_loaded(n)],
+}}))
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _env(eager):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (HERE, env.get("PYTHONPATH")) if p)
+    env.pop("PARKING_EAGER_IMPORTS", None)
+    if eager:
+        env["PARKING_EAGER_IMPORTS"] = "1"
+    return env
+
+
+def measure(target="headless", repeats=7, eager=False):
+    """One dict per fresh process: wall_ms, import_ms, modules, loaded."""
+    code = _CHILD.format(target=target, heavy=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=_env(eager),
+                             capture_output=True, text=True, check=True)
+        wall_ms = (time.perf_counter() - start) * 1000
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result["wall_ms"] = wall_ms
+        runs.append(result)
+    return runs
+
+
+def import_profile(target="headless", top=10, eager=False):
+    """[(cumulative_ms, package)] for the costliest top-level packages (python -X importtime)."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"], cwd=HERE,
+                         env=_env(eager), capture_output=True, text=True, check=True)
+    totals = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if not cumulative.strip().isdigit() or "." in name:
+            continue
+        totals[name] = max(totals.get(name, 0), int(cumulative) / 1000)
+    return sorted(((ms, name) for name, ms in totals.items()), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import time of a headless worker")
+    parser.add_argument("--target", default="headless", help="module a worker imports first")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=350.0, help="limit for the median process time")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--eager", action="store_true", help="disable deferred imports")
+    args = parser.parse_args()
+
+    runs = measure(args.target, args.repeats, args.eager)
+    wall = statistics.median(r["wall_ms"] for r in runs)
+    imported = statistics.median(r["import_ms"] for r in runs)
+    loaded = sorted({n for r in runs for n in r["loaded"]})
+
+    print(f"{args.target}: median process {wall:.0f} ms, import {imported:.0f} ms, "
+          f"{runs[0]['modules']} modules ({args.repeats} fresh processes{', eager' if args.eager else ''})")
+    print("slowest top-level imports:")
+    for ms, name in import_profile(args.target, args.top, args.eager):
+        print(f"  {ms:8.1f} ms  {name}")
+
+    failed = False
+    if loaded:
+        print(f"heavy modules imported: {', '.join(loaded)}")
+        failed = not args.eager
+    if wall > args.budget_ms:
+        print(f"over budget: {wall:.0f} ms > {args.budget_ms:.0f} ms")
+        failed = True
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
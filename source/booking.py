@@ -0,0 +1,324 @@
+# booking.py
+"""
+Online reservation booking.
+
+With the "online-booking" reservation policy, bays start with no
+reservations and booking requests arrive during the day. Each request for
+[start, end) is checked against lot-wide bookable capacity over
+[start - margin_of_safety, end). That capacity is held in a segment tree
+over time steps with range-min queries and lazy range-add updates, so each
+decision takes O(log T) time regardless of how many bays or bookings
+there are.
+
+Overbooking works in expectation. A booking uses 1 unit of capacity, and
+a public car already committed to a VIP bay (it will certainly be there)
+uses 1 / (1 - miss_probability). Total capacity is
+n_bays / (1 - miss_probability), so expected occupancy never exceeds the
+bays. With overbooking off, capacity is n_bays and a booking uses exactly
+one bay.
+
+Every bay's free gaps between commitments (bookings, with their margin,
+and public cars) sit in a GapIndex. An accepted booking goes into the gap
+that starts latest at or before its blocked window and lasts to its end,
+found in O(log T). A public car holds its bay until it has driven there
+and parked for its stay. When the bay actually frees, the hold is settled
+to that step. If no gap fits, an overbooked request goes to the bay that
+frees up first; if both drivers show up, the second is reseated on
+arrival. Without overbooking such a request is rejected.
+
+Requests arrive every day, each for a stay later that same day. Both
+indexes span one day plus a spill-over from `origin` on, and are rebuilt
+from the live commitments when a new day starts, so runs of any length
+keep O(log T) decisions with T about one day.
+"""
+import bisect
+import math
+
+from model import Reservation, VIPParkingSpace
+
+
+class CapacityTree:
+    """Segment tree over steps [origin, origin + size): range add and range min, both O(log size)."""
+
+    def __init__(self, size, initial, origin=0):
+        self.size = max(1, size)
+        self.origin = origin
+        n = 1
+        while n < self.size:
+            n *= 2
+        self.n = n
+        self.low = [initial] * (2 * n)
+        self.lazy = [0.0] * (2 * n)
+        # Padding beyond `size` must never be the minimum
+        for i in range(self.size, n):
+            self.low[n + i] = math.inf
+        for i in range(n - 1, 0, -1):
+            self.low[i] = min(self.low[2 * i], self.low[2 * i + 1])
+
+    def _add(self, node, lo, hi, a, b, delta):
+        if b <= lo or hi <= a:
+            return
+        if a <= lo and hi <= b:
+            self.low[node] += delta
+            self.lazy[node] += delta
+            return
+        mid = (lo + hi) // 2
+        self._add(2 * node, lo, mid, a, b, delta)
+        self._add(2 * node + 1, mid, hi, a, b, delta)
+        self.low[node] = min(self.low[2 * node], self.low[2 * node + 1]) + self.lazy[node]
+
+    def _min(self, node, lo, hi, a, b):
+        if b <= lo or hi <= a:
+            return math.inf
+        if a <= lo and hi <= b:
+            return self.low[node]
+        mid = (lo + hi) // 2
+        return min(self._min(2 * node, lo, mid, a, b), self._min(2 * node + 1, mid, hi, a, b)) + self.lazy[node]
+
+    def add(self, start, end, delta):
+        start, end = max(0, start - self.origin), min(self.size, end - self.origin)
+        if start < end:
+            self._add(1, 0, self.n, start, end, delta)
+
+    def min(self, start, end):
+        start, end = max(0, start - self.origin), min(self.size, end - self.origin)
+        if start >= end:
+            return math.inf
+        return self._min(1, 0, self.n, start, end)
+
+
+class GapIndex:
+    """
+    Free gaps (start, end, bay) of every bay, in a max segment tree over the
+    gap's start step from `origin` on (earlier starts share the first leaf).
+    find(at, until) returns the gap starting latest at or before `at` among
+    those lasting to `until` or later, in O(log size).
+    """
+
+    def __init__(self, size, origin=0):
+        self.size = max(1, size)
+        self.origin = origin
+        n = 1
+        while n < self.size:
+            n *= 2
+        self.n = n
+        self.high = [-math.inf] * (2 * n)
+        self.leaves = [[] for _ in range(self.size)]    # sorted (end, bay id) of the gaps starting here
+
+    def _update(self, i):
+        leaf = self.leaves[i]
+        node = self.n + i
+        self.high[node] = leaf[-1][0] if leaf else -math.inf
+        node //= 2
+        while node:
+            self.high[node] = max(self.high[2 * node], self.high[2 * node + 1])
+            node //= 2
+
+    def add(self, start, end, bay_id):
+        i = max(0, start - self.origin)
+        if i < self.size:
+            bisect.insort(self.leaves[i], (end, bay_id))
+            self._update(i)
+
+    def remove(self, start, end, bay_id):
+        i = max(0, start - self.origin)
+        if i < self.size:
+            leaf = self.leaves[i]
+            del leaf[bisect.bisect_left(leaf, (end, bay_id))]
+            self._update(i)
+
+    def find(self, at, until):
+        """Bay id of the best-fitting gap covering [at, until), or None."""
+        at = min(max(0, at - self.origin), self.size - 1)
+        return self._find(1, 0, self.n, at, until)
+
+    def _find(self, node, lo, hi, at, until):
+        if lo > at or self.high[node] < until:
+            return None
+        if hi - lo == 1:
+            return self.leaves[lo][-1][1]
+        mid = (lo + hi) // 2
+        found = self._find(2 * node + 1, mid, hi, at, until)
+        return found if found is not None else self._find(2 * node, lo, mid, at, until)
+
+
+class BookingEngine:
+    # Steps a public car takes to pull into and out of its bay, on top of the drive there
+    PARKING_SLACK = 3
+
+    def __init__(self, model, horizon=None):
+        self.model = model
+        policy = model.reservation_policy
+        self.margin = policy.margin_of_safety
+        self.miss_probability = policy.miss_probability
+        self.overbooking = getattr(policy, "overbooking", False)
+        self.booking_prob = getattr(policy, "booking_prob", 0.0)
+        self.lead_min = getattr(policy, "lead_min", 60)
+        self.lead_max = getattr(policy, "lead_max", 300)
+
+        self.bays = [s for s in model.parking_spaces if isinstance(s, VIPParkingSpace)]
+        show_rate = 1.0 - self.miss_probability if self.overbooking else 1.0
+        self.hold_weight = 1.0 / show_rate if show_rate > 0 else math.inf
+        # Steps the indexes span: a day, plus stays and public holds running past its end
+        self.horizon = horizon or model.day_length_steps + 600
+        self.capacity = len(self.bays) / show_rate if show_rate > 0 else math.inf
+        self.origin = 0
+        self.tree = CapacityTree(self.horizon, self.capacity)
+
+        # Per bay: commitments {reservation or "public": (start, end)} and the free gaps between them
+        self.gaps = GapIndex(self.horizon)
+        self._busy = {s.unique_id: {} for s in self.bays}
+        self._gaps = {s.unique_id: [] for s in self.bays}
+        # (step the bay's last commitment ends, bay id), sorted
+        self.bay_free_from = sorted((0, s.unique_id) for s in self.bays)
+        self._free_from = {s.unique_id: 0 for s in self.bays}
+
+        self.requested = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.overbooked = 0
+        self.reseated = 0
+
+        # Reservations that already exist (e.g. pre-generated) take their share
+        for space in self.bays:
+            for res in space.reservations:
+                self.tree.add(res.start - self.margin, res.end, -1.0)
+                self._busy[space.unique_id][res] = (res.start - self.margin, res.end)
+            self._refresh(space.unique_id)
+
+    # ---- bay bookkeeping ----
+    def _refresh(self, bay_id):
+        """Recompute one bay's gaps in the index and its place in bay_free_from (O(k log T), k = its commitments)."""
+        now = self.model.current_step
+        busy = self._busy[bay_id]
+        for key in [k for k, (_, end) in busy.items() if end <= now and k != "public"]:
+            del busy[key]
+
+        for start, end in self._gaps[bay_id]:
+            self.gaps.remove(start, end, bay_id)
+        gaps = []
+        cursor = 0
+        for start, end in sorted(busy.values()):
+            if start > cursor:
+                gaps.append((cursor, start))
+            cursor = max(cursor, end)
+        gaps.append((cursor, math.inf))
+        for start, end in gaps:
+            self.gaps.add(start, end, bay_id)
+        self._gaps[bay_id] = gaps
+
+        old = self._free_from[bay_id]
+        if cursor != old:
+            del self.bay_free_from[bisect.bisect_left(self.bay_free_from, (old, bay_id))]
+            bisect.insort(self.bay_free_from, (cursor, bay_id))
+            self._free_from[bay_id] = cursor
+
+    # ---- events ----
+    def request(self, start, end):
+        """Book [start, end) if capacity allows; returns the scheduled entry or None."""
+        self.requested += 1
+        now = self.model.current_step
+        blocked_start = start - self.margin
+        if start <= now or end > self.origin + self.horizon or self.tree.min(blocked_start, end) < 1.0 - 1e-9:
+            self.rejected += 1
+            return None
+
+        bay_id = self.gaps.find(blocked_start, end)
+        if bay_id is None:
+            if not self.overbooking:
+                # Capacity is there in total but spread over bays that each clash somewhere
+                self.rejected += 1
+                return None
+            bay_id = self.bay_free_from[0][1]
+            self.overbooked += 1
+        space = self.model.space_by_id[bay_id]
+        self.tree.add(blocked_start, end, -1.0)
+
+        res = Reservation(start=start, end=end, miss_probability=self.miss_probability, rng=self.model.random)
+        self._busy[bay_id][res] = (blocked_start, end)
+        self._refresh(bay_id)
+        # Same spawn window as the pre-generated schedule, clipped to the future
+        window = (max(start - 20, now + 1), max(start - 5, now + 1))
+        entry = self.model.lifecycle.add_reservation(space, res, window)
+        self.accepted += 1
+        return entry
+
+    def hold_public(self, space, start, leaves):
+        """A public driver has been given VIP bay `space` at `start` and should leave it at `leaves`."""
+        if not isinstance(space, VIPParkingSpace):
+            return
+        end = leaves + self.PARKING_SLACK
+        self.tree.add(start, end, -self.hold_weight)
+        self._busy[space.unique_id]["public"] = (start, end)
+        self._refresh(space.unique_id)
+
+    def release(self, space):
+        """The bay is free again: settle its public hold (if any) to the step it really ended."""
+        hold = self._busy.get(space.unique_id, {}).pop("public", None)
+        if hold is None:
+            return
+        start, end = hold
+        now = self.model.current_step
+        if now < end:
+            self.tree.add(now, end, self.hold_weight)
+        elif now > end:
+            self.tree.add(end, now, -self.hold_weight)
+        self._refresh(space.unique_id)
+
+    def reseat(self, entry):
+        """Before spawning a reserved driver, move the booking off a bay that is still taken."""
+        space = entry["space"]
+        res = entry["reservation"]
+        now = self.model.current_step
+        if not space.occupied and not space.allocated:
+            return
+        bay_id = self.gaps.find(now, res.end)
+        if bay_id is None:
+            return
+        other = self.model.space_by_id[bay_id]
+        if other.occupied or other.allocated:
+            return
+        space.reservations.remove(res)
+        other.reservations.append(res)
+        other.reservations.sort(key=lambda r: r.start)
+        entry["space"] = other
+        self._busy[space.unique_id].pop(res, None)
+        self._busy[bay_id][res] = (res.start - self.margin, res.end)
+        self._refresh(space.unique_id)
+        self._refresh(bay_id)
+        self.reseated += 1
+
+    def _new_day(self, day_start):
+        """Move both indexes to start at `day_start` and re-add what is still committed."""
+        self.origin = day_start
+        self.tree = CapacityTree(self.horizon, self.capacity, origin=day_start)
+        self.gaps = GapIndex(self.horizon, origin=day_start)
+        for bay_id, busy in self._busy.items():
+            self._gaps[bay_id] = []
+            self._refresh(bay_id)
+            for key, (start, end) in busy.items():
+                self.tree.add(start, end, -self.hold_weight if key == "public" else -1.0)
+
+    def on_step(self, step):
+        """Generate this step's booking request, if any: a stay later the same day."""
+        day = self.model.day_length_steps
+        day_start = step - step % day
+        if day_start != self.origin:
+            self._new_day(day_start)
+        rng = self.model.random
+        if self.booking_prob <= 0 or rng.random() >= self.booking_prob:
+            return None
+        start = step + rng.randint(self.lead_min, self.lead_max)
+        if start >= day_start + day - 150:
+            return None
+        end = min(start + rng.randint(350, 550), day_start + day)
+        return self.request(start, end)
+
+    def stats(self):
+        return {
+            "bookings_requested": self.requested,
+            "bookings_accepted": self.accepted,
+            "bookings_rejected": self.rejected,
+            "bookings_overbooked": self.overbooked,
+            "bookings_reseated": self.reseated,
+        }
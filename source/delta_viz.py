@@ -0,0 +1,248 @@
+# delta_viz.py
+"""
+Delta-only state streaming for the web visualization.
+
+CanvasGrid re-portrays every agent (including every static bay and gate) on
+every tick. The elements here send the static layout once and afterwards only
+what changed: drivers that moved / appeared / left, bays whose occupied or
+reserved flag flipped, and KPI values that changed. FrameSkipServer lets the
+model run several steps per browser frame so the view only samples it.
+
+ModularServer shares one set of elements among all open tabs, so the diff
+state is kept per viewer: the socket handler names the viewer before each
+render and drops its state when the tab closes.
+"""
+import os
+
+import tornado.escape
+from mesa.visualization.ModularVisualization import ModularServer, SocketHandler, VisualizationElement
+
+from model import Driver, Gate, ParkingSpace, VIPParkingSpace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _compact(portrayal):
+    """Shrink a portrayal dict to the few fields the JS module draws."""
+    shape = portrayal.get("Shape", "rect")
+    size = portrayal.get("r", portrayal.get("w", 0.9))
+    return [shape, portrayal.get("Color", "#000"), size, portrayal.get("text", "")]
+
+
+class _PerViewer:
+    """Diff state kept separately for each viewer (websocket) of a shared element."""
+
+    viewer = None
+
+    def set_viewer(self, key):
+        self.viewer = key
+
+    def drop_viewer(self, key):
+        self._viewers.pop(key, None)
+
+    def request_full(self):
+        """Force the next render for the current viewer to resend everything (new client)."""
+        self._viewers.pop(self.viewer, None)
+
+    def _state(self):
+        state = self._viewers.get(self.viewer)
+        if state is None:
+            state = self._viewers[self.viewer] = self._new_state()
+        return state
+
+
+class DeltaGrid(_PerViewer, VisualizationElement):
+    """Grid view that streams the layout once and per-step diffs afterwards."""
+
+    local_includes = ["DeltaGrid.js"]
+    local_dir = HERE
+
+    def __init__(self, portrayal_method, grid_width, grid_height,
+                 canvas_width=500, canvas_height=500):
+        super().__init__()
+        self.portrayal_method = portrayal_method
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.js_code = (
+            f"elements.push(new DeltaGridModule({canvas_width}, {canvas_height}, "
+            f"{grid_width}, {grid_height}));"
+        )
+        self._viewers = {}
+
+    @staticmethod
+    def _new_state():
+        return {
+            "model_key": None,
+            "drivers": {},   # unique_id -> (pos, state)
+            "bays": {},      # unique_id -> (occupied, is_reserved)
+        }
+
+    def _bay_key(self, space):
+        return (space.occupied, getattr(space, "is_reserved", False))
+
+    def _full_frame(self, model, state):
+        static = []
+        bays = {}
+        state["bays"] = known_bays = {}
+        for agent in model.scheduler.agents:
+            if isinstance(agent, Gate):
+                static.append([agent.pos[0], agent.pos[1]] + _compact(self.portrayal_method(agent)))
+            elif isinstance(agent, ParkingSpace):
+                known_bays[agent.unique_id] = self._bay_key(agent)
+                bays[agent.unique_id] = [agent.pos[0], agent.pos[1]] + _compact(self.portrayal_method(agent))
+
+        state["drivers"] = known_drivers = {}
+        drivers = {}
+        for agent in model.scheduler.agents:
+            if isinstance(agent, Driver) and agent.pos is not None:
+                known_drivers[agent.unique_id] = (agent.pos, agent.state)
+                drivers[agent.unique_id] = [agent.pos[0], agent.pos[1]] + _compact(self.portrayal_method(agent))
+
+        return {
+            "full": True,
+            "width": self.grid_width,
+            "height": self.grid_height,
+            "static": static,
+            "bays": bays,
+            "drivers": drivers,
+        }
+
+    def render(self, model):
+        state = self._state()
+        if state["model_key"] != id(model):
+            state["model_key"] = id(model)
+            return self._full_frame(model, state)
+        known_bays = state["bays"]
+        known_drivers = state["drivers"]
+
+        # --- bays whose flags changed ---
+        bays = {}
+        for space in model.parking_spaces:
+            key = self._bay_key(space)
+            if known_bays.get(space.unique_id) != key:
+                known_bays[space.unique_id] = key
+                bays[space.unique_id] = [space.pos[0], space.pos[1]] + _compact(self.portrayal_method(space))
+
+        # --- drivers that moved, changed state or appeared ---
+        moved = {}
+        seen = set()
+        for agent in model.scheduler.agents:
+            if not isinstance(agent, Driver) or agent.pos is None:
+                continue
+            seen.add(agent.unique_id)
+            key = (agent.pos, agent.state)
+            if known_drivers.get(agent.unique_id) != key:
+                known_drivers[agent.unique_id] = key
+                moved[agent.unique_id] = [agent.pos[0], agent.pos[1]] + _compact(self.portrayal_method(agent))
+
+        removed = [uid for uid in known_drivers if uid not in seen]
+        for uid in removed:
+            del known_drivers[uid]
+
+        return {"full": False, "bays": bays, "moved": moved, "removed": removed}
+
+
+class DeltaKPIPanel(_PerViewer, VisualizationElement):
+    """KPI table that only sends values that changed since the last frame."""
+
+    local_includes = ["DeltaKPI.js"]
+    local_dir = HERE
+
+    # (key, label, format) in display order
+    FIELDS = [
+        ("step", "Step", "{}"),
+        ("arrivals", "Total Arrivals", "{}"),
+        ("did_not_enter", "Did Not Enter", "{}"),
+        ("total_queue_time", "Total Queue Time", "{}"),
+        ("queued_drivers", "Queued Drivers", "{}"),
+        ("avg_queue_time", "Avg Queue Time", "{:.2f}"),
+        ("queue_wait_p95", "Queue Time p95", "{:.0f}"),
+        ("queue_length", "In Queue Now", "{}"),
+        ("reservation_mode", "Reservation Mode", "{}"),
+        ("reservations_fulfilled", "Reservations Fulfilled", "{}"),
+        ("reservations_missed", "Reservations Not Fulfilled", "{}"),
+        ("reservation_revenue", "Reservations Extra Revenue", "€{:.2f}"),
+        ("strategy", "Strategy", "{}"),
+        ("rate", "Rate (€/min)", "€{:.3f}"),
+        ("revenue", "Total Revenue", "€{:.2f}"),
+        ("turnaways_price", "Lost (Price)", "{}"),
+        ("occupancy", "Occupancy", "{:.1%}"),
+        ("avg_occupancy", "Avg Occupancy", "{:.1%}"),
+    ]
+
+    def __init__(self):
+        super().__init__()
+        labels = [[key, label] for key, label, _ in self.FIELDS]
+        self.js_code = f"elements.push(new DeltaKPIModule({tornado.escape.json_encode(labels)}));"
+        self._viewers = {}
+
+    @staticmethod
+    def _new_state():
+        return {"model_key": None, "last": {}}
+
+    def render(self, model):
+        kpi = model.kpi_summary()
+        state = self._state()
+        full = state["model_key"] != id(model)
+        if full:
+            state["model_key"] = id(model)
+            state["last"] = {}
+
+        last = state["last"]
+        changed = {}
+        for key, _, fmt in self.FIELDS:
+            text = fmt.format(kpi[key])
+            if last.get(key) != text:
+                last[key] = text
+                changed[key] = text
+        return {"full": full, "values": changed}
+
+
+class FrameSkipSocketHandler(SocketHandler):
+    """Advances the model `frame_skip` steps per browser frame; element diff state is per tab."""
+
+    def _bind(self):
+        for element in self.application.visualization_elements:
+            if hasattr(element, "set_viewer"):
+                element.set_viewer(id(self))
+
+    def open(self):
+        # A new (or reloaded) page has no layout yet
+        self._bind()
+        for element in self.application.visualization_elements:
+            if hasattr(element, "request_full"):
+                element.request_full()
+        super().open()
+
+    def on_close(self):
+        for element in self.application.visualization_elements:
+            if hasattr(element, "drop_viewer"):
+                element.drop_viewer(id(self))
+
+    def on_message(self, message):
+        self._bind()
+        msg = tornado.escape.json_decode(message)
+        if msg["type"] != "get_step":
+            super().on_message(message)
+            return
+
+        app = self.application
+        if not app.model.running or getattr(app.model, "current_step", 0) >= app.max_steps:
+            self.write_message({"type": "end"})
+            return
+
+        for _ in range(app.frame_skip):
+            if getattr(app.model, "current_step", 0) >= app.max_steps or not app.model.running:
+                break
+            app.model.step()
+        self.write_message(self.viz_state_message)
+
+
+class FrameSkipServer(ModularServer):
+    socket_handler = (r"/ws", FrameSkipSocketHandler)
+
+    def __init__(self, *args, frame_skip=1, **kwargs):
+        self.frame_skip = max(1, int(frame_skip))
+        super().__init__(*args, **kwargs)
+        # ModularServer hard-codes its /ws route; host rules added later take precedence
+        self.add_handlers(r".*", [self.socket_handler])
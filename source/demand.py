@@ -0,0 +1,254 @@
+# demand.py
+"""
+Demand sources: where arriving drivers come from.
+
+SyntheticDemand is the original generator (hourly Bernoulli arrivals, the
+three-part duration mixture, lognormal willingness to pay) and is the
+default. TraceDemand replays recorded gate logs (CSV or Parquet) and streams
+them in chunks, so traces bigger than memory can drive long runs.
+
+    ParkingLotModel(..., demand_source=("trace", {"path": "gate_log.csv"}))
+"""
+import csv
+import math
+from collections import deque
+from datetime import datetime
+
+
+class ArrivalRequest:
+    """
+    One arriving driver. None fields are filled in by the model the same way
+    the synthetic generator would (duration from parking_duration_steps, WTP
+    from the source's draw_wtp).
+    """
+
+    __slots__ = ("duration", "reserved", "rate_paid", "wtp", "route")
+
+    def __init__(self, duration=None, reserved=False, rate_paid=None, wtp=None, route=()):
+        self.duration = duration
+        self.reserved = reserved
+        self.rate_paid = rate_paid
+        self.wtp = wtp
+        self.route = route          # lots already tried, when diverted between lots
+
+    def __repr__(self):
+        return (f"ArrivalRequest(duration={self.duration}, reserved={self.reserved}, "
+                f"rate_paid={self.rate_paid}, wtp={self.wtp})")
+
+
+class DemandSource:
+    name = None
+    params = {}
+
+    # Synthetic demand stops 100 steps before the day ends and shares its
+    # arrival slot with scheduled reservations; recorded demand does neither.
+    closes_before_day_end = False
+    shares_slots_with_reservations = False
+
+    def requests(self, model, step):
+        """Arrivals at `step` (a list of ArrivalRequest)."""
+        return []
+
+    def extra_requests(self, model, step):
+        """Arrivals that never take the reservation slot (e.g. drivers diverted from another lot)."""
+        return []
+
+    def draw_wtp(self, model):
+        """Willingness to pay for a request that doesn't carry one."""
+        return math.inf
+
+    def spec(self):
+        return (self.name, dict(self.params))
+
+
+class SyntheticDemand(DemandSource):
+    name = "synthetic"
+    closes_before_day_end = True
+    shares_slots_with_reservations = True
+
+    def __init__(self, wtp_median=0.044, wtp_sigma=0.34):
+        self.params = {"wtp_median": wtp_median, "wtp_sigma": wtp_sigma}
+        self.wtp_mu = math.log(wtp_median)
+        self.wtp_sigma = wtp_sigma
+
+    def requests(self, model, step):
+        p = model.arrival_prob_at_step(step)
+        if model.random.random() < p:
+            return [ArrivalRequest()]
+        return []
+
+    def draw_wtp(self, model):
+        return model.random.lognormvariate(self.wtp_mu, self.wtp_sigma)
+
+
+# ---------------- Trace replay ----------------
+def _csv_chunks(path, chunk_rows):
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _parquet_chunks(path, chunk_rows):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError("Reading Parquet traces needs pyarrow (pip install pyarrow).") from exc
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pylist()
+
+
+def _parse_time(value):
+    """Numbers are taken as minutes; anything else as an ISO timestamp."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value))
+
+
+def _truthy(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "t")
+    return bool(value)
+
+
+class TraceDemand(DemandSource):
+    """
+    Arrivals from a recorded log with columns (names configurable):
+
+        timestamp   minutes since start, or an ISO date-time
+        duration    minutes parked
+        reserved    1/0 or true/false
+        rate_paid   optional €/min actually paid; taken as the driver's WTP, so
+                    the driver is turned away if the simulated rate is higher
+
+    Rows must be sorted by timestamp. Only `chunk_rows` rows plus the current
+    look-ahead are held in memory.
+    """
+
+    name = "trace"
+
+    def __init__(self, path, step_minutes=1.0, start=None, chunk_rows=10000, columns=None, fmt=None):
+        self.params = {"path": path, "step_minutes": step_minutes, "start": start,
+                       "chunk_rows": chunk_rows, "columns": columns, "fmt": fmt}
+        self.path = path
+        self.step_minutes = step_minutes
+        self.start = _parse_time(start) if start is not None else None
+        self.chunk_rows = chunk_rows
+        self.columns = {"timestamp": "timestamp", "duration": "duration",
+                        "reserved": "reserved", "rate_paid": "rate_paid"}
+        self.columns.update(columns or {})
+        fmt = fmt or ("parquet" if str(path).endswith((".parquet", ".pq")) else "csv")
+        self._chunks = _parquet_chunks(path, chunk_rows) if fmt == "parquet" else _csv_chunks(path, chunk_rows)
+        self._pending = deque()
+        self.exhausted = False
+        self.rows_read = 0
+
+    def _step_of(self, ts):
+        if self.start is None:
+            self.start = ts
+        if isinstance(ts, datetime):
+            minutes = (ts - self.start).total_seconds() / 60.0
+        else:
+            minutes = ts - self.start
+        return int(minutes // self.step_minutes)
+
+    def _to_request(self, row):
+        cols = self.columns
+        duration = row.get(cols["duration"])
+        rate = row.get(cols["rate_paid"])
+        return ArrivalRequest(
+            duration=max(1, int(round(float(duration) / self.step_minutes))) if duration not in (None, "") else None,
+            reserved=_truthy(row.get(cols["reserved"], False)),
+            rate_paid=float(rate) if rate not in (None, "") else None,
+        )
+
+    def _fill(self):
+        """Pull the next chunk into the look-ahead buffer."""
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.exhausted = True
+            return False
+        for row in chunk:
+            step = self._step_of(_parse_time(row[self.columns["timestamp"]]))
+            self._pending.append((step, self._to_request(row)))
+        self.rows_read += len(chunk)
+        return True
+
+    def requests(self, model, step):
+        # Steps are 1-based in the model; trace step 0 arrives at model step 1
+        trace_step = step - 1
+        out = []
+        while True:
+            while self._pending and self._pending[0][0] <= trace_step:
+                out.append(self._pending.popleft()[1])
+            if self._pending or self.exhausted or not self._fill():
+                break
+        return out
+
+    def draw_wtp(self, model):
+        # A recorded driver with no rate on file accepted whatever was charged
+        return math.inf
+
+
+# ---------------- Externally fed ----------------
+class InboxDemand(DemandSource):
+    """
+    Arrivals pushed in from outside (see district.py), on top of an optional
+    base source. Requests delivered before a step arrive at that step, after
+    the base source's own arrivals.
+    """
+
+    name = "inbox"
+
+    def __init__(self, base="synthetic"):
+        self.params = {"base": base}
+        self.base = make_demand_source(base) if base is not None else None
+        self.closes_before_day_end = self.base.closes_before_day_end if self.base else False
+        self.shares_slots_with_reservations = self.base.shares_slots_with_reservations if self.base else False
+        self.inbox = []
+
+    def deliver(self, requests):
+        self.inbox.extend(requests)
+
+    def requests(self, model, step):
+        return self.base.requests(model, step) if self.base is not None else []
+
+    def extra_requests(self, model, step):
+        out, self.inbox = self.inbox, []
+        return out
+
+    def draw_wtp(self, model):
+        return self.base.draw_wtp(model) if self.base is not None else math.inf
+
+
+DEMAND_SOURCES = {
+    "synthetic": SyntheticDemand,
+    "trace": TraceDemand,
+    "inbox": InboxDemand,
+}
+
+
+def make_demand_source(spec):
+    """Build a demand source from None, a name, (name, params) or an instance."""
+    if spec is None:
+        return SyntheticDemand()
+    if isinstance(spec, DemandSource):
+        return spec
+    params = {}
+    if isinstance(spec, (tuple, list)):
+        spec, params = spec
+    if spec not in DEMAND_SOURCES:
+        raise ValueError(f"Unknown demand source '{spec}'. Known: {sorted(DEMAND_SOURCES)}")
+    return DEMAND_SOURCES[spec](**(params or {}))
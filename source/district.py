@@ -0,0 +1,291 @@
+# district.py
+"""
+Several parking lots in one district on a shared clock.
+
+Each lot is an ordinary ParkingLotModel whose demand source is wrapped in an
+InboxDemand. The District coordinator:
+
+  * optionally routes a district-wide demand trace to lots by catchment
+    weight (otherwise each lot keeps its own demand source);
+  * collects every lot's turnaways (price or queue balking) and sends the
+    driver, with the same WTP and stay length, to the nearest lot it has not
+    tried yet, arriving after the travel time between the two.
+
+Lots can run in-process or each in its own worker process. Messages are
+batched: one message per lot per `sync_every` steps carries all arrivals
+for that window, and one reply carries its turnaways and current state.
+A diverted driver therefore arrives no earlier than the next window.
+
+    district = District([
+        {"name": "north", "params": {"parking_strategy": "Dynamic Pricing"}, "neighbors": {"south": 8}},
+        {"name": "south", "params": {"parking_strategy": "Standard"}, "neighbors": {"north": 8}},
+    ], seed=1, processes=True, sync_every=5)
+    district.run(1000)
+    district.summary()
+    district.close()
+"""
+import argparse
+import multiprocessing
+import random
+from collections import defaultdict
+
+from demand import ArrivalRequest, InboxDemand, make_demand_source
+from headless import expand_params
+from model import ParkingLotModel
+
+DEFAULT_TRAVEL_STEPS = 10
+
+# Request tuples sent between coordinator and lots: (duration, wtp, reserved, rate_paid, route)
+
+
+class LotRunner:
+    """One lot of the district; advances its model and reports turnaways."""
+
+    def __init__(self, name, params, seed=None, own_demand=True):
+        self.name = name
+        kwargs = expand_params(params)
+        base = kwargs.pop("demand_source", None) or "synthetic"
+        self.inbox = InboxDemand(base=base if own_demand else None)
+        self.model = ParkingLotModel(seed=seed, demand_source=self.inbox, **kwargs)
+        self.model.turnaway_log = []
+        self._result = None
+
+    def advance(self, deliveries, steps):
+        """
+        Step the lot `steps` times. `deliveries` maps a step to the request
+        tuples arriving at it. Returns (turnaways, state), with turnaways as
+        (step, reason, duration, wtp, route).
+        """
+        model = self.model
+        turnaways = []
+        for _ in range(steps):
+            due = deliveries.get(model.current_step + 1)
+            if due:
+                self.inbox.deliver([
+                    ArrivalRequest(duration=d, wtp=w, reserved=r, rate_paid=p, route=route)
+                    for d, w, r, p, route in due
+                ])
+            model.step()
+            for request, reason in model.turnaway_log:
+                turnaways.append((model.current_step, reason, request.duration, request.wtp, tuple(request.route)))
+            model.turnaway_log.clear()
+        return turnaways, self.state()
+
+    def state(self):
+        m = self.model
+        return {
+            "step": m.current_step,
+            "rate": m.current_per_minute_rate,
+            "occupancy": m.current_occupancy,
+            "queue_length": len(m.main_gate_queue),
+        }
+
+    def kpis(self):
+        return self.model.kpi_summary()
+
+    # Same start/finish protocol as _RemoteLot, so the coordinator treats both alike
+    def start(self, deliveries, steps):
+        self._result = self.advance(deliveries, steps)
+
+    def finish(self):
+        result, self._result = self._result, None
+        return result
+
+    def close(self):
+        pass
+
+
+def _lot_worker(conn, name, params, seed, own_demand):
+    runner = LotRunner(name, params, seed=seed, own_demand=own_demand)
+    while True:
+        msg = conn.recv()
+        if msg[0] == "advance":
+            conn.send(runner.advance(msg[1], msg[2]))
+        elif msg[0] == "kpis":
+            conn.send(runner.kpis())
+        elif msg[0] == "stop":
+            conn.close()
+            return
+
+
+class _RemoteLot:
+    """A LotRunner living in a worker process, driven over a pipe."""
+
+    def __init__(self, name, params, seed=None, own_demand=True):
+        self.name = name
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_lot_worker, args=(child, name, params, seed, own_demand), daemon=True
+        )
+        self.process.start()
+        child.close()
+
+    def start(self, deliveries, steps):
+        self.conn.send(("advance", deliveries, steps))
+
+    def finish(self):
+        return self.conn.recv()
+
+    def kpis(self):
+        self.conn.send(("kpis",))
+        return self.conn.recv()
+
+    def close(self):
+        if self.process.is_alive():
+            self.conn.send(("stop",))
+            self.process.join(timeout=5)
+        self.conn.close()
+
+
+class District:
+    """
+    `lots` is a list of {"name", "params", "neighbors": {name: travel_steps},
+    "weight"}. Without "neighbors" every other lot is DEFAULT_TRAVEL_STEPS
+    away. `demand` is an optional district-wide trace (a demand spec); its
+    requests go to lots in proportion to "weight" and the lots then have no
+    demand of their own.
+    """
+
+    def __init__(self, lots, seed=None, processes=False, sync_every=1, divert_prob=1.0, max_hops=2, demand=None):
+        self.rng = random.Random(seed)
+        self.sync_every = max(1, sync_every)
+        self.divert_prob = divert_prob
+        self.max_hops = max_hops
+        self.current_step = 0
+
+        self.demand = make_demand_source(demand) if demand is not None else None
+        if self.demand is not None and self.demand.name == "synthetic":
+            raise ValueError("District-wide demand must be a recorded trace; give each lot its own synthetic demand instead.")
+
+        names = [lot["name"] for lot in lots]
+        if len(set(names)) != len(names):
+            raise ValueError("Lot names must be unique.")
+        self.names = names
+        self.neighbors = {
+            lot["name"]: dict(lot.get("neighbors") or {n: DEFAULT_TRAVEL_STEPS for n in names if n != lot["name"]})
+            for lot in lots
+        }
+        self.weights = [lot.get("weight", 1.0) for lot in lots]
+
+        lot_cls = _RemoteLot if processes else LotRunner
+        self.lots = {}
+        for i, lot in enumerate(lots):
+            lot_seed = seed * 1000 + i if seed is not None else None
+            self.lots[lot["name"]] = lot_cls(lot["name"], lot.get("params") or {}, seed=lot_seed,
+                                             own_demand=self.demand is None)
+
+        self.pending = {name: defaultdict(list) for name in names}   # lot -> step -> request tuples
+        self.states = {}
+        self.turnaways = {"price": 0, "queue": 0}
+        self.diverted = 0
+        self.lost = 0
+
+    def _route_demand(self, first, last):
+        for step in range(first, last + 1):
+            for req in self.demand.requests(None, step):
+                target = self.rng.choices(self.names, weights=self.weights)[0]
+                self.pending[target][step].append((req.duration, req.wtp, req.reserved, req.rate_paid, ()))
+
+    def _divert(self, origin, turnaway):
+        step, reason, duration, wtp, route = turnaway
+        self.turnaways[reason] = self.turnaways.get(reason, 0) + 1
+        route = route + (origin,)
+        candidates = [(travel, name) for name, travel in self.neighbors[origin].items() if name not in route]
+        if len(route) > self.max_hops or not candidates or self.rng.random() >= self.divert_prob:
+            self.lost += 1
+            return
+        travel, target = min(candidates, key=lambda c: (c[0], self.rng.random()))
+        due = max(step + travel, self.current_step + 1)
+        self.pending[target][due].append((duration, wtp, False, None, route))
+        self.diverted += 1
+
+    def run(self, steps):
+        end = self.current_step + steps
+        while self.current_step < end:
+            window = min(self.sync_every, end - self.current_step)
+            first, last = self.current_step + 1, self.current_step + window
+            if self.demand is not None:
+                self._route_demand(first, last)
+
+            # Send every lot its window first so worker processes run in parallel
+            for name, lot in self.lots.items():
+                pending = self.pending[name]
+                deliveries = {s: pending.pop(s) for s in [s for s in pending if s <= last]}
+                lot.start(deliveries, window)
+            replies = {name: lot.finish() for name, lot in self.lots.items()}
+
+            self.current_step = last
+            for name, (turnaways, state) in replies.items():
+                self.states[name] = state
+                for turnaway in turnaways:
+                    self._divert(name, turnaway)
+        return self.summary()
+
+    def summary(self):
+        lots = {name: lot.kpis() for name, lot in self.lots.items()}
+        arrivals = sum(k["arrivals"] for k in lots.values())
+        return {
+            "lots": lots,
+            "district": {
+                "step": self.current_step,
+                "drivers": arrivals - self.diverted,      # each diverted driver was counted by two lots
+                "lot_arrivals": arrivals,
+                "revenue": sum(k["revenue"] for k in lots.values()),
+                "turnaways_price": self.turnaways.get("price", 0),
+                "turnaways_queue": self.turnaways.get("queue", 0),
+                "diverted": self.diverted,
+                "lost": self.lost,
+                "in_transit": sum(len(v) for p in self.pending.values() for v in p.values()),
+            },
+        }
+
+    def close(self):
+        for lot in self.lots.values():
+            lot.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def ring_district(n_lots, strategies=("Standard", "Dynamic Pricing", "Reservations"), travel_steps=DEFAULT_TRAVEL_STEPS):
+    """n lots on a ring road, strategies assigned round-robin, each next to its two neighbours."""
+    lots = []
+    for i in range(n_lots):
+        neighbors = {}
+        if n_lots > 1:
+            neighbors[f"lot-{(i - 1) % n_lots}"] = travel_steps
+            neighbors[f"lot-{(i + 1) % n_lots}"] = travel_steps
+        lots.append({
+            "name": f"lot-{i}",
+            "params": {"parking_strategy": strategies[i % len(strategies)]},
+            "neighbors": neighbors,
+        })
+    return lots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-lot district simulation with turnaway diversion")
+    parser.add_argument("--lots", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", action="store_true", help="run each lot in its own worker process")
+    parser.add_argument("--sync-every", type=int, default=1, help="steps per coordinator message exchange")
+    parser.add_argument("--travel", type=int, default=DEFAULT_TRAVEL_STEPS, help="steps between neighbouring lots")
+    parser.add_argument("--max-hops", type=int, default=2)
+    args = parser.parse_args()
+
+    district = District(ring_district(args.lots, travel_steps=args.travel), seed=args.seed,
+                        processes=args.processes, sync_every=args.sync_every, max_hops=args.max_hops)
+    with district:
+        summary = district.run(args.steps)
+    for name, k in summary["lots"].items():
+        print(f"{name:8s} {k['strategy']:16s} arrivals={k['arrivals']:5d} turned away={k['did_not_enter']:5d} "
+              f"revenue={k['revenue']:10.2f} avg occ={k['avg_occupancy']:.2f}")
+    print(summary["district"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# equivalence.py
+"""
+Reference-equivalence checks for alternate engines.
+
+Runs the reference ParkingLotModel and a candidate engine on the same
+scenarios and seeds, then compares them two ways:
+
+  * exact: if both engines produce per-step traces (the same RNG stream,
+    e.g. a ParkingLotModel subclass with faster lookups), the traces must
+    agree step by step; the first divergence is reported;
+  * distribution: KPIs across seeds (revenue, average queue time, average
+    occupancy by default) are compared with Welch's t-test and the
+    two-sample Kolmogorov-Smirnov test. A metric fails if either p-value
+    is below alpha (Bonferroni-corrected over the metrics).
+
+    python equivalence.py --engine batched --seeds 40
+    python equivalence.py --engine mymodule:FastParkingLotModel --mode exact
+
+The exit status is 0 only if every check passes.
+
+An engine is a callable engine(params, seeds, steps) that returns one
+(kpis, trace or None) per seed. model_engine(cls) turns any class with
+ParkingLotModel's constructor into one.
+"""
+import argparse
+import importlib
+import json
+import math
+import multiprocessing
+import sys
+
+from headless import expand_params
+from model import ParkingLotModel
+
+DEFAULT_METRICS = ["revenue", "avg_queue_time", "avg_occupancy"]
+DEFAULT_SCENARIOS = [
+    {"parking_strategy": "Standard"},
+    {"parking_strategy": "Dynamic Pricing"},
+    {"parking_strategy": "Reservations"},
+]
+
+# Per-step trace fields; every engine that emits traces must use these
+TRACE_FIELDS = ["step", "arrivals", "turnaways_price", "turnaways_queue", "parked", "occupied", "queue_length", "revenue"]
+
+
+# ---------------- Engines ----------------
+def _trace_row(model):
+    return (
+        model.current_step,
+        model.total_arrivals,
+        model.total_price_turnaways,
+        model.total_not_entered_long_queue,
+        model.parked_count,
+        model.occupied_count,
+        len(model.main_gate_queue),
+        round(model.total_revenue, 6),
+    )
+
+
+def _run_model(args):
+    cls, params, seed, steps = args
+    kwargs = expand_params(params)
+    model = cls(seed=seed, **kwargs)
+    trace = []
+    model.step_observers.append(lambda m: trace.append(_trace_row(m)))
+    for _ in range(steps or kwargs["day_length_steps"]):
+        model.step()
+    return model.kpi_summary(), trace
+
+
+def model_engine(cls, processes=None):
+    """Engine for any ParkingLotModel-compatible class; emits per-step traces."""
+
+    def engine(params, seeds, steps=None):
+        jobs = [(cls, params, seed, steps) for seed in seeds]
+        if processes == 1 or len(jobs) == 1:
+            return [_run_model(job) for job in jobs]
+        with multiprocessing.Pool(processes=processes) as pool:
+            return pool.map(_run_model, jobs)
+
+    engine.__name__ = cls.__name__
+    return engine
+
+
+def batched_engine(params, seeds, steps=None):
+    """BatchedParkingLot: all seeds in one lockstep batch; no traces."""
+    from batched import BatchedParkingLot
+
+    engine = BatchedParkingLot(params, replications=len(seeds), seed=seeds[0] if seeds else None)
+    engine.run(steps)
+    return [(row, None) for row in engine.rows()]
+
+
+ENGINES = {
+    "reference": lambda processes=None: model_engine(ParkingLotModel, processes),
+    "batched": lambda processes=None: batched_engine,
+}
+
+
+def load_engine(spec, processes=None):
+    """A registered name, or "module:attr" naming an engine callable or a model class."""
+    if spec in ENGINES:
+        return ENGINES[spec](processes)
+    module, _, attr = spec.partition(":")
+    obj = getattr(importlib.import_module(module), attr)
+    if isinstance(obj, type):
+        return model_engine(obj, processes)
+    return obj
+
+
+# ---------------- Statistics ----------------
+def _betacf(a, b, x):
+    """Continued fraction for the incomplete beta function (Lentz)."""
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 1e-12:
+            break
+    return h
+
+
+def _betai(a, b, x):
+    """Regularised incomplete beta I_x(a, b)."""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    ln = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x)
+    if x < (a + 1) / (a + b + 2):
+        return math.exp(ln) * _betacf(a, b, x) / a
+    return 1.0 - math.exp(ln) * _betacf(b, a, 1 - x) / b
+
+
+def welch_t_test(x, y):
+    """(t, two-sided p) for Welch's unequal-variance t-test."""
+    nx, ny = len(x), len(y)
+    if nx < 2 or ny < 2:
+        return 0.0, 1.0
+    mx, my = sum(x) / nx, sum(y) / ny
+    vx = sum((v - mx) ** 2 for v in x) / (nx - 1)
+    vy = sum((v - my) ** 2 for v in y) / (ny - 1)
+    se2 = vx / nx + vy / ny
+    if se2 == 0:
+        return 0.0, (1.0 if mx == my else 0.0)
+    t = (mx - my) / math.sqrt(se2)
+    df = se2 ** 2 / ((vx / nx) ** 2 / (nx - 1) + (vy / ny) ** 2 / (ny - 1))
+    p = _betai(df / 2, 0.5, df / (df + t * t))
+    return t, p
+
+
+def ks_test(x, y):
+    """(D, asymptotic two-sided p) for the two-sample Kolmogorov-Smirnov test."""
+    xs, ys = sorted(x), sorted(y)
+    nx, ny = len(xs), len(ys)
+    if not nx or not ny:
+        return 0.0, 1.0
+    i = j = 0
+    d = 0.0
+    while i < nx and j < ny:
+        v = min(xs[i], ys[j])
+        while i < nx and xs[i] == v:
+            i += 1
+        while j < ny and ys[j] == v:
+            j += 1
+        d = max(d, abs(i / nx - j / ny))
+    en = math.sqrt(nx * ny / (nx + ny))
+    lam = (en + 0.12 + 0.11 / en) * d
+    if lam < 1e-3:
+        return d, 1.0
+    p = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * lam * lam) for k in range(1, 101))
+    return d, min(max(p, 0.0), 1.0)
+
+
+# ---------------- Comparison ----------------
+def compare_traces(ref, alt, tolerance=1e-6):
+    """None if equal, else {"step", "field", "reference", "candidate"} at the first divergence."""
+    for a, b in zip(ref, alt):
+        for name, u, v in zip(TRACE_FIELDS, a, b):
+            if u != v and not (isinstance(u, float) and abs(u - v) <= tolerance):
+                return {"step": a[0], "field": name, "reference": u, "candidate": v}
+    if len(ref) != len(alt):
+        return {"step": min(len(ref), len(alt)) + 1, "field": "length", "reference": len(ref), "candidate": len(alt)}
+    return None
+
+
+def check_scenario(reference, candidate, params, seeds, steps=None, metrics=None, alpha=0.01, mode="auto"):
+    metrics = metrics or DEFAULT_METRICS
+    ref_runs = reference(params, seeds, steps)
+    alt_runs = candidate(params, seeds, steps)
+    result = {"params": params, "seeds": len(seeds), "passed": True}
+
+    have_traces = all(t is not None for _, t in ref_runs) and all(t is not None for _, t in alt_runs)
+    if mode == "exact" and not have_traces:
+        raise ValueError("Exact mode needs both engines to produce traces.")
+    if have_traces and mode in ("auto", "exact"):
+        divergences = {}
+        for seed, (_, rt), (_, at) in zip(seeds, ref_runs, alt_runs):
+            diff = compare_traces(rt, at)
+            if diff is not None:
+                divergences[seed] = diff
+        result["exact"] = {"identical_seeds": len(seeds) - len(divergences), "divergences": divergences}
+        if divergences:
+            result["passed"] = False
+
+    if mode in ("auto", "distribution"):
+        level = alpha / len(metrics)
+        tests = {}
+        for metric in metrics:
+            x = [float(k[metric]) for k, _ in ref_runs]
+            y = [float(k[metric]) for k, _ in alt_runs]
+            t, p_t = welch_t_test(x, y)
+            d, p_ks = ks_test(x, y)
+            ok = p_t >= level and p_ks >= level
+            tests[metric] = {
+                "reference_mean": sum(x) / len(x),
+                "candidate_mean": sum(y) / len(y),
+                "t": t, "p_t": p_t, "ks": d, "p_ks": p_ks,
+                "passed": ok,
+            }
+            if not ok:
+                result["passed"] = False
+        result["distribution"] = {"alpha": alpha, "per_test_alpha": level, "metrics": tests}
+    return result
+
+
+def run_checks(candidate, reference=None, scenarios=None, seeds=range(30), steps=None, metrics=None,
+               alpha=0.01, mode="auto"):
+    """Pass/fail report over `scenarios` (lists of headless params)."""
+    reference = reference or model_engine(ParkingLotModel)
+    seeds = list(seeds)
+    results = [
+        check_scenario(reference, candidate, params, seeds, steps, metrics, alpha, mode)
+        for params in (scenarios or DEFAULT_SCENARIOS)
+    ]
+    return {"passed": all(r["passed"] for r in results), "scenarios": results}
+
+
+def format_report(report):
+    lines = []
+    for r in report["scenarios"]:
+        lines.append(f"{'PASS' if r['passed'] else 'FAIL'}  {r['params']}  ({r['seeds']} seeds)")
+        exact = r.get("exact")
+        if exact is not None:
+            lines.append(f"      exact traces: {exact['identical_seeds']}/{r['seeds']} identical")
+            for seed, diff in list(exact["divergences"].items())[:3]:
+                lines.append(f"        seed {seed}: step {diff['step']} {diff['field']} "
+                             f"{diff['reference']} != {diff['candidate']}")
+        dist = r.get("distribution")
+        if dist is not None:
+            for metric, t in dist["metrics"].items():
+                lines.append(
+                    f"      {metric:16s} ref={t['reference_mean']:.4g} cand={t['candidate_mean']:.4g} "
+                    f"p_t={t['p_t']:.3f} p_ks={t['p_ks']:.3f} {'ok' if t['passed'] else 'DIFFERS'}"
+                )
+    lines.append("PASSED" if report["passed"] else "FAILED")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check an engine against the reference ParkingLotModel")
+    parser.add_argument("--engine", default="batched", help="registered name or module:attr")
+    parser.add_argument("--strategies", nargs="*", default=None)
+    parser.add_argument("--seeds", type=int, default=30)
+    parser.add_argument("--steps", type=int, default=None)
+    parser.add_argument("--alpha", type=float, default=0.01)
+    parser.add_argument("--mode", choices=["auto", "exact", "distribution"], default="auto")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--out", default=None, help="also write the report as JSON")
+    args = parser.parse_args()
+
+    scenarios = [{"parking_strategy": s} for s in args.strategies] if args.strategies else None
+    report = run_checks(
+        load_engine(args.engine, args.processes),
+        reference=model_engine(ParkingLotModel, args.processes),
+        scenarios=scenarios, seeds=range(args.seeds), steps=args.steps, alpha=args.alpha, mode=args.mode,
+    )
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
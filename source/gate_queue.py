@@ -0,0 +1,181 @@
+# gate_queue.py
+from collections import OrderedDict
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate (P-square algorithm, Jain & Chlamtac 1985).
+    Keeps 5 markers, so memory and update cost are O(1) no matter how many
+    observations are added.
+    """
+
+    def __init__(self, q):
+        if not 0.0 < q < 1.0:
+            raise ValueError(f"Quantile {q} must be in (0, 1).")
+        self.q = q
+        self.count = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+
+        # First 5 observations are kept exactly
+        if len(self._heights) < 5:
+            self._heights.append(x)
+            self._heights.sort()
+            return
+
+        h = self._heights
+        n = self._positions
+
+        # Find the cell k the new observation falls into
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = 0
+            while k < 3 and x >= h[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Adjust the three middle markers
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if not h[i - 1] < candidate < h[i + 1]:
+                    candidate = self._linear(i, d)
+                h[i] = candidate
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        h = self._heights
+        n = self._positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i, d):
+        h = self._heights
+        n = self._positions
+        return h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+
+    def value(self):
+        if not self._heights:
+            return 0.0
+        if self.count <= 5:
+            # Exact quantile (nearest rank) while we still hold every sample
+            idx = min(int(self.q * len(self._heights)), len(self._heights) - 1)
+            return float(self._heights[idx])
+        return float(self._heights[2])
+
+
+class WaitQuantiles:
+    """p50 / p95 / p99 of queue wait times, plus the count and sum."""
+
+    def __init__(self, quantiles=(0.50, 0.95, 0.99)):
+        self.sketches = {q: P2Quantile(q) for q in quantiles}
+        self.count = 0
+        self.total = 0
+
+    def add(self, wait):
+        self.count += 1
+        self.total += wait
+        for sketch in self.sketches.values():
+            sketch.add(wait)
+
+    def mean(self):
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def percentile(self, q):
+        return self.sketches[q].value()
+
+    def summary(self):
+        out = {f"p{round(q * 100)}": s.value() for q, s in self.sketches.items()}
+        out["mean"] = self.mean()
+        out["count"] = self.count
+        return out
+
+
+class GateQueue:
+    """
+    Explicit FIFO queue of drivers waiting to pass a gate.
+
+    Drivers join when they first get blocked on their lane and leave when the
+    gate admits them. Membership, order and entry step are kept in an
+    OrderedDict, so length, head-of-line lookup, join and leave are all O(1).
+    The head is the queued driver standing on the gate itself: a car that
+    pulls up to the gate moves to the front, since it may have joined after
+    cars behind it that were blocked earlier. Queues of one lot can share a
+    WaitQuantiles so the percentiles cover every gate.
+    """
+
+    def __init__(self, name, gate_pos, wait_stats=None):
+        self.name = name
+        self.gate_pos = gate_pos
+        self._members = OrderedDict()   # driver unique_id -> (driver, entry_step)
+        self._head = None               # unique_id of the member on the gate cell
+        self.wait_stats = wait_stats if wait_stats is not None else WaitQuantiles()
+        self.total_joined = 0
+        self.max_length = 0
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, driver):
+        return driver.unique_id in self._members
+
+    def join(self, driver, step):
+        if driver.unique_id in self._members:
+            return
+        self._members[driver.unique_id] = (driver, step)
+        self.total_joined += 1
+        if len(self._members) > self.max_length:
+            self.max_length = len(self._members)
+        self.advance(driver)
+
+    def advance(self, driver):
+        """Call after a queued driver moves; on the gate cell it becomes the head."""
+        if driver.pos == self.gate_pos and driver.unique_id in self._members:
+            self._members.move_to_end(driver.unique_id, last=False)
+            self._head = driver.unique_id
+
+    def leave(self, driver, step):
+        """Remove `driver` and return its wait in steps (None if not queued)."""
+        entry = self._members.pop(driver.unique_id, None)
+        if entry is None:
+            return None
+        if self._head == driver.unique_id:
+            self._head = None
+        wait = step - entry[1]
+        self.wait_stats.add(wait)
+        return wait
+
+    def head(self):
+        """Driver waiting on the gate cell, or None if the gate is clear."""
+        if self._head is None:
+            return None
+        return self._members[self._head][0]
+
+    def is_head(self, driver):
+        return self._head == driver.unique_id
+
+    def entry_step(self, driver):
+        entry = self._members.get(driver.unique_id)
+        return entry[1] if entry else None
+
+    def drivers(self):
+        """Drivers in line, head first."""
+        return [d for d, _ in self._members.values()]
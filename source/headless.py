@@ -0,0 +1,351 @@
+# headless.py
+"""
+Headless (no browser) runs of ParkingLotModel, single or as a process pool.
+
+    python headless.py --runs 8 --processes 4 --monitor-port 8765
+
+Every run returns one flat row: the scenario parameters, the seed and the
+KPIs from ParkingLotModel.kpi_summary().
+
+Importing this module defers Mesa's visualization stack, pandas and
+networkx until first use (lazy_imports.py), so pool workers start with
+only the core simulation loaded.
+"""
+import argparse
+import csv
+import multiprocessing
+import queue as queue_mod
+import threading
+import time
+
+import lazy_imports
+
+# Before anything imports mesa: no visualization, pandas or networkx in workers unless used
+lazy_imports.defer()
+
+from model import ParkingLotModel
+from policies import STRATEGY_DEFAULTS
+
+# Same scenario as the web server
+DEFAULT_PARAMS = {
+    "width": 50,
+    "height": 20,
+    "n_spaces": 10,
+    "parking_strategy": "Dynamic Pricing",
+    "reservation_percent": 0.20,
+    "reservation_hold_time": 30,
+    "day_length_steps": 1000,
+    "arrival_prob": 0.7,
+    "has_reservation_lane": False,
+}
+
+
+# Flat sweep parameters that are really policy parameters
+RESERVATION_SHORTCUTS = {"margin_of_safety": "margin_of_safety", "miss_probability": "miss_probability"}
+PRICING_SHORTCUTS = {"price_a": "a", "price_b": "b"}
+DEMAND_SHORTCUTS = {"wtp_median": "wtp_median", "wtp_sigma": "wtp_sigma"}
+
+# The policies each group of shortcuts means something to
+RESERVATION_SHORTCUT_POLICIES = ("vip-schedule", "online-booking")
+PRICING_SHORTCUT_POLICIES = ("quadratic-occupancy",)
+DEMAND_SHORTCUT_POLICIES = ("synthetic",)
+
+
+def _with_params(spec, extra, flat, accepts):
+    """(name, params) for `spec` with the shortcut parameters merged in; ValueError if they don't apply."""
+    if isinstance(spec, (tuple, list)):
+        name, params = spec
+    elif isinstance(spec, str):
+        name, params = spec, {}
+    else:
+        raise ValueError(f"{', '.join(flat)} cannot be combined with the policy instance {spec!r}; "
+                         f"pass them to its constructor instead")
+    if name not in accepts:
+        raise ValueError(f"{', '.join(flat)} can only be used with {' / '.join(accepts)}, not '{name}'; "
+                         f"choose one of those explicitly")
+    return (name, dict(params or {}, **extra))
+
+
+def expand_params(params):
+    """
+    Turn flat sweep parameters into ParkingLotModel keyword arguments, e.g.
+    margin_of_safety=30 becomes reservation_policy=("vip-schedule", {...}) and
+    price_a / price_b set the quadratic-occupancy curve and wtp_median /
+    wtp_sigma the synthetic demand's willingness to pay. Shortcuts never
+    switch policies: price_a on a flat-priced strategy, or any shortcut next
+    to a policy instance, raises ValueError.
+    """
+    kwargs = dict(DEFAULT_PARAMS)
+    kwargs.update(params or {})
+    kwargs.setdefault("results_path", None)
+    defaults = STRATEGY_DEFAULTS.get(kwargs["parking_strategy"], STRATEGY_DEFAULTS["Standard"])
+
+    flat = [k for k in kwargs if k in RESERVATION_SHORTCUTS]
+    if flat:
+        reservation = {RESERVATION_SHORTCUTS[k]: kwargs.pop(k) for k in flat}
+        kwargs["reservation_policy"] = _with_params(kwargs.get("reservation_policy") or defaults[2], reservation,
+                                                    flat, RESERVATION_SHORTCUT_POLICIES)
+
+    flat = [k for k in kwargs if k in PRICING_SHORTCUTS]
+    if flat:
+        pricing = {PRICING_SHORTCUTS[k]: kwargs.pop(k) for k in flat}
+        kwargs["pricing_policy"] = _with_params(kwargs.get("pricing_policy") or defaults[0], pricing,
+                                                flat, PRICING_SHORTCUT_POLICIES)
+
+    flat = [k for k in kwargs if k in DEMAND_SHORTCUTS]
+    if flat:
+        demand = {DEMAND_SHORTCUTS[k]: kwargs.pop(k) for k in flat}
+        kwargs["demand_source"] = _with_params(kwargs.get("demand_source") or "synthetic", demand,
+                                               flat, DEMAND_SHORTCUT_POLICIES)
+    return kwargs
+
+
+def build_model(params, seed=None):
+    return ParkingLotModel(seed=seed, **expand_params(params))
+
+
+def run_scenario(params=None, seed=None, steps=None, monitor=None, run_id=None, publish_every=25,
+                 cache=None, collect_series=False, trajectory_path=None, steady_state=None):
+    """
+    Run one scenario to `steps` (default: one day) and return its KPI row.
+
+    `monitor` is anything with publish(run_id, model, total_steps, started) and
+    finish(run_id, kpis) - a MonitorSnapshot in-process, or a QueueReporter
+    inside pool workers. With a ResultCache, identical (arguments, seed,
+    steps, code version) runs are served from disk. collect_series=True adds
+    the DataCollector series to the row under "series". trajectory_path
+    records every driver's path for replay (see trajectory.py); it bypasses
+    the cache, since the point is to produce the recording.
+
+    steady_state (True or SteadyStateMonitor options) truncates the warm-up
+    from the averaged KPIs and ends the run once they settle; `steps` is
+    then an upper bound.
+    """
+    kwargs = expand_params(params)
+    steps = steps or kwargs["day_length_steps"]
+    run_id = run_id if run_id is not None else f"seed-{seed}"
+
+    key = None
+    if cache is not None and trajectory_path is None:
+        from result_cache import scenario_key
+        key = scenario_key(dict(kwargs, steady_state=steady_state), seed, steps)
+        hit = cache.get(key, with_series=collect_series)
+        if hit is not None:
+            row, series = hit
+            if monitor is not None:
+                monitor.finish(run_id, row)
+            if collect_series:
+                row["series"] = series
+            return row
+
+    model = ParkingLotModel(seed=seed, **kwargs)
+    recorder = None
+    if trajectory_path is not None:
+        from trajectory import TrajectoryRecorder
+        recorder = TrajectoryRecorder(trajectory_path, model)
+        model.step_observers.append(recorder)
+    steady = None
+    if steady_state:
+        from steady_state import SteadyStateMonitor
+        steady = SteadyStateMonitor(**(steady_state if isinstance(steady_state, dict) else {}))
+        model.step_observers.append(steady)
+
+    started = time.time()
+    try:
+        for _ in range(steps):
+            model.step()
+            if not model.running:
+                break
+            if monitor is not None and model.current_step % publish_every == 0:
+                monitor.publish(run_id, model, total_steps=steps, started=started)
+    finally:
+        if recorder is not None:
+            recorder.close()
+    elapsed = time.time() - started
+
+    kpis = model.kpi_summary()
+    if monitor is not None:
+        monitor.finish(run_id, kpis)
+
+    row = dict(params or {})
+    row["seed"] = seed
+    row.update(kpis)
+    if steady is not None:
+        row.update(steady.summary())
+    row["wall_seconds"] = elapsed
+    row["steps_per_second"] = model.current_step / elapsed if elapsed > 0 else None
+
+    series = dict(model.datacollector.model_vars) if collect_series else None
+    if key is not None:
+        cache.put(key, row, series)
+    if collect_series:
+        row["series"] = series
+    return row
+
+
+# ---------- Process pool ----------
+class QueueReporter:
+    """Monitor stand-in for pool workers: forwards updates over a queue."""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def publish(self, run_id, model, total_steps=None, started=None):
+        now = time.time()
+        elapsed = now - started if started else None
+        self.queue.put((run_id, {
+            "step": model.current_step,
+            "total_steps": total_steps,
+            "progress": model.current_step / total_steps if total_steps else None,
+            "steps_per_second": model.current_step / elapsed if elapsed else None,
+            "status": "running",
+            "updated": now,
+            "kpis": model.kpi_summary(),
+        }))
+
+    def finish(self, run_id, kpis=None):
+        self.queue.put((run_id, {"status": "done", "progress": 1.0, "updated": time.time(), "kpis": kpis}))
+
+
+def _pool_worker(job):
+    params, seed, steps, run_id, queue, cache, steady_state, trajectory_path = job
+    reporter = QueueReporter(queue) if queue is not None else None
+    return run_scenario(params, seed=seed, steps=steps, monitor=reporter, run_id=run_id, cache=cache,
+                        trajectory_path=trajectory_path, steady_state=steady_state)
+
+
+def _indexed_worker(job):
+    index, job = job
+    return index, _pool_worker(job)
+
+
+def _drain(queue, snapshot, stop):
+    while not stop.is_set() or not queue.empty():
+        try:
+            run_id, fields = queue.get(timeout=0.2)
+        except queue_mod.Empty:
+            continue
+        snapshot.update(run_id, **fields)
+
+
+def run_replications(jobs, processes=None, steps=None, snapshot=None, cache=None, steady_state=None,
+                     trajectory_path=None):
+    """
+    Run `jobs` (an iterable of (params, seed) pairs) on a process pool and
+    return their rows in job order. If `snapshot` (a MonitorSnapshot) is
+    given, worker progress is streamed into it while the pool runs; with a
+    ResultCache, finished scenarios are reused. With trajectory_path, job i
+    records its trajectory to "<trajectory_path>-run-<i>".
+    """
+    jobs = list(jobs)
+    with multiprocessing.Manager() as manager:
+        queue = manager.Queue() if snapshot is not None else None
+        stop = threading.Event()
+        drainer = None
+        if snapshot is not None:
+            for i, (_, seed) in enumerate(jobs):
+                snapshot.update(f"run-{i}", status="queued", seed=seed, progress=0.0)
+            drainer = threading.Thread(target=_drain, args=(queue, snapshot, stop), daemon=True)
+            drainer.start()
+
+        tasks = [(params, seed, steps, f"run-{i}", queue, cache, steady_state,
+                  f"{trajectory_path}-run-{i}" if trajectory_path else None)
+                 for i, (params, seed) in enumerate(jobs)]
+        with multiprocessing.Pool(processes=processes) as pool:
+            rows = pool.map(_pool_worker, tasks, chunksize=1)
+
+        stop.set()
+        if drainer is not None:
+            drainer.join()
+    return rows
+
+
+def iter_replications(jobs, processes=None, steps=None, cache=None, steady_state=None):
+    """
+    Like run_replications, but yields (job index, row) as each run finishes,
+    so callers can record results before the whole batch is done.
+    """
+    tasks = [(i, (params, seed, steps, f"run-{i}", None, cache, steady_state, None))
+             for i, (params, seed) in enumerate(jobs)]
+    with multiprocessing.Pool(processes=processes) as pool:
+        yield from pool.imap_unordered(_indexed_worker, tasks, chunksize=1)
+
+
+def write_rows(rows, path):
+    if not rows:
+        return
+    fields = []
+    for row in rows:
+        for key in row:
+            if key not in fields:
+                fields.append(key)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless parking lot runs")
+    parser.add_argument("--runs", type=int, default=1, help="replications (seeds 0..runs-1)")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--steps", type=int, default=None, help="steps per run (default: one day)")
+    parser.add_argument("--strategy", default=DEFAULT_PARAMS["parking_strategy"])
+    parser.add_argument("--pricing", nargs="*", default=None,
+                        help="pricing policies to benchmark side by side (see policies.py)")
+    parser.add_argument("--grid-backend", choices=["dense", "sparse"], default="dense",
+                        help="sparse stores only occupied cells (large layouts)")
+    parser.add_argument("--out", default="headless_results.csv")
+    parser.add_argument("--cache", default=None, help="SQLite result cache to reuse finished runs")
+    parser.add_argument("--trajectory", default=None,
+                        help="record driver trajectories to this path, or to <path>-run-<i> per job when there are "
+                             "several (replay with run.py --replay)")
+    parser.add_argument("--monitor-port", type=int, default=None,
+                        help="serve live progress on this port (0 = any free port)")
+    parser.add_argument("--steady-state", action="store_true",
+                        help="drop the warm-up from averaged KPIs and stop once they settle "
+                             "(--steps is the cap, default 60 days)")
+    parser.add_argument("--precision", type=float, default=0.05,
+                        help="relative CI half-width that counts as settled (with --steady-state)")
+    args = parser.parse_args()
+
+    snapshot = monitor = None
+    if args.monitor_port is not None:
+        from monitor import LiveMonitor, MonitorSnapshot
+        snapshot = MonitorSnapshot()
+        monitor = LiveMonitor(snapshot, port=args.monitor_port).start()
+        print(f"Live monitor on http://127.0.0.1:{monitor.port}/")
+
+    cache = None
+    if args.cache:
+        from result_cache import ResultCache
+        cache = ResultCache(args.cache)
+
+    params = {"parking_strategy": args.strategy}
+    if args.grid_backend != "dense":
+        params["grid_backend"] = args.grid_backend
+    variants = [params]
+    if args.pricing:
+        variants = [dict(params, pricing_policy=name) for name in args.pricing]
+    jobs = [(p, seed) for p in variants for seed in range(args.runs)]
+    steady_state = {"rel_precision": args.precision} if args.steady_state else None
+    if args.steady_state and args.steps is None:
+        # Batch means span whole days; at 5% the default lot needs about 50 of them
+        args.steps = 60 * DEFAULT_PARAMS["day_length_steps"]
+    try:
+        if len(jobs) == 1:
+            rows = [run_scenario(jobs[0][0], seed=0, steps=args.steps, monitor=snapshot, run_id="run-0",
+                                 cache=cache, trajectory_path=args.trajectory, steady_state=steady_state)]
+        else:
+            rows = run_replications(jobs, processes=args.processes, steps=args.steps, snapshot=snapshot,
+                                    cache=cache, steady_state=steady_state, trajectory_path=args.trajectory)
+    finally:
+        if monitor is not None:
+            monitor.stop()
+
+    write_rows(rows, args.out)
+    print(f"{len(rows)} runs written to '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# lazy_imports.py
+"""
+Deferred imports for headless processes.
+
+`import mesa` (2.3.2) runs mesa/__init__.py, which imports the whole
+visualization stack (mesa_viz_tornado, Tornado), pandas (for
+DataCollector's DataFrame export) and networkx (for NetworkGrid). A
+headless worker uses none of these, but every fresh process pays for them.
+
+defer() installs a meta-path finder. For each listed module, the first
+import binds a placeholder module instead of running the real one. The
+real import happens the first time anything reads an attribute the
+placeholder lacks: `pd.DataFrame` in save_data, `mesa.visualization.modules`
+in server.py, and so on. Code that never touches those modules never
+loads them. A module that is not installed is left alone, so optional
+imports such as datacollection's `import pandas` fail as before.
+
+Only imports that happen after defer() are affected, so call it before
+anything imports mesa; headless.py does so at the top. Set
+PARKING_EAGER_IMPORTS=1 to turn deferral off, e.g. to compare cold-start
+times (bench_startup.py --eager).
+"""
+import importlib
+import importlib.abc
+import importlib.machinery
+import os
+import sys
+import types
+
+# Never touched by the simulation itself
+HEADLESS_DEFERRED = ("mesa.visualization", "pandas", "networkx")
+
+
+class _DeferredModule(types.ModuleType):
+    """Placeholder; the first attribute it lacks imports the real module."""
+
+    def __getattr__(self, attr):
+        return getattr(_finder.materialize(self.__name__), attr)
+
+
+class _DeferringFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def __init__(self):
+        self.names = set()
+        self.materialized = []
+
+    def find_spec(self, name, path=None, target=None):
+        if name not in self.names:
+            return None
+        if importlib.machinery.PathFinder.find_spec(name, path) is None:
+            return None          # not installed: the normal ImportError follows
+        # No submodule_search_locations: reading __path__ (importing a submodule) materializes
+        return importlib.machinery.ModuleSpec(name, self)
+
+    def create_module(self, spec):
+        return _DeferredModule(spec.name)
+
+    def exec_module(self, module):
+        pass
+
+    def materialize(self, name):
+        """Import the real module behind a placeholder; idempotent."""
+        placeholder = sys.modules.get(name)
+        if not isinstance(placeholder, _DeferredModule):
+            return placeholder
+        self.names.discard(name)
+        del sys.modules[name]
+        try:
+            real = importlib.import_module(name)
+        except BaseException:
+            sys.modules[name] = placeholder
+            raise
+        # Later reads through the placeholder (e.g. datacollection's `pd`) go straight to real attributes
+        placeholder.__dict__.update(real.__dict__)
+        parent, _, child = name.rpartition(".")
+        if parent and parent in sys.modules:
+            setattr(sys.modules[parent], child, real)
+        self.materialized.append(name)
+        return real
+
+
+_finder = _DeferringFinder()
+
+
+def defer(names=HEADLESS_DEFERRED):
+    """
+    Defer `names` until first use. Returns the names actually deferred:
+    none if PARKING_EAGER_IMPORTS is set, and none already imported.
+    """
+    if os.environ.get("PARKING_EAGER_IMPORTS"):
+        return []
+    fresh = [n for n in names if n not in sys.modules]
+    _finder.names.update(fresh)
+    if fresh and _finder not in sys.meta_path:
+        sys.meta_path.insert(0, _finder)
+    return fresh
+
+
+def is_loaded(name):
+    """True if `name` has really been imported (not merely bound to a placeholder)."""
+    module = sys.modules.get(name)
+    return module is not None and not isinstance(module, _DeferredModule)
+
+
+def materialized():
+    """Deferred modules that were imported after all, in order."""
+    return list(_finder.materialized)
@@ -0,0 +1,145 @@
+# lifecycle.py
+"""
+One owner for creating and removing drivers and reservations.
+
+Every way a driver leaves the lot goes through Lifecycle.retire: reaching
+the exit in drive_to_exit, _finalize_exit, and the EXITED branch of
+Driver.step. Direct moves go through relocate. New reservations go through
+add_reservation.
+
+Lifecycle is a step observer. Every `prune_every` steps it drops
+reservations that are over and fully accounted for (fulfilled or counted as
+missed), from both the bays and scheduled_reservations; nothing reads those
+again. max_collector_rows keeps only the most recent DataCollector rows.
+census() counts live objects. With trace_memory, tracemalloc snapshots are
+taken every `census_every` steps, so a week-long run can show flat memory:
+
+    model = ParkingLotModel(..., lifecycle={"census_every": 1000, "trace_memory": True,
+                                            "max_collector_rows": 5000})
+    ...
+    model.lifecycle.history    # [{step, census, memory_current, memory_peak, top}, ...]
+"""
+import tracemalloc
+from collections import Counter
+
+
+class Lifecycle:
+    def __init__(self, model, prune_every=50, max_collector_rows=None, census_every=None, trace_memory=False,
+                 top_allocations=5):
+        self.model = model
+        self.prune_every = prune_every
+        self.max_collector_rows = max_collector_rows
+        self.census_every = census_every
+        self.trace_memory = trace_memory
+        self.top_allocations = top_allocations
+
+        self.live = {}              # unique id -> driver, for drivers on the schedule
+        self.spawned = 0
+        self.retired = 0
+        self.reservations_created = 0
+        self.reservations_pruned = 0
+        self.history = []
+        self._baseline = None
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # ---- drivers ----
+    def spawn(self, driver):
+        self.model.scheduler.add(driver)
+        self.live[driver.unique_id] = driver
+        self.spawned += 1
+
+    def retire(self, driver, space=None):
+        """Release the bay (if given), count the car out once, and drop it from grid and schedule."""
+        if space is not None:
+            space.release()
+        if driver.state != "EXITED":
+            driver.state = "EXITED"
+            self.model.cars_inside -= 1
+        if driver.pos is not None:
+            self.model.grid.remove_agent(driver)
+        if self.live.pop(driver.unique_id, None) is not None:
+            driver.waiting_for_gate = False
+            self.model.scheduler.remove(driver)
+            self.retired += 1
+
+    def relocate(self, driver, pos):
+        self.model.grid.move_agent(driver, pos)
+
+    # ---- reservations ----
+    def add_reservation(self, space, reservation, window):
+        """Put `reservation` on `space` and on the model's spawn schedule; returns the schedule entry."""
+        space.reservations.append(reservation)
+        space.reservations.sort(key=lambda r: r.start)
+        entry = {"space": space, "reservation": reservation, "window": window}
+        self.model.scheduled_reservations.append(entry)
+        self.reservations_created += 1
+        return entry
+
+    @staticmethod
+    def _finished(res, step):
+        return res.end <= step and (res.was_fulfilled or res.miss_accounted)
+
+    def prune_reservations(self):
+        step = self.model.current_step
+        before = len(self.model.scheduled_reservations)
+        self.model.scheduled_reservations = [
+            e for e in self.model.scheduled_reservations if not self._finished(e["reservation"], step)
+        ]
+        self.reservations_pruned += before - len(self.model.scheduled_reservations)
+        for space in self.model.parking_spaces:
+            reservations = getattr(space, "reservations", None)
+            if reservations and any(self._finished(r, step) for r in reservations):
+                space.reservations = [r for r in reservations if not self._finished(r, step)]
+
+    # ---- collector ----
+    def collector_rows(self):
+        columns = self.model.datacollector.model_vars
+        return len(next(iter(columns.values()))) if columns else 0
+
+    def cap_collector(self):
+        cap = self.max_collector_rows
+        for column in self.model.datacollector.model_vars.values():
+            if len(column) > cap:
+                del column[:len(column) - cap]
+
+    # ---- census ----
+    def census(self):
+        model = self.model
+        states = Counter(driver.state for driver in self.live.values())
+        return {
+            "step": model.current_step,
+            "drivers": len(self.live),
+            "drivers_by_state": dict(states),
+            "spawned": self.spawned,
+            "retired": self.retired,
+            "agents_scheduled": len(model.scheduler.agents),
+            "reservations_retained": sum(len(getattr(s, "reservations", ())) for s in model.parking_spaces),
+            "scheduled_reservations": len(model.scheduled_reservations),
+            "reservations_pruned": self.reservations_pruned,
+            "collector_rows": self.collector_rows(),
+        }
+
+    def snapshot(self):
+        entry = {"census": self.census()}
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            entry["memory_current"] = current
+            entry["memory_peak"] = peak
+            snap = tracemalloc.take_snapshot()
+            if self._baseline is None:
+                self._baseline = snap
+                entry["top"] = []
+            else:
+                entry["top"] = [str(stat) for stat in snap.compare_to(self._baseline, "lineno")[:self.top_allocations]]
+        self.history.append(entry)
+        return entry
+
+    def __call__(self, model):
+        step = model.current_step
+        if self.prune_every and step % self.prune_every == 0:
+            self.prune_reservations()
+        if self.max_collector_rows is not None:
+            self.cap_collector()
+        if self.census_every and step % self.census_every == 0:
+            self.snapshot()
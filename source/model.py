@@ -2,6 +2,12 @@ from mesa import Agent, Model
 from mesa.time import RandomActivation
 from mesa.space import MultiGrid
 from mesa.datacollection import DataCollector
+from gate_queue import GateQueue
+from policies import policies_for
+from pricing import PricingEngine
+from demand import make_demand_source
+from lifecycle import Lifecycle
+from sparse_grid import SparseGrid
 import math, random
 
 
@@ -26,6 +32,16 @@ def parking_duration_steps(rng=random):
     # Long stay
     return rng.randint(300, 500)
 
+# Base arrival probability for each sixteenth of the day from 6 AM, scaled
+# by arrival_prob; the trailing 10 PM value is the fallback past the last bucket
+HOURLY_BASE = (
+    0.20, 0.70, 0.90, 0.60,     # 6-9 AM
+    0.40, 0.45, 0.50, 0.40,     # 10 AM-1 PM
+    0.30, 0.20, 0.15, 0.15,     # 2-5 PM
+    0.18, 0.40, 0.30, 0.22,     # 6-9 PM
+    0.15,                       # 10 PM
+)
+
 class ParkingSpace(Agent):    
     def __init__(self, unique_id, model, pos):
         super().__init__(unique_id, model)
@@ -47,6 +63,24 @@ class ParkingSpace(Agent):
                     agent.remaining_time = 0
                     agent.state = "EXITING"
 
+    def occupy(self, driver):
+        """Mark the bay as taken by `driver`, keeping the model's occupied count."""
+        if not self.occupied:
+            self.model.occupied_count += 1
+        self.allocated = True
+        self.occupied = True
+        self.occupant_id = driver.unique_id
+
+    def release(self):
+        """Free the bay, keeping the model's occupied count."""
+        if self.occupied:
+            self.model.occupied_count -= 1
+        self.allocated = False
+        self.occupied = False
+        self.occupant_id = None
+        if self.model.booking_engine is not None:
+            self.model.booking_engine.release(self)
+
     def notOccupiedUntil(self, start_step, end_step):
         """Check if the space is free until the given step."""
         return not self.occupied and not self.allocated
@@ -70,12 +104,14 @@ class VIPParkingSpace(ParkingSpace):
     def __init__(self, unique_id, model, pos):
         super().__init__(unique_id, model, pos)
 
-        self.margin_of_safety = 25
+        self.margin_of_safety = model.reservation_policy.margin_of_safety
         self.reservations: list[Reservation] = []
         self.current_blocked = False
         self.is_reserved = False
 
-        self._generate_reservation_schedule()
+        # A vectorized policy fills every bay at once from the model instead
+        if model.reservation_policy.pregenerate and not model.reservation_policy.vectorized:
+            self._generate_reservation_schedule()
 
     def notOccupiedUntil(self, start_step, end_step):
         if self.occupied or self.allocated:
@@ -99,7 +135,7 @@ class VIPParkingSpace(ParkingSpace):
                 res = Reservation(
                     start=t,
                     end=min(t + duration, day),
-                    miss_probability=0.05,  # 👈 control miss rate here
+                    miss_probability=self.model.reservation_policy.miss_probability,
                     rng=self.random
                 )
                 self.reservations.append(res)
@@ -174,7 +210,7 @@ class Driver(Agent):
     def __init__(self, unique_id, model, parking_duration=None, reserved=False, reservation=None):
         super().__init__(unique_id, model)
         self.state = "ARRIVING"
-        self.waiting_for_gate = False
+        self._waiting_for_gate = False
         self.belt_lane_y = None
         self.color = "#%06x" % self.random.randrange(0, 0xFFFFFF)
         
@@ -186,13 +222,69 @@ class Driver(Agent):
 
         # --- timestamps para KPIs ---
         self.arrival_step = None
-        self.queue_entry_step = None
 
         self.is_reserved = reserved
         self.reservation_start_time = reservation
+        self.booking = None             # Reservation of a walk-in booking (see spawn_trace_reservation)
 
         self.forward_clear_steps = None
 
+    # Stuck behind the barrier or the car ahead; the model keeps the count for the balking check
+    @property
+    def waiting_for_gate(self):
+        return self._waiting_for_gate
+
+    @waiting_for_gate.setter
+    def waiting_for_gate(self, value):
+        value = bool(value)
+        if value != self._waiting_for_gate:
+            self._waiting_for_gate = value
+            self.model.stuck_at_gate += 1 if value else -1
+
+    def _claim_public_space(self, arrival_time, departure_time):
+        """Take the bay a public driver is admitted to, and tell the booking engine (if any) it's held."""
+        self.target_space_id = self.model.get_free_unreserved_space_id(arrival_time, departure_time)
+        space = self.model.space_by_id.get(self.target_space_id)
+        space.allocated = True
+        if self.model.booking_engine is not None:
+            # The car only starts its stay once it has driven to the bay
+            self.model.booking_engine.hold_public(space, arrival_time, departure_time + self.steps_to(space))
+
+    def _reserved_bay_free(self, space):
+        """
+        Whether a reserved driver at the barrier can go to its bay. A walk-in
+        booking whose bay has been taken meanwhile (its window ran out while
+        it queued) is moved to another free VIP bay, or else let in like a
+        public driver, instead of blocking the lane.
+        """
+        if not space.occupied and not space.allocated:
+            return True
+        if self.booking is None:
+            return False
+        now = self.model.current_step
+        end = now + self.parking_duration
+        other = next(
+            (s for s in self.model.parking_spaces
+             if isinstance(s, VIPParkingSpace) and s.notOccupiedUntil(now, end)),
+            None
+        )
+        if other is not None:
+            space.reservations.remove(self.booking)
+            self.booking.start, self.booking.end = now, end
+            other.reservations.append(self.booking)
+            other.reservations.sort(key=lambda r: r.start)
+            self.target_space_id = other.unique_id
+            self.reservation_start_time = now
+            return True
+        if self.model.free_unreserved_capacity(now, end) > 0:
+            self._claim_public_space(now, end)
+            return True
+        return False
+
+    def steps_to(self, space):
+        """Steps from here to `space` at one cell per step, ignoring traffic."""
+        return abs(space.pos[0] - self.pos[0]) + abs(space.pos[1] - self.pos[1])
+
     def _enter_parking(self):
         """Unified logic for a driver successfully passing the gate."""
         self._set_belt_lane_from_target()
@@ -201,25 +293,11 @@ class Driver(Agent):
         self.state = "DRIVING_TO_SPOT"
 
     def _finalize_exit(self, space):
-        print(f"Driver {self.unique_id} exited the parking lot.")
-
         """Removes the agent from the grid and scheduler and updates model counters."""
-        if space:
-            space.allocated = False
-            space.occupied = False
-            space.occupant_id = None
-            
-        self.state = "EXITED"
-        self.model.cars_inside -= 1
-        
-
-        print("Removing driver", self.unique_id, "from simulation.")
+        print(f"Driver {self.unique_id} exited the parking lot.")
         # Immediate removal to prevent blocking the cell for the next car
-        if self in self.model.scheduler.agents:
-            self.model.grid.remove_agent(self)
-            self.model.scheduler.remove(self)
-            print("Driver", self.unique_id, "removed.")
-        
+        self.model.lifecycle.retire(self, space)
+
 
     def step(self):
         # ---------------- ARRIVING ----------------
@@ -244,7 +322,7 @@ class Driver(Agent):
                 if self.is_reserved:
                     space = self.model.space_by_id.get(self.target_space_id)
                     # VIPs only care if their specific spot is physically empty
-                    if not space.occupied and not space.allocated:
+                    if self._reserved_bay_free(space):
                         self._enter_parking()
                         return
                     else:
@@ -257,9 +335,7 @@ class Driver(Agent):
                     arrival_time = self.model.current_step
                     departure_time = arrival_time + self.parking_duration
                     if self.model.free_unreserved_capacity(arrival_time, departure_time) > 0:
-                        self.target_space_id = self.model.get_free_unreserved_space_id(arrival_time, departure_time)
-                        space = self.model.space_by_id.get(self.target_space_id)
-                        space.allocated = True
+                        self._claim_public_space(arrival_time, departure_time)
                         self._enter_parking()
                         return
                     else:
@@ -283,10 +359,12 @@ class Driver(Agent):
         if self.state == "WAITING_AT_GATE":
             x, y = self.pos
 
-            if self.in_gate():
+            # Only the driver standing on the barrier re-runs the admission
+            # check; drivers behind it just try to close the gap.
+            if self.model.queue_for(self).is_head(self):
                 if self.is_reserved:
                     space = self.model.space_by_id.get(self.target_space_id)
-                    if not space.occupied and not space.allocated:
+                    if self._reserved_bay_free(space):
                         self._stop_queueing(entered=True)
                         self._enter_parking()
                         return
@@ -295,9 +373,7 @@ class Driver(Agent):
                     departure_time = arrival_time + self.parking_duration
                     if self.model.free_unreserved_capacity(arrival_time, departure_time) > 0:
                         self._stop_queueing(entered=True)
-                        self.target_space_id = self.model.get_free_unreserved_space_id(arrival_time, departure_time)
-                        space = self.model.space_by_id.get(self.target_space_id)
-                        space.allocated = True
+                        self._claim_public_space(arrival_time, departure_time)
                         self._enter_parking()
                         return
                 return
@@ -307,6 +383,7 @@ class Driver(Agent):
             old_pos = self.pos
             self.try_move_to((nx, ny))
             self.waiting_for_gate = (self.pos == old_pos)
+            self.model.queue_for(self).advance(self)
             return
         
         # ---------------- DRIVING_TO_SPOT ----------------
@@ -328,22 +405,18 @@ class Driver(Agent):
         
         # ---------------- EXITED ----------------
         if self.state == "EXITED":
-            if self in self.model.scheduler.agents:
-                self.model.grid.remove_agent(self)
-                self.model.scheduler.remove(self)
+            self.model.lifecycle.retire(self)
 
     # --- Queueing Helpers ---
     def _start_queueing(self):
-        if self.queue_entry_step is None:
-            self.queue_entry_step = self.model.current_step
+        self.model.queue_for(self).join(self, self.model.current_step)
 
     def _stop_queueing(self, entered: bool):
-        if self.queue_entry_step is not None:
-            q_time = self.model.current_step - self.queue_entry_step
+        q_time = self.model.queue_for(self).leave(self, self.model.current_step)
+        if q_time is not None:
             self.model.total_queue_time += q_time
             if entered:
                 self.model.total_queued_drivers += 1
-            self.queue_entry_step = None
 
 
     # ---------- Collision + Lane Discipline ----------
@@ -380,9 +453,7 @@ class Driver(Agent):
         # already on the bay
         if (x, y) == (tx, ty):
             if not space.occupied:
-                space.allocated = True
-                space.occupied = True
-                space.occupant_id = self.unique_id
+                space.occupy(self)
                 self.current_space_id = space.unique_id
                 self.state = "PARKED"
                 self.model.parked_count += 1
@@ -433,8 +504,7 @@ class Driver(Agent):
         self.try_move_to((nx, ny))
         
         if self.pos == space.pos and not space.occupied:
-            space.occupied = True
-            space.occupant_id = self.unique_id
+            space.occupy(self)
             self.current_space_id = space.unique_id
             self.state = "PARKED"
             self.model.parked_count += 1
@@ -473,10 +543,7 @@ class Driver(Agent):
         road_y = self.model.road_y
 
         if (x, y) == (ex, ey):
-            self.state = "EXITED"
-            self.model.cars_inside -= 1
-            self.model.grid.remove_agent(self)
-            self.model.scheduler.remove(self)
+            self.model.lifecycle.retire(self)
             return
 
         lane_y = self.belt_lane_y if self.belt_lane_y is not None else road_y
@@ -499,9 +566,7 @@ class Driver(Agent):
         self.try_move_to((nx, ny))
 
         if space is not None and prev == space.pos and self.pos != space.pos:
-            space.allocated = False
-            space.occupied = False
-            space.occupant_id = None
+            space.release()
             self.target_space_id = None
 
     def force_eviction_of_occupant(self, space_id):
@@ -519,14 +584,12 @@ class Driver(Agent):
                     agent.remaining_time = 0
                     agent.state = "EXITING"
                     # Instantly vacate the spot
-                    space.allocated = False
-                    space.occupied = False
-                    space.occupant_id = None
+                    space.release()
                     # Move the squatter to the road lane to start exiting (avoid blocking)
                     road_y = self.model.road_y
                     sx, sy = space.pos
                     exit_pos = (sx, road_y)  # Move to road lane at the same x
-                    self.model.grid.move_agent(agent, exit_pos)
+                    self.model.lifecycle.relocate(agent, exit_pos)
                     # Note: They will continue exiting from there in their next steps.
 
     def in_gate(self):
@@ -565,9 +628,24 @@ class ParkingLotModel(Model):
         reservation_base_price=3,      
         parking_strategy="Standard",
         has_reservation_lane =False,
+        results_path="simulation_results.csv",
+        pricing_policy=None,
+        admission_policy=None,
+        reservation_policy=None,
+        pricing_schedule=None,
+        base_per_minute=0.022,
+        demand_source=None,
+        lifecycle=None,
+        grid_backend="dense",
     ):
         super().__init__(seed=seed)
-        self.grid = MultiGrid(width, height, torus=False)
+        # "sparse" stores only occupied cells (sparse_grid.py); same API as MultiGrid
+        if grid_backend == "dense":
+            self.grid = MultiGrid(width, height, torus=False)
+        elif grid_backend == "sparse":
+            self.grid = SparseGrid(width, height, torus=False)
+        else:
+            raise ValueError(f"Unknown grid backend {grid_backend!r}; expected 'dense' or 'sparse'.")
         self.scheduler = RandomActivation(self)
 
         self.arrival_prob = arrival_prob
@@ -577,17 +655,24 @@ class ParkingLotModel(Model):
         self.reservation_hold_time = reservation_hold_time
         self.parking_strategy = parking_strategy
         self.reservation_base_price = reservation_base_price 
+
+        # Policies default to the ones implied by parking_strategy (see policies.py)
+        self.pricing_policy, self.admission_policy, self.reservation_policy = policies_for(
+            parking_strategy, pricing_policy, admission_policy, reservation_policy
+        )
         self.has_reservation_lane = has_reservation_lane and self.is_reservation_mode()
+        self.results_path = results_path   # None = don't write the end-of-day CSV
+
+        # Where arrivals come from: synthetic by default, or ("trace", {"path": ...})
+        self.demand_source = make_demand_source(demand_source)
         
-        self.base_per_minute = 0.022
+        self.base_per_minute = base_per_minute
         
-        self.enable_dynamic_pricing = False
-        self.reservation_mode = "none"
+        self.enable_dynamic_pricing = self.pricing_policy.dynamic
+        self.reservation_mode = self.reservation_policy.mode
 
-        if self.parking_strategy == "Dynamic Pricing":
-            self.enable_dynamic_pricing = True 
-        elif self.parking_strategy == "Reservations":
-            self.reservation_mode = "reservations"
+        # e.g. {"mode": "scheduled", "every_n_steps": 30, "occupancy_buckets": 10}
+        self.pricing_engine = PricingEngine(self.pricing_policy, **(pricing_schedule or {}))
 
         self.current_per_minute_rate = self.base_per_minute
         self.total_revenue = 0.0
@@ -600,10 +685,13 @@ class ParkingLotModel(Model):
         self.total_queued_drivers = 0
         self.cars_inside = 0
         self.parked_count = 0
+        self.occupied_count = 0          # kept up to date by ParkingSpace.occupy/release
 
         self.total_occupancy_sum = 0.0   # sum of occupancy ratios over time
         self.occupancy_samples = 0
         self.current_occupancy = 0.0
+        self.warmup_steps = 0            # leading steps excluded from the averaged KPIs (see steady_state.py)
+        self.warmup_excluded = (0.0, 0, 0)
         self.total_reservations_fulfilled = 0
         self.total_reservations_missed = 0
 
@@ -638,6 +726,18 @@ class ParkingLotModel(Model):
         self.scheduler.add(self.entry_gate)
         self.scheduler.add(self.entry_gate_2)
 
+        # --- Gate queues ---
+        # The spawn gate and the barrier share one lane, so they share one
+        # FIFO; the reservation lane (if any) gets its own.
+        # Both queues feed one set of wait percentiles (main_gate_queue.wait_stats)
+        self.main_gate_queue = GateQueue("main", self.entry_gate_2.pos)
+        self.reservation_gate_queue = None
+        if self.has_reservation_lane:
+            self.reservation_gate_queue = GateQueue("reservation", self.reservation_gate.pos,
+                                                    wait_stats=self.main_gate_queue.wait_stats)
+        # Drivers with waiting_for_gate set (kept by Driver); the balking check reads this
+        self.stuck_at_gate = 0
+
         self.parking_spaces = []
         self.parking_start_x = self.cancela_x + 3
         start_x = self.parking_start_x
@@ -663,7 +763,7 @@ class ParkingLotModel(Model):
                 if x >= width - 1: break
                 last_parking_x = x
                 pos = (x, row)
-                if (self.parking_strategy == "Reservations" ):
+                if self.reservation_policy.enabled:
                     s = VIPParkingSpace(self.next_id(), self, pos)
                 else:
                     s = ParkingSpace(self.next_id(), self, pos)
@@ -675,8 +775,18 @@ class ParkingLotModel(Model):
         self.space_by_id = {s.unique_id: s for s in self.parking_spaces}
 
         self.scheduled_reservations = []
+        self.reservation_table = None
+        vip_spaces = [s for s in self.parking_spaces if isinstance(s, VIPParkingSpace)]
+        if self.reservation_policy.vectorized and vip_spaces:
+            # Whole-lot schedule sampled at once into an array table (reservation_table.py)
+            from reservation_table import ReservationTable
+            self.reservation_table = ReservationTable.generate(
+                len(vip_spaces), self.day_length_steps,
+                self.reservation_policy.miss_probability, seed=self.random.getrandbits(64),
+            )
+            self.scheduled_reservations = self.reservation_table.attach(vip_spaces)
         for space in self.parking_spaces:
-            if isinstance(space, VIPParkingSpace):
+            if isinstance(space, VIPParkingSpace) and self.reservation_table is None:
                 for res in space.reservations:
                     spawn_window_start = res.start - 20
                     spawn_window_end = res.start - 5
@@ -687,24 +797,47 @@ class ParkingLotModel(Model):
                         "window": (spawn_window_start, spawn_window_end),
                     })
 
+        # Reservations booked during the run (reservation policy "online-booking")
+        self.booking_engine = None
+        if self.reservation_policy.online:
+            from booking import BookingEngine
+            self.booking_engine = BookingEngine(self)
+
+        # Creation/removal of drivers and reservations, census and memory probes (lifecycle.py);
+        # e.g. lifecycle={"census_every": 1000, "trace_memory": True, "max_collector_rows": 5000}
+        self.lifecycle = Lifecycle(self, **(lifecycle or {}))
+
+        # Callables run with the model at the end of every step (recorders, monitors)
+        self.step_observers = [self.lifecycle]
+
+        # Set to a list to keep turned-away requests (with "price"/"queue"), e.g. for diversion in district.py
+        self.turnaway_log = None
+
         self.datacollector = DataCollector(
             model_reporters={
-                "OccupiedSpaces": lambda m: sum(1 for s in m.parking_spaces if s.occupied),
-                "FreeSpaces": lambda m: sum(1 for s in m.parking_spaces if not s.occupied),
+                "OccupiedSpaces": lambda m: m.occupied_count,
+                "FreeSpaces": lambda m: len(m.parking_spaces) - m.occupied_count,
                 "NumDrivers": self.get_num_drivers,
                 "CarsInside": lambda m: m.cars_inside,
                 "CarsWaitingAtGate": lambda m: m.cars_waiting_for_gate(),
 
                 "ParkingOccupancy": lambda m: m.current_occupancy,
-                "AvgParkingOccupancy": lambda m: (
-                    m.total_occupancy_sum / m.occupancy_samples
-                    if m.occupancy_samples > 0 else 0.0
-                ),
+                "AvgParkingOccupancy": lambda m: m.average_occupancy(),
+                "PricePerMinute": lambda m: m.current_per_minute_rate,
+                "QueueLength": lambda m: len(m.main_gate_queue),
+                "QueueWaitP50": lambda m: m.main_gate_queue.wait_stats.percentile(0.50),
+                "QueueWaitP95": lambda m: m.main_gate_queue.wait_stats.percentile(0.95),
+                "QueueWaitP99": lambda m: m.main_gate_queue.wait_stats.percentile(0.99),
             }
         )
 
     def is_reservation_mode(self):
-        return self.parking_strategy == "Reservations"
+        return self.reservation_policy.enabled
+
+    def occupancy(self):
+        """Fraction of bays occupied right now (O(1))."""
+        total_spots = len(self.parking_spaces)
+        return self.occupied_count / total_spots if total_spots > 0 else 0.0
 
     def get_free_unreserved_space_id(self, start_step, until_step):
         free = [
@@ -725,67 +858,32 @@ class ParkingLotModel(Model):
         )
 
     def update_dynamic_price(self):
-        if not self.enable_dynamic_pricing:
-            self.current_per_minute_rate = self.base_per_minute
-            return
-            
-        total_spots = len(self.parking_spaces)
-        occupied = sum(1 for s in self.parking_spaces if s.occupied)
-        occupancy_rate = occupied / total_spots if total_spots > 0 else 0
-        
-        multiplier = 0.5 + 2.0 * (occupancy_rate ** 2)
-        
-        self.current_per_minute_rate = self.base_per_minute * multiplier
+        self.current_per_minute_rate = self.pricing_engine.on_arrival(self)
+
+    def queue_for(self, driver):
+        """Gate queue the driver lines up in, based on the lane it uses."""
+        if driver.is_reserved and self.reservation_gate_queue is not None:
+            return self.reservation_gate_queue
+        return self.main_gate_queue
+
+    def queue_length(self):
+        """Drivers currently waiting across all gate queues (O(1))."""
+        total = len(self.main_gate_queue)
+        if self.reservation_gate_queue is not None:
+            total += len(self.reservation_gate_queue)
+        return total
 
     def cars_waiting_for_gate(self):
-        return sum(1 for a in self.scheduler.agents if isinstance(a, Driver) and getattr(a, "waiting_for_gate", False))
+        """Scheduled drivers currently stuck at a gate (O(1); see Driver.waiting_for_gate)."""
+        return self.stuck_at_gate
     
     def arrival_prob_at_step(self, t: int) -> float:
         current_price = self.current_per_minute_rate
 
-        tau = t % self.day_length_steps
-        frac = tau / self.day_length_steps
-        # 6 AM 
-        if frac < 0.0625: base = 0.20
-        # 7 AM
-        elif frac < 0.0625 * 2: base = 0.70
-        # 8 AM
-        elif frac < 0.0625 * 3: base = 0.90
-        # 9 AM
-        elif frac < 0.0625 * 4: base = 0.60
-        # 10 AM
-        elif frac < 0.0625 * 5: base = 0.40
-        # 11 AM
-        elif frac < 0.0625 * 6: base = 0.45
-        # 12 PM
-        elif frac < 0.0625 * 7: base = 0.50
-        # 1 PM
-        elif frac < 0.0625 * 8: base = 0.40
-        # 2 PM
-        elif frac < 0.0625 * 9: base = 0.30
-        # 3 PM
-        elif frac < 0.0625 * 10: base = 0.20
-        # 4 PM
-        elif frac < 0.0625 * 11: base = 0.15
-        # 5 PM
-        elif frac < 0.0625 * 12: base = 0.15
-        # 6 PM
-        elif frac < 0.0625 * 13: base = 0.18
-        # 7 PM
-        elif frac < 0.0625 * 14: base = 0.40
-        # 8 PM
-        elif frac < 0.0625 * 15: base = 0.30
-        # 9 PM
-        elif frac < 0.0625 * 16: base = 0.22
-        # 10 PM
-        else: base = 0.15
-
-        if (current_price < 0.022):
-            # varies between 0.011 and 0.022
-            # the lower the price, the higher the prob
-            return min(self.arrival_prob * base * (1.0 + (0.022 - current_price) / 0.022), 1.0) * 3
-
-        return self.arrival_prob * base
+        frac = (t % self.day_length_steps) / self.day_length_steps
+        base = HOURLY_BASE[min(int(frac / 0.0625), len(HOURLY_BASE) - 1)]
+
+        return self.pricing_policy.demand_response(self, self.arrival_prob * base, current_price)
 
     def is_parking_cell(self, pos):
         return any(s.pos == pos for s in self.parking_spaces)
@@ -799,12 +897,15 @@ class ParkingLotModel(Model):
 
 
     def maybe_arrive(self):
-        if self.current_step >= self.day_length_steps - 100:
-            return
+        demand = self.demand_source
+        if demand.closes_before_day_end:
+            # Closed for the last 100 steps of every day (a day ends on a multiple of day_length_steps)
+            tau = self.current_step % self.day_length_steps
+            if tau == 0 or tau >= self.day_length_steps - 100:
+                return
 
-        # 1. Determine if ANY car should spawn this step based on your rate
-        p = self.arrival_prob_at_step(self.current_step)
-        arrival_success = self.random.random() < p
+        # 1. Arrivals this step from the demand source (synthetic or trace)
+        requests = demand.requests(self, self.current_step)
 
         # 2. Check if there are any VIPs currently in their "Must Spawn" window
         # We look for reservations where the window is about to close (step == end of window)
@@ -818,12 +919,14 @@ class ParkingLotModel(Model):
         )
 
         # 3. Decision Logic
-        drv = None
+        drivers = []
         
         if urgent_vip:
             # Force a spawn because the window is closing, keeping the schedule intact
-            drv = self.spawn_reserved_driver(urgent_vip)
-        elif arrival_success:
+            drivers.append(self.spawn_reserved_driver(urgent_vip))
+            if demand.shares_slots_with_reservations:
+                requests = requests[1:]
+        elif requests and demand.shares_slots_with_reservations:
             # A slot is available! See if a VIP wants it, otherwise give it to a normal driver
             potential_vip = next(
                 (r for r in self.scheduled_reservations
@@ -834,39 +937,88 @@ class ParkingLotModel(Model):
             )
             
             if potential_vip:
-                drv = self.spawn_reserved_driver(potential_vip)
+                drivers.append(self.spawn_reserved_driver(potential_vip))
+                requests = requests[1:]
+
+        requests = requests + demand.extra_requests(self, self.current_step)
+        for request in requests:
+            if request.reserved:
+                drv = self.spawn_trace_reservation(request)
             else:
-                # Standard Driver Logic
-                self.total_arrivals += 1
-                # Willingness to pay
-                mu = math.log(0.044)  # median ~0.022 €/min
-                sigma = 0.34
-
-                wtp = self.random.lognormvariate(mu, sigma)
-
-                # Optional truncation for realism
-                driver_wtp = wtp
-                self.update_dynamic_price()
-
-                if self.current_per_minute_rate > driver_wtp:
-                    self.total_price_turnaways += 1
-                    return
-                
-                current_queue_len = self.cars_waiting_for_gate()
-                if current_queue_len >= 6 and self.current_occupancy > 0.80:  
-                    if self.random.random() < self.p_not_enter_long_queue + 0.05 * (current_queue_len - 6):
-                        self.total_not_entered_long_queue += 1
-                        return
-                drv = Driver(self.next_id(), self)
-                drv.is_reserved = False
-                drv.arrival_step = self.current_step
-                drv.agreed_rate = self.current_per_minute_rate
-                drv.is_reserved = False
+                drv = self.arrive_standard(request)
+            if drv:
+                drivers.append(drv)
+
+        for drv in drivers:
+            self.lifecycle.spawn(drv)
+
+    def arrive_standard(self, request):
+        """Price / queue admission for a standard driver; returns the Driver or None."""
+        self.total_arrivals += 1
+        # Willingness to pay
+        driver_wtp = request.wtp
+        if driver_wtp is None:
+            driver_wtp = request.rate_paid if request.rate_paid is not None else self.demand_source.draw_wtp(self)
+
+        self.update_dynamic_price()
+
+        rejection = self.admission_policy.admit(self, driver_wtp, self.cars_waiting_for_gate())
+        if rejection is not None and self.turnaway_log is not None:
+            # Keep the driver's own WTP and stay length so it can try elsewhere
+            request.wtp = driver_wtp
+            request.duration = request.duration or parking_duration_steps(rng=self.random)
+            self.turnaway_log.append((request, rejection))
+        if rejection == "price":
+            self.total_price_turnaways += 1
+            return None
+        if rejection == "queue":
+            self.total_not_entered_long_queue += 1
+            return None
+        drv = Driver(self.next_id(), self, parking_duration=request.duration)
+        drv.is_reserved = False
+        drv.arrival_step = self.current_step
+        drv.agreed_rate = self.current_per_minute_rate
+        return drv
+
+    def spawn_trace_reservation(self, request):
+        """
+        A recorded reserved arrival: book a free VIP bay for its duration,
+        starting when the driver is expected at the barrier, and send the
+        driver to it (see Driver._reserved_bay_free for a bay taken by the
+        time it gets there). That time is only known while its lane is
+        clear, and a bay booked for a car stuck in the queue sits idle, so
+        with cars queued - or no VIP bay free - it is a standard arrival.
+        """
+        lane = self.reservation_gate_queue or self.main_gate_queue
+        if len(lane):
+            return self.arrive_standard(request)
+
+        duration = request.duration or parking_duration_steps(rng=self.random)
+        start = self.current_step + (self.cancela_x - self.entry_pos[0])
+        end = start + duration
+        # Bays a reserved car is still on its way to
+        targeted = {
+            a.target_space_id for a in self.scheduler.agents
+            if isinstance(a, Driver) and a.is_reserved and a.state != "PARKED"
+        }
+        space = next(
+            (s for s in self.parking_spaces
+             if isinstance(s, VIPParkingSpace) and s.unique_id not in targeted
+             and s.notOccupiedUntil(start, end)),
+            None
+        )
+        if space is None:
+            return self.arrive_standard(request)
 
-        if drv:
-            self.scheduler.add(drv)
+        res = Reservation(start=start, end=end, miss_probability=0.0, rng=self.random)
+        res_data = self.lifecycle.add_reservation(space, res, (self.current_step, self.current_step))
+        drv = self.spawn_reserved_driver(res_data)
+        drv.booking = res
+        return drv
 
     def spawn_reserved_driver(self, res_data):
+        if self.booking_engine is not None:
+            self.booking_engine.reseat(res_data)
         res = res_data["reservation"]
         space = res_data["space"]
 
@@ -884,16 +1036,15 @@ class ParkingLotModel(Model):
 
     def step(self):
         self.current_step += 1
+        scheduled_rate = self.pricing_engine.on_step(self)
+        if scheduled_rate is not None:
+            self.current_per_minute_rate = scheduled_rate
+        if self.booking_engine is not None:
+            self.booking_engine.on_step(self.current_step)
         self.maybe_arrive()
         self.scheduler.step()
         # ---- OCCUPANCY CALCULATION ----
-        total_spaces = len(self.parking_spaces)
-        occupied_spaces = sum(1 for s in self.parking_spaces if s.occupied)
-
-        if total_spaces > 0:
-            self.current_occupancy = occupied_spaces / total_spaces
-        else:
-            self.current_occupancy = 0.0
+        self.current_occupancy = self.occupancy()
 
         self.total_occupancy_sum += self.current_occupancy
         self.occupancy_samples += 1
@@ -913,13 +1064,90 @@ class ParkingLotModel(Model):
                     self.total_reservations_missed += 1
                     res.miss_accounted = True
 
-        self.datacollector.collect(self)
+        # Steps inside the warm-up are not collected (see set_warmup)
+        if self.current_step > self.warmup_steps:
+            self.datacollector.collect(self)
 
-        if self.current_step == self.day_length_steps:
+        for observer in self.step_observers:
+            observer(self)
+
+        if self.current_step == self.day_length_steps and self.results_path:
             self.save_data()
-            print(f"Day ended. Data saved to 'simulation_results.csv'")
+            print(f"Day ended. Data saved to '{self.results_path}'")
+
+    def kpi_summary(self):
+        """Flat dict of the headline KPIs shown in the dashboard."""
+        reserved_idle = sum(
+            1 for s in self.parking_spaces
+            if isinstance(s, VIPParkingSpace) and s.is_reserved and not s.occupied
+        )
+        return {
+            "step": self.current_step,
+            "arrivals": self.total_arrivals,
+            "did_not_enter": self.total_not_entered_long_queue + self.total_price_turnaways,
+            "turnaways_queue": self.total_not_entered_long_queue,
+            "turnaways_price": self.total_price_turnaways,
+            "total_queue_time": self.total_queue_time,
+            "queued_drivers": self.total_queued_drivers,
+            "avg_queue_time": self.average_queue_time(),
+            "queue_wait_p50": self.main_gate_queue.wait_stats.percentile(0.50),
+            "queue_wait_p95": self.main_gate_queue.wait_stats.percentile(0.95),
+            "queue_wait_p99": self.main_gate_queue.wait_stats.percentile(0.99),
+            "queue_length": self.queue_length(),
+            "reservation_mode": self.reservation_mode,
+            "reservation_fee": self.reservation_base_price,
+            "reservations_fulfilled": self.total_reservations_fulfilled,
+            "reservations_missed": self.total_reservations_missed,
+            "reservation_revenue": self.total_reservations_fulfilled * self.reservation_base_price,
+            "reserved_idle": reserved_idle,
+            "strategy": self.parking_strategy,
+            "rate": self.current_per_minute_rate,
+            "revenue": self.total_revenue,
+            "occupancy": self.current_occupancy,
+            "avg_occupancy": self.average_occupancy(),
+            "warmup_steps": self.warmup_steps,
+            **(self.booking_engine.stats() if self.booking_engine is not None else {}),
+        }
+
+    def set_warmup(self, warmup_steps, occupancy_sum, queue_time, queued_drivers):
+        """
+        Exclude the first `warmup_steps` steps from the averaged KPIs (average
+        occupancy and queue time). The other arguments are what those steps
+        contributed to each accumulator. Can be called again as the estimate
+        moves. The totals (total queue time, queued drivers) stay raw, and
+        queue-wait percentiles are not truncated.
+
+        DataCollector rows the warm-up covers are dropped and later steps
+        inside it are not collected. Rows dropped for a longer estimate
+        are not restored if it shrinks again.
+        """
+        self.warmup_steps = warmup_steps
+        self.warmup_excluded = (occupancy_sum, queue_time, queued_drivers)
+        # Rows run without gaps up to this step, which is always past the warm-up
+        rows = self.datacollector.model_vars
+        collected = len(next(iter(rows.values()), []))
+        drop = min(collected, warmup_steps - (self.current_step - collected))
+        if drop > 0:
+            for values in rows.values():
+                del values[:drop]
+
+    def average_queue_time(self):
+        """Mean gate queue time per queued driver, after the warm-up."""
+        _, excluded_time, excluded_drivers = self.warmup_excluded
+        drivers = self.total_queued_drivers - excluded_drivers
+        return (self.total_queue_time - excluded_time) / drivers if drivers > 0 else 0.0
+
+    def average_occupancy(self):
+        """Mean occupancy ratio per step, after the warm-up."""
+        excluded_sum = self.warmup_excluded[0]
+        samples = self.occupancy_samples - self.warmup_steps
+        return (self.total_occupancy_sum - excluded_sum) / samples if samples > 0 else 0.0
+
+    def price_history(self):
+        """Rate changes over the run as [{step, rate, occupancy}, ...]."""
+        return self.pricing_engine.history_rows()
 
     def save_data(self):
         df = self.datacollector.get_model_vars_dataframe()
-        filename = "simulation_results.csv"
+        filename = self.results_path or "simulation_results.csv"
         df.to_csv(filename)
\ No newline at end of file
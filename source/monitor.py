@@ -0,0 +1,256 @@
+# monitor.py
+"""
+Live monitoring for headless runs.
+
+The simulation loop writes into a MonitorSnapshot (a dict behind a lock, a
+few microseconds per publish). LiveMonitor serves that snapshot from an
+asyncio event loop running in its own thread, so reading it never blocks the
+simulation:
+
+    GET /         tiny auto-refreshing HTML page
+    GET /status   JSON snapshot
+    GET /ws       WebSocket that pushes the JSON snapshot every `interval` s
+
+Standard library only, so it works on any node without outside services.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+STATUS_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Parking lot runs</title></head>
+<body style="font-family: monospace">
+<h3>Parking lot runs</h3>
+<pre id="out">connecting...</pre>
+<script>
+const ws = new WebSocket("ws://" + location.host + "/ws");
+ws.onmessage = (e) => {
+  document.getElementById("out").textContent = JSON.stringify(JSON.parse(e.data), null, 2);
+};
+</script>
+</body></html>
+"""
+
+
+class MonitorSnapshot:
+    """Thread-safe, latest-value-wins store of per-run progress."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}
+        self._started = time.time()
+
+    def update(self, run_id, **fields):
+        with self._lock:
+            entry = self._runs.setdefault(run_id, {})
+            entry.update(fields)
+
+    def publish(self, run_id, model, total_steps=None, started=None):
+        """Record the current state of a running ParkingLotModel."""
+        now = time.time()
+        step = model.current_step
+        elapsed = now - started if started else None
+        fields = {
+            "step": step,
+            "total_steps": total_steps,
+            "progress": step / total_steps if total_steps else None,
+            "steps_per_second": step / elapsed if elapsed else None,
+            "status": "running",
+            "updated": now,
+            "kpis": model.kpi_summary(),
+        }
+        self.update(run_id, **fields)
+
+    def finish(self, run_id, kpis=None):
+        fields = {"status": "done", "progress": 1.0, "updated": time.time()}
+        if kpis is not None:
+            fields["kpis"] = kpis
+        self.update(run_id, **fields)
+
+    def as_dict(self):
+        with self._lock:
+            runs = {k: dict(v) for k, v in self._runs.items()}
+        done = sum(1 for r in runs.values() if r.get("status") == "done")
+        return {
+            "uptime": time.time() - self._started,
+            "runs_total": len(runs),
+            "runs_done": done,
+            "runs": runs,
+        }
+
+
+class LiveMonitor:
+    """Asyncio HTTP/WebSocket endpoint serving a MonitorSnapshot."""
+
+    def __init__(self, snapshot, host="127.0.0.1", port=8765, interval=1.0):
+        self.snapshot = snapshot
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._tasks = set()      # open connection handlers
+        self._sockets = set()    # writers of upgraded WebSocket connections
+
+    # ---------- lifecycle ----------
+    def start(self):
+        """Serve from a daemon thread; returns once the socket is bound."""
+        self._thread = threading.Thread(target=self._run, name="live-monitor", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        # Close connections and let their handlers finish before the loop stops
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    async def _shutdown(self):
+        self._server.close()
+        for writer in list(self._sockets):
+            try:
+                writer.write(struct.pack("!BBH", 0x88, 2, 1001))   # close frame, "going away"
+            except (ConnectionError, RuntimeError):
+                pass
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        # port=0 picks a free port; report the real one
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    # ---------- HTTP ----------
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            request_line = await reader.readline()
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+            path = parts[1]
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            if path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(reader, writer, headers)
+            elif path == "/status":
+                body = json.dumps(self.snapshot.as_dict()).encode()
+                await self._respond(writer, "200 OK", "application/json", body)
+            elif path == "/":
+                await self._respond(writer, "200 OK", "text/html; charset=utf-8", STATUS_PAGE.encode())
+            else:
+                await self._respond(writer, "404 Not Found", "text/plain", b"not found")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass    # stop(): end the handler quietly
+        finally:
+            self._tasks.discard(task)
+            writer.close()
+
+    async def _respond(self, writer, status, content_type, body):
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Cache-Control: no-store\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    # ---------- WebSocket ----------
+    async def _websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        self._sockets.add(writer)
+        closed = asyncio.ensure_future(self._wait_for_close(reader))
+        try:
+            while not closed.done():
+                payload = json.dumps(self.snapshot.as_dict()).encode()
+                writer.write(self._frame(payload))
+                await writer.drain()
+                await asyncio.wait([closed], timeout=self.interval)
+        finally:
+            self._sockets.discard(writer)
+            closed.cancel()
+            await asyncio.gather(closed, return_exceptions=True)
+
+    async def _wait_for_close(self, reader):
+        # We never expect data from the client; just watch for close / EOF
+        try:
+            while True:
+                head = await reader.readexactly(2)
+                opcode = head[0] & 0x0F
+                length = head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", await reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", await reader.readexactly(8))[0]
+                if head[1] & 0x80:
+                    await reader.readexactly(4)   # mask key
+                await reader.readexactly(length)
+                if opcode == 0x8:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+
+    @staticmethod
+    def _frame(payload):
+        """Single unmasked text frame (server -> client)."""
+        n = len(payload)
+        if n < 126:
+            header = struct.pack("!BB", 0x81, n)
+        elif n < 1 << 16:
+            header = struct.pack("!BBH", 0x81, 126, n)
+        else:
+            header = struct.pack("!BBQ", 0x81, 127, n)
+        return header + payload
@@ -0,0 +1,208 @@
+# optimize.py
+"""
+Budgeted search over pricing / reservation parameters.
+
+Successive halving over seeds: start many random candidates on a few seeds,
+keep the best 1/eta of them (by Pareto rank on revenue vs. queue time vs.
+turnaways), give the survivors eta times more seeds, and repeat. Every
+(parameters, seed) evaluation is appended to a JSON-lines study file, so a
+resumed study only runs points it has not finished yet.
+
+    python optimize.py --study study.jsonl --candidates 27 --min-seeds 2
+
+Prints the Pareto front: max revenue, min avg queue time, min turnaways.
+Means over different numbers of seeds are not compared: each round's front
+is taken among that round's candidates, and every front entry carries the
+seed budget behind it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+
+from headless import iter_replications
+
+DEFAULT_SPACE = {
+    "base_per_minute": (0.012, 0.040),
+    "price_a": (0.2, 1.0),
+    "price_b": (0.0, 4.0),
+    "margin_of_safety": (5, 60),
+    "miss_probability": (0.0, 0.3),
+}
+
+# (kpi, +1 to maximise / -1 to minimise)
+OBJECTIVES = [("revenue", 1), ("avg_queue_time", -1), ("did_not_enter", -1)]
+
+
+def job_key(params, seed):
+    blob = json.dumps({"params": params, "seed": seed}, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+class StudyLog:
+    """Append-only JSON-lines record of finished evaluations."""
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue    # half-written line from a killed run
+                    self.results[entry["key"]] = entry["row"]
+
+    def get(self, params, seed):
+        return self.results.get(job_key(params, seed))
+
+    def add(self, params, seed, row):
+        key = job_key(params, seed)
+        self.results[key] = row
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"key": key, "params": params, "seed": seed, "row": row}, default=str) + "\n")
+
+
+def sample_space(space, n, rng):
+    points = []
+    for _ in range(n):
+        point = {}
+        for name, (lo, hi) in space.items():
+            if isinstance(lo, int) and isinstance(hi, int):
+                point[name] = rng.randint(lo, hi)
+            else:
+                point[name] = round(rng.uniform(lo, hi), 6)
+        points.append(point)
+    return points
+
+
+def dominates(a, b):
+    """True if objective vector a is at least as good as b everywhere and better somewhere."""
+    better = False
+    for (name, sign) in OBJECTIVES:
+        if a[name] * sign < b[name] * sign:
+            return False
+        if a[name] * sign > b[name] * sign:
+            better = True
+    return better
+
+
+def pareto_ranks(scores):
+    """Rank = number of other points that dominate this one (0 = on the front)."""
+    return [sum(1 for other in scores if other is not s and dominates(other, s)) for s in scores]
+
+
+def pareto_front(evaluated):
+    """Non-dominated entries of [(params, mean_kpis), ...]."""
+    means = [m for _, m in evaluated]
+    ranks = pareto_ranks(means)
+    return [entry for entry, rank in zip(evaluated, ranks) if rank == 0]
+
+
+class SuccessiveHalving:
+    def __init__(self, space=None, base_params=None, study_path=None, n_candidates=27,
+                 min_seeds=2, eta=3, max_seeds=None, processes=None, seed=0):
+        self.space = space or DEFAULT_SPACE
+        # price_a / price_b tune the quadratic-occupancy curve, so ask for it explicitly
+        self.base_params = base_params or {"parking_strategy": "Reservations", "pricing_policy": "quadratic-occupancy"}
+        self.log = StudyLog(study_path)
+        self.n_candidates = n_candidates
+        self.min_seeds = min_seeds
+        self.eta = eta
+        self.max_seeds = max_seeds
+        self.processes = processes
+        self.rng = random.Random(seed)   # same seed -> same candidates on resume
+        self.evaluations_run = 0
+
+    def _params(self, candidate):
+        return dict(self.base_params, **candidate)
+
+    def evaluate(self, candidates, n_seeds):
+        """Mean KPIs per candidate over seeds 0..n_seeds-1, using the study log."""
+        todo = []
+        for cand in candidates:
+            params = self._params(cand)
+            for seed in range(n_seeds):
+                if self.log.get(params, seed) is None:
+                    todo.append((params, seed))
+
+        # Log each run as it finishes, so a killed round keeps what it completed
+        for i, row in iter_replications(todo, processes=self.processes):
+            params, seed = todo[i]
+            self.log.add(params, seed, {name: row[name] for name, _ in OBJECTIVES})
+            self.evaluations_run += 1
+
+        results = []
+        for cand in candidates:
+            params = self._params(cand)
+            rows = [self.log.get(params, seed) for seed in range(n_seeds)]
+            means = {name: sum(r[name] for r in rows) / len(rows) for name, _ in OBJECTIVES}
+            results.append((cand, means))
+        return results
+
+    def run(self):
+        """Run the halving rounds; returns the front as [(candidate, mean_kpis, n_seeds), ...]."""
+        candidates = sample_space(self.space, self.n_candidates, self.rng)
+        n_seeds = self.min_seeds
+        history = []
+        while True:
+            results = self.evaluate(candidates, n_seeds)
+            history.append((n_seeds, results))
+            keep = max(1, len(candidates) // self.eta)
+            if len(candidates) <= 1 or (self.max_seeds and n_seeds * self.eta > self.max_seeds):
+                break
+            ranks = pareto_ranks([m for _, m in results])
+            # Pareto rank first, revenue as the tie-break
+            order = sorted(range(len(results)), key=lambda i: (ranks[i], -results[i][1]["revenue"]))
+            candidates = [results[i][0] for i in order[:keep]]
+            n_seeds *= self.eta
+
+        # Rank only within a round (same seeds); keep each candidate at the largest budget it reached
+        best = {}
+        for n, results in history:
+            for cand, means in results:
+                best[json.dumps(cand, sort_keys=True)] = None
+            for cand, means in pareto_front(results):
+                best[json.dumps(cand, sort_keys=True)] = (cand, means, n)
+        return [entry for entry in best.values() if entry is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimise pricing / reservation parameters")
+    parser.add_argument("--study", default="study.jsonl", help="evaluation log (resumable)")
+    parser.add_argument("--strategy", default="Reservations")
+    parser.add_argument("--pricing", default="quadratic-occupancy",
+                        help="pricing policy whose price_a / price_b are searched")
+    parser.add_argument("--candidates", type=int, default=27)
+    parser.add_argument("--min-seeds", type=int, default=2)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--max-seeds", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    opt = SuccessiveHalving(
+        base_params={"parking_strategy": args.strategy, "pricing_policy": args.pricing},
+        study_path=args.study,
+        n_candidates=args.candidates,
+        min_seeds=args.min_seeds,
+        eta=args.eta,
+        max_seeds=args.max_seeds,
+        processes=args.processes,
+        seed=args.seed,
+    )
+    front = opt.run()
+    print(f"Ran {opt.evaluations_run} new evaluations. Pareto front (per seed budget):")
+    for cand, means, n_seeds in sorted(front, key=lambda e: (-e[2], -e[1]["revenue"])):
+        kpis = ", ".join(f"{k}={v:.3f}" for k, v in means.items())
+        print(f"  [{n_seeds} seeds] {cand} -> {kpis}")
+
+
+if __name__ == "__main__":
+    main()
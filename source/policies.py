@@ -0,0 +1,248 @@
+# policies.py
+"""
+Pluggable pricing, admission and reservation policies.
+
+A policy is referenced by its registered name, by (name, params) or by an
+instance, e.g.
+
+    ParkingLotModel(..., pricing_policy=("quadratic-occupancy", {"a": 0.4, "b": 2.5}))
+
+`parking_strategy` still works and just picks the default trio from
+STRATEGY_DEFAULTS. Policies read the model's incrementally maintained
+occupancy (model.occupancy()), never rescan the spaces.
+"""
+PRICING_POLICIES = {}
+ADMISSION_POLICIES = {}
+RESERVATION_POLICIES = {}
+
+_REGISTRIES = {
+    "pricing": PRICING_POLICIES,
+    "admission": ADMISSION_POLICIES,
+    "reservation": RESERVATION_POLICIES,
+}
+
+
+def register_policy(kind, name):
+    """Class decorator that registers a policy under `name`."""
+    registry = _REGISTRIES[kind]
+
+    def decorator(cls):
+        if name in registry:
+            raise ValueError(f"{kind} policy '{name}' is already registered.")
+        cls.name = name
+        registry[name] = cls
+        return cls
+
+    return decorator
+
+
+def make_policy(kind, spec):
+    """Build a policy from a name, a (name, params) pair or an instance."""
+    registry = _REGISTRIES[kind]
+    if isinstance(spec, Policy):
+        return spec
+    params = {}
+    if isinstance(spec, (tuple, list)):
+        spec, params = spec
+    if spec not in registry:
+        raise ValueError(f"Unknown {kind} policy '{spec}'. Known: {sorted(registry)}")
+    return registry[spec](**(params or {}))
+
+
+class Policy:
+    name = None
+
+    def __init__(self, **params):
+        self.params = params
+
+    def spec(self):
+        """(name, params) pair that rebuilds this policy; used as a cache key."""
+        return (self.name, dict(self.params))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.params})"
+
+
+# ---------------- Pricing ----------------
+class PricingPolicy(Policy):
+    """Sets the per-minute rate and how demand reacts to it."""
+
+    dynamic = False
+
+    def rate(self, model, occupancy):
+        return model.base_per_minute
+
+    def demand_response(self, model, base_prob, rate):
+        """Arrival probability after the price-elasticity adjustment."""
+        reference = self.params.get("reference_rate", 0.022)
+        if rate < reference:
+            # the lower the price, the higher the prob
+            return min(base_prob * (1.0 + (reference - rate) / reference), 1.0) * 3
+        return base_prob
+
+
+@register_policy("pricing", "flat")
+class FlatPricing(PricingPolicy):
+    pass
+
+
+@register_policy("pricing", "quadratic-occupancy")
+class QuadraticOccupancyPricing(PricingPolicy):
+    """rate = base * (a + b * occupancy^2); defaults match the original curve."""
+
+    dynamic = True
+
+    def __init__(self, a=0.5, b=2.0, **params):
+        super().__init__(a=a, b=b, **params)
+        self.a = a
+        self.b = b
+
+    def rate(self, model, occupancy):
+        return model.base_per_minute * (self.a + self.b * occupancy ** 2)
+
+
+@register_policy("pricing", "step-occupancy")
+class StepOccupancyPricing(PricingPolicy):
+    """
+    Piecewise-constant multiplier: `thresholds` are occupancy cut points and
+    `multipliers` has one more entry than `thresholds`.
+    """
+
+    dynamic = True
+
+    def __init__(self, thresholds=(0.5, 0.8), multipliers=(0.75, 1.0, 1.5), **params):
+        if len(multipliers) != len(thresholds) + 1:
+            raise ValueError("step-occupancy needs len(multipliers) == len(thresholds) + 1")
+        super().__init__(thresholds=list(thresholds), multipliers=list(multipliers), **params)
+        self.thresholds = list(thresholds)
+        self.multipliers = list(multipliers)
+
+    def rate(self, model, occupancy):
+        for cut, mult in zip(self.thresholds, self.multipliers):
+            if occupancy < cut:
+                return model.base_per_minute * mult
+        return model.base_per_minute * self.multipliers[-1]
+
+
+# ---------------- Admission ----------------
+class AdmissionPolicy(Policy):
+    """
+    Decides whether an arriving standard driver enters. Returns None to
+    admit, "price" for a price turnaway or "queue" for a long-queue balk.
+    """
+
+    def admit(self, model, wtp, queue_len):
+        return None
+
+
+@register_policy("admission", "accept-all")
+class AcceptAll(AdmissionPolicy):
+    pass
+
+
+@register_policy("admission", "wtp-only")
+class WillingnessToPay(AdmissionPolicy):
+    def admit(self, model, wtp, queue_len):
+        if model.current_per_minute_rate > wtp:
+            return "price"
+        return None
+
+
+@register_policy("admission", "wtp-balking")
+class WillingnessToPayWithBalking(AdmissionPolicy):
+    """Original rule: price check, then balk at long queues when nearly full."""
+
+    def __init__(self, min_queue=6, min_occupancy=0.80, per_car=0.05, **params):
+        super().__init__(min_queue=min_queue, min_occupancy=min_occupancy, per_car=per_car, **params)
+        self.min_queue = min_queue
+        self.min_occupancy = min_occupancy
+        self.per_car = per_car
+
+    def admit(self, model, wtp, queue_len):
+        if model.current_per_minute_rate > wtp:
+            return "price"
+        if queue_len >= self.min_queue and model.current_occupancy > self.min_occupancy:
+            p = model.p_not_enter_long_queue + self.per_car * (queue_len - self.min_queue)
+            if model.random.random() < p:
+                return "queue"
+        return None
+
+
+# ---------------- Reservations ----------------
+class ReservationPolicy(Policy):
+    """Whether bays take reservations, and how those reservations behave."""
+
+    enabled = False
+    mode = "none"
+    pregenerate = True      # bays draw their own schedule at construction
+    vectorized = False      # ...or the model samples all bays at once (reservation_table.py)
+    online = False          # bookings arrive during the run (booking.py)
+
+    def __init__(self, margin_of_safety=25, miss_probability=0.05, **params):
+        super().__init__(margin_of_safety=margin_of_safety, miss_probability=miss_probability, **params)
+        self.margin_of_safety = margin_of_safety
+        self.miss_probability = miss_probability
+
+
+@register_policy("reservation", "none")
+class NoReservations(ReservationPolicy):
+    pass
+
+
+@register_policy("reservation", "vip-schedule")
+class ScheduledReservations(ReservationPolicy):
+    """
+    Every bay is a VIPParkingSpace with a pre-generated reservation schedule.
+    vectorized=True samples all bays' schedules at once with NumPy.
+    """
+
+    enabled = True
+    mode = "reservations"
+
+    def __init__(self, margin_of_safety=25, miss_probability=0.05, vectorized=False, **params):
+        if vectorized:
+            params["vectorized"] = True
+        super().__init__(margin_of_safety=margin_of_safety, miss_probability=miss_probability, **params)
+        self.vectorized = vectorized
+
+
+@register_policy("reservation", "online-booking")
+class OnlineBookingReservations(ReservationPolicy):
+    """
+    Bays start empty; booking requests arrive while the lot runs and are
+    accepted against future capacity, with overbooking against the expected
+    no-show rate.
+    """
+
+    enabled = True
+    mode = "reservations"
+    pregenerate = False
+    online = True
+
+    def __init__(self, margin_of_safety=25, miss_probability=0.05, overbooking=True, booking_prob=0.03,
+                 lead_min=60, lead_max=300, **params):
+        super().__init__(margin_of_safety=margin_of_safety, miss_probability=miss_probability,
+                         overbooking=overbooking, booking_prob=booking_prob,
+                         lead_min=lead_min, lead_max=lead_max, **params)
+        self.overbooking = overbooking
+        self.booking_prob = booking_prob
+        self.lead_min = lead_min
+        self.lead_max = lead_max
+
+
+# parking_strategy -> default (pricing, admission, reservation)
+STRATEGY_DEFAULTS = {
+    "Standard": ("flat", "wtp-balking", "none"),
+    "Dynamic Pricing": ("quadratic-occupancy", "wtp-balking", "none"),
+    "Reservations": ("flat", "wtp-balking", "vip-schedule"),
+}
+
+
+def policies_for(parking_strategy, pricing=None, admission=None, reservation=None):
+    """Resolve the policy trio for a model, falling back to the strategy defaults."""
+    defaults = STRATEGY_DEFAULTS.get(parking_strategy, STRATEGY_DEFAULTS["Standard"])
+    return (
+        make_policy("pricing", pricing if pricing is not None else defaults[0]),
+        make_policy("admission", admission if admission is not None else defaults[1]),
+        make_policy("reservation", reservation if reservation is not None else defaults[2]),
+    )
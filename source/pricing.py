@@ -0,0 +1,82 @@
+# pricing.py
+"""
+Pricing engine: decides *when* the pricing policy is re-evaluated.
+
+    mode="exact"      recompute on every standard arrival (the original
+                      behaviour, kept for validation)
+    mode="scheduled"  recompute every `every_n_steps` steps and/or whenever
+                      occupancy moves into a new bucket; arrivals in between
+                      reuse the cached rate
+
+Every rate change is appended to `history` as (step, rate, occupancy), so the
+price path can be analysed after the run.
+"""
+import bisect
+
+
+class PricingEngine:
+    MODES = ("exact", "scheduled")
+
+    def __init__(self, policy, mode="exact", every_n_steps=None, occupancy_buckets=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown pricing mode '{mode}'. Use one of {self.MODES}.")
+        if mode == "scheduled" and every_n_steps is None and occupancy_buckets is None:
+            raise ValueError("Scheduled pricing needs every_n_steps and/or occupancy_buckets.")
+
+        self.policy = policy
+        self.mode = mode
+        self.every_n_steps = every_n_steps
+
+        # An int means that many equal-width buckets; a list gives the cut points
+        if isinstance(occupancy_buckets, int):
+            self.bucket_edges = [i / occupancy_buckets for i in range(1, occupancy_buckets)]
+        else:
+            self.bucket_edges = sorted(occupancy_buckets) if occupancy_buckets else None
+
+        self.rate = None
+        self.last_update_step = None
+        self.last_bucket = None
+        self.recomputations = 0
+        self.history = []
+
+    def _bucket(self, occupancy):
+        return bisect.bisect_right(self.bucket_edges, occupancy)
+
+    def _recompute(self, model, occupancy):
+        rate = self.policy.rate(model, occupancy)
+        self.recomputations += 1
+        self.last_update_step = model.current_step
+        if self.bucket_edges is not None:
+            self.last_bucket = self._bucket(occupancy)
+        if rate != self.rate:
+            self.history.append((model.current_step, rate, occupancy))
+        self.rate = rate
+        return rate
+
+    def _due(self, model, occupancy):
+        if self.rate is None:
+            return True
+        if self.every_n_steps is not None and model.current_step - self.last_update_step >= self.every_n_steps:
+            return True
+        if self.bucket_edges is not None and self._bucket(occupancy) != self.last_bucket:
+            return True
+        return False
+
+    def on_arrival(self, model):
+        """Rate quoted to an arriving driver."""
+        occupancy = model.occupancy()
+        if self.mode == "exact" or self._due(model, occupancy):
+            return self._recompute(model, occupancy)
+        return self.rate
+
+    def on_step(self, model):
+        """Called once per model step; returns None in exact mode."""
+        if self.mode != "scheduled":
+            return None
+        occupancy = model.occupancy()
+        if self._due(model, occupancy):
+            return self._recompute(model, occupancy)
+        return self.rate
+
+    def history_rows(self):
+        return [{"step": s, "rate": r, "occupancy": o} for s, r, o in self.history]
@@ -0,0 +1,170 @@
+# result_cache.py
+"""
+On-disk memoisation of whole-run results.
+
+The key is a SHA-256 of the ParkingLotModel constructor arguments, the seed,
+the number of steps, a hash of the simulation source (every module in this
+directory, so a newly added one is covered without listing it) and, for
+trace demand, a hash of the trace file's contents. Editing the model or
+the trace invalidates old entries. Values are the KPI row and, optionally,
+the collected time series.
+
+Storage is a single SQLite file: SQLite's locking makes it safe for many
+pool workers (or machines on a shared volume) to read and write at once.
+Total payload size is bounded; the least recently used entries are evicted.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_code_hash = None
+_file_hashes = {}
+
+
+def sim_sources():
+    """Source files hashed into the code version: every module here but the tests."""
+    return sorted(name for name in os.listdir(HERE)
+                  if name.endswith(".py") and not name.startswith("test_"))
+
+
+def code_version():
+    """Hash of the simulation source files."""
+    global _code_hash
+    if _code_hash is None:
+        h = hashlib.sha256()
+        for name in sim_sources():
+            with open(os.path.join(HERE, name), "rb") as f:
+                h.update(name.encode())
+                h.update(f.read())
+        _code_hash = h.hexdigest()
+    return _code_hash
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents, remembered per (path, size, mtime)."""
+    st = os.stat(path)
+    memo = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if memo not in _file_hashes:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        _file_hashes[memo] = h.hexdigest()
+    return _file_hashes[memo]
+
+
+def demand_data_version(spec):
+    """Hash of the trace a demand source reads, or None for generated demand."""
+    if isinstance(spec, (tuple, list)):
+        params = spec[1] or {}
+    else:
+        params = getattr(spec, "params", None) or {}
+    if not isinstance(params, dict):
+        return None
+    if params.get("path") is not None:
+        return file_hash(params["path"])
+    # A wrapping source (e.g. inbox) may read a trace underneath
+    return demand_data_version(params["base"]) if params.get("base") is not None else None
+
+
+def scenario_key(model_kwargs, seed, steps=None):
+    kwargs = {k: v for k, v in model_kwargs.items() if k != "results_path"}
+    blob = json.dumps(
+        {"kwargs": kwargs, "seed": seed, "steps": steps, "code": code_version(),
+         "data": demand_data_version(kwargs.get("demand_source"))},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path="result_cache.sqlite", max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+
+    # Connections can't cross fork(); open one per process, lazily
+    def _db(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._pid = os.getpid()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " summary TEXT NOT NULL,"
+                " series BLOB,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results(last_access)")
+        return self._conn
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_conn"] = None
+        state["_pid"] = None
+        return state
+
+    def get(self, key, with_series=False):
+        """(summary, series or None) for `key`, or None on a miss."""
+        db = self._db()
+        cols = "summary, series" if with_series else "summary, NULL"
+        row = db.execute(f"SELECT {cols} FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        if with_series and row[1] is None:
+            # Entry exists but without the series we need
+            self.misses += 1
+            return None
+        db.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        series = json.loads(zlib.decompress(row[1])) if row[1] is not None else None
+        return json.loads(row[0]), series
+
+    def put(self, key, summary, series=None):
+        blob = zlib.compress(json.dumps(series, default=str).encode()) if series is not None else None
+        text = json.dumps(summary, default=str)
+        size = len(text) + (len(blob) if blob else 0)
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, summary, series, size, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, text, blob, size, now, now),
+            )
+            self._evict(db)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM results ORDER BY last_access").fetchall():
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        db = self._db()
+        count, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"entries": count, "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        self._db().execute("DELETE FROM results")
@@ -1,12 +1,37 @@
 # run.py
-from server import make_server
+import argparse
+import sys
+
+from server import make_replay_server, make_server
 
 if __name__ == "__main__":
-    server = make_server()
+    parser = argparse.ArgumentParser(description="Parking lot simulation server")
+    parser.add_argument("--delta", action="store_true",
+                        help="stream layout once and per-step diffs afterwards")
+    parser.add_argument("--frame-skip", type=int, default=1,
+                        help="model steps per browser frame")
+    parser.add_argument("--replay", default=None,
+                        help="replay a trajectory recorded with headless.py --trajectory")
+    parser.add_argument("--sessions", action="store_true",
+                        help="one model per browser tab, stepped by a background thread")
+    parser.add_argument("--max-sessions", type=int, default=8,
+                        help="concurrent sessions (with --sessions)")
+    parser.add_argument("--idle-timeout", type=float, default=300,
+                        help="seconds before an idle tab's session is dropped (with --sessions)")
+    parser.add_argument("--steps-per-second", type=float, default=None,
+                        help="pace of each session's model; default as fast as it runs (with --sessions)")
+    parser.add_argument("--max-steps", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.replay:
+        server = make_replay_server(args.replay)
+    else:
+        server = make_server(delta=args.delta, frame_skip=args.frame_skip, sessions=args.sessions,
+                             max_sessions=args.max_sessions, idle_timeout=args.idle_timeout,
+                             steps_per_second=args.steps_per_second, max_steps=args.max_steps)
     try:
         server.launch()      # blocks until Ctrl+C
     except KeyboardInterrupt:
         print("Shutting down server...")
         # The process will exit here, freeing the port.~
         sys.exit(0)
-        pass
\ No newline at end of file
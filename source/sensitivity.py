@@ -0,0 +1,274 @@
+# sensitivity.py
+"""
+Global sensitivity analysis: which inputs drive revenue and queue time.
+
+    python sensitivity.py sobol --n 64 --cache sa_cache.sqlite
+    python sensitivity.py morris --trajectories 20 --cache sa_cache.sqlite
+
+Sobol: Saltelli design built from a Sobol low-discrepancy sequence, with
+first-order (Saltelli 2010) and total-order (Jansen) indices and bootstrap
+confidence intervals. Morris: elementary effects (mu*, sigma) from random
+one-at-a-time trajectories on a p-level grid.
+
+Both designs are prefix-stable: the first N points of a larger design are
+the N points of the smaller one, so with a ResultCache only new points run
+when the sample size grows.
+"""
+import argparse
+import random
+import statistics
+
+from headless import run_replications
+
+# name -> (low, high); ints are rounded after scaling
+DEFAULT_PROBLEM = {
+    "arrival_prob": (0.3, 1.0),
+    "p_not_enter_long_queue": (0.5, 1.0),
+    "reservation_base_price": (1.0, 6.0),
+    "margin_of_safety": (5, 60),
+    "miss_probability": (0.0, 0.3),
+    "wtp_median": (0.025, 0.07),
+    "wtp_sigma": (0.1, 0.6),
+}
+DEFAULT_OUTPUTS = ["revenue", "avg_queue_time", "did_not_enter", "reservation_revenue"]
+
+# Joe & Kuo (2008) direction numbers for dimensions 2..21: (s, a, m_1..m_s)
+_JOE_KUO = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+_BITS = 32
+
+
+def _direction_numbers(dim):
+    """Direction numbers V[1..BITS] (scaled to 32 bits) for one dimension."""
+    if dim == 0:
+        return [1 << (_BITS - i) for i in range(1, _BITS + 1)]
+    s, a, m = _JOE_KUO[dim - 1]
+    v = [0] * (_BITS + 1)
+    for i in range(1, min(s, _BITS) + 1):
+        v[i] = m[i - 1] << (_BITS - i)
+    for i in range(s + 1, _BITS + 1):
+        v[i] = v[i - s] ^ (v[i - s] >> s)
+        for k in range(1, s):
+            v[i] ^= ((a >> (s - 1 - k)) & 1) * v[i - k]
+    return v[1:]
+
+
+def sobol_points(n, dims, skip=1):
+    """Points skip..skip+n-1 of the `dims`-dimensional Sobol sequence (Gray-code order)."""
+    if dims > len(_JOE_KUO) + 1:
+        raise ValueError(f"Sobol sequence supports at most {len(_JOE_KUO) + 1} dimensions.")
+    directions = [_direction_numbers(d) for d in range(dims)]
+    x = [0] * dims
+    points = []
+    for i in range(skip + n):
+        if i >= skip:
+            points.append([xi / 2.0 ** _BITS for xi in x])
+        # index of the lowest zero bit of i
+        c, j = 0, i
+        while j & 1:
+            j >>= 1
+            c += 1
+        for d in range(dims):
+            x[d] ^= directions[d][c]
+    return points
+
+
+def scale(unit, problem):
+    params = {}
+    for u, (name, (lo, hi)) in zip(unit, problem.items()):
+        value = lo + u * (hi - lo)
+        if isinstance(lo, int) and isinstance(hi, int):
+            value = int(round(value))
+        params[name] = value
+    return params
+
+
+def evaluate(points, problem, outputs, seeds, base_params, processes, cache):
+    """Mean output per design point, over `seeds` (common random numbers)."""
+    jobs = []
+    for unit in points:
+        params = dict(base_params, **scale(unit, problem))
+        jobs.extend((params, seed) for seed in seeds)
+    rows = run_replications(jobs, processes=processes, cache=cache)
+    n_seeds = len(seeds)
+    results = []
+    for i in range(len(points)):
+        chunk = rows[i * n_seeds:(i + 1) * n_seeds]
+        results.append({out: sum(float(r[out]) for r in chunk) / n_seeds for out in outputs})
+    return results
+
+
+# ---------------- Sobol ----------------
+def saltelli_design(n, k):
+    """A, B and the k AB_i matrices (as unit-cube points) from a 2k-dim Sobol sequence."""
+    base = sobol_points(n, 2 * k)
+    A = [p[:k] for p in base]
+    B = [p[k:] for p in base]
+    AB = [[a[:i] + [b[i]] + a[i + 1:] for a, b in zip(A, B)] for i in range(k)]
+    return A, B, AB
+
+
+def sobol_indices(fA, fB, fAB):
+    """First-order and total-order indices from model outputs on A, B and AB_i."""
+    var = statistics.pvariance(fA + fB)
+    if var == 0:
+        return [0.0] * len(fAB), [0.0] * len(fAB)
+    n = len(fA)
+    first, total = [], []
+    for fABi in fAB:
+        first.append(sum(fB[j] * (fABi[j] - fA[j]) for j in range(n)) / n / var)
+        total.append(0.5 * sum((fA[j] - fABi[j]) ** 2 for j in range(n)) / n / var)
+    return first, total
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    idx = min(int(q * len(values)), len(values) - 1)
+    return values[idx]
+
+
+def sobol_analysis(n=64, problem=None, outputs=None, seeds=(0,), base_params=None,
+                   processes=None, cache=None, n_bootstrap=200, confidence=0.95, rng_seed=0):
+    problem = problem or DEFAULT_PROBLEM
+    outputs = outputs or DEFAULT_OUTPUTS
+    base_params = base_params or {"parking_strategy": "Reservations"}
+    k = len(problem)
+
+    A, B, AB = saltelli_design(n, k)
+    points = A + B + [p for block in AB for p in block]
+    results = evaluate(points, problem, outputs, seeds, base_params, processes, cache)
+
+    rng = random.Random(rng_seed)
+    alpha = (1 - confidence) / 2
+    report = {}
+    for out in outputs:
+        y = [r[out] for r in results]
+        fA, fB = y[:n], y[n:2 * n]
+        fAB = [y[2 * n + i * n:2 * n + (i + 1) * n] for i in range(k)]
+        S1, ST = sobol_indices(fA, fB, fAB)
+
+        boot_s1 = [[] for _ in range(k)]
+        boot_st = [[] for _ in range(k)]
+        for _ in range(n_bootstrap):
+            idx = [rng.randrange(n) for _ in range(n)]
+            s1, st = sobol_indices([fA[j] for j in idx], [fB[j] for j in idx],
+                                   [[fABi[j] for j in idx] for fABi in fAB])
+            for i in range(k):
+                boot_s1[i].append(s1[i])
+                boot_st[i].append(st[i])
+
+        report[out] = {
+            name: {
+                "S1": S1[i],
+                "S1_ci": (_percentile(boot_s1[i], alpha), _percentile(boot_s1[i], 1 - alpha)),
+                "ST": ST[i],
+                "ST_ci": (_percentile(boot_st[i], alpha), _percentile(boot_st[i], 1 - alpha)),
+            }
+            for i, name in enumerate(problem)
+        }
+    return report
+
+
+# ---------------- Morris ----------------
+def morris_trajectories(r, k, levels=4, rng_seed=0):
+    """r one-at-a-time trajectories of k+1 points on a `levels`-level grid."""
+    rng = random.Random(rng_seed)
+    delta = levels / (2.0 * (levels - 1))
+    grid = [i / (levels - 1) for i in range(levels // 2)]   # starts that leave room for +delta
+    trajectories = []
+    for _ in range(r):
+        x = [rng.choice(grid) for _ in range(k)]
+        order = list(range(k))
+        rng.shuffle(order)
+        points = [list(x)]
+        for i in order:
+            x[i] += delta
+            points.append(list(x))
+        trajectories.append((order, points))
+    return trajectories, delta
+
+
+def morris_analysis(trajectories=20, problem=None, outputs=None, seeds=(0,), base_params=None,
+                    processes=None, cache=None, levels=4, rng_seed=0):
+    problem = problem or DEFAULT_PROBLEM
+    outputs = outputs or DEFAULT_OUTPUTS
+    base_params = base_params or {"parking_strategy": "Reservations"}
+    k = len(problem)
+
+    trajs, delta = morris_trajectories(trajectories, k, levels, rng_seed)
+    points = [p for _, pts in trajs for p in pts]
+    results = evaluate(points, problem, outputs, seeds, base_params, processes, cache)
+
+    report = {}
+    for out in outputs:
+        effects = [[] for _ in range(k)]
+        for t, (order, _) in enumerate(trajs):
+            ys = [r[out] for r in results[t * (k + 1):(t + 1) * (k + 1)]]
+            for step, i in enumerate(order):
+                effects[i].append((ys[step + 1] - ys[step]) / delta)
+        report[out] = {
+            name: {
+                "mu_star": statistics.fmean(abs(e) for e in effects[i]),
+                "mu": statistics.fmean(effects[i]),
+                "sigma": statistics.pstdev(effects[i]),
+            }
+            for i, name in enumerate(problem)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Global sensitivity analysis of ParkingLotModel")
+    parser.add_argument("method", choices=["sobol", "morris"])
+    parser.add_argument("--n", type=int, default=64, help="Sobol base sample size")
+    parser.add_argument("--trajectories", type=int, default=20, help="Morris trajectories")
+    parser.add_argument("--seeds", type=int, default=1, help="replications per design point")
+    parser.add_argument("--strategy", default="Reservations")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--cache", default="sensitivity_cache.sqlite",
+                        help="result cache; growing --n / --trajectories only runs new points")
+    args = parser.parse_args()
+
+    from result_cache import ResultCache
+    cache = ResultCache(args.cache)
+    common = dict(seeds=tuple(range(args.seeds)), base_params={"parking_strategy": args.strategy},
+                  processes=args.processes, cache=cache)
+
+    if args.method == "sobol":
+        report = sobol_analysis(n=args.n, **common)
+        for out, table in report.items():
+            print(f"\n{out}")
+            for name, r in sorted(table.items(), key=lambda kv: -kv[1]["ST"]):
+                print(f"  {name:24s} S1={r['S1']:+.3f} [{r['S1_ci'][0]:+.3f}, {r['S1_ci'][1]:+.3f}]"
+                      f"  ST={r['ST']:.3f} [{r['ST_ci'][0]:.3f}, {r['ST_ci'][1]:.3f}]")
+    else:
+        report = morris_analysis(trajectories=args.trajectories, **common)
+        for out, table in report.items():
+            print(f"\n{out}")
+            for name, r in sorted(table.items(), key=lambda kv: -kv[1]["mu_star"]):
+                print(f"  {name:24s} mu*={r['mu_star']:.3f} mu={r['mu']:+.3f} sigma={r['sigma']:.3f}")
+    print(f"\ncache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -95,34 +95,22 @@ def agent_portrayal(agent):
 
 class KPIPanel(TextElement):
     def render(self, model):
-        arrivals = model.total_arrivals
+        kpi = model.kpi_summary()
 
-        didnt_enter = model.total_not_entered_long_queue + model.total_price_turnaways
+        arrivals = kpi["arrivals"]
+        didnt_enter = kpi["did_not_enter"]
 
-        avg_queue_time = (
-            model.total_queue_time / model.total_queued_drivers
-            if model.total_queued_drivers > 0
-            else 0.0
-        )
+        avg_queue_time = kpi["avg_queue_time"]
 
-        
-        res_fulfilled = getattr(model, "total_reservations_fulfilled", 0)
-        reserved_idle = sum(
-            1
-            for s in getattr(model, "parking_spaces", [])
-            if isinstance(s, VIPParkingSpace) and s.is_reserved and not s.occupied
-        )
-        reservations_not_fulfilled = getattr(model, "total_reservations_missed", 0)
+        res_fulfilled = kpi["reservations_fulfilled"]
+        reserved_idle = kpi["reserved_idle"]
+        reservations_not_fulfilled = kpi["reservations_missed"]
 
-        occupancy_pct = model.current_occupancy * 100
-        avg_occupancy_pct = (
-            model.total_occupancy_sum / model.occupancy_samples * 100
-            if model.occupancy_samples > 0 else 0.0
-        )
+        occupancy_pct = kpi["occupancy"] * 100
+        avg_occupancy_pct = kpi["avg_occupancy"] * 100
 
-        reservation_fee = getattr(model, "reservation_base_price", 2.5)
-        reservations_fulfilled = getattr(model, "total_reservations_fulfilled", 0)
-        total_extra_revenue_from_reservations = reservations_fulfilled * reservation_fee
+        reservation_fee = kpi["reservation_fee"]
+        total_extra_revenue_from_reservations = kpi["reservation_revenue"]
 
         # --- CSS STYLING APPLIED HERE ---
         # position: fixed -> Keeps it on the screen even if you scroll
@@ -145,7 +133,7 @@ class KPIPanel(TextElement):
         ">
             <h3 style="margin-top:0; border-bottom: 2px solid #333; padding-bottom:5px;">📊 Simulation KPIs</h3>
 
-            <b>Step:</b> {model.current_step}<br><br>
+            <b>Step:</b> {kpi['step']}<br><br>
 
             <h4 style="margin-bottom:5px; color: #444;">🚗 Traffic</h4>
             <table style="width:100%">
@@ -155,14 +143,16 @@ class KPIPanel(TextElement):
 
             <h4 style="margin-bottom:5px; color: #444;">⏱ Queue</h4>
             <table style="width:100%">
-                <tr><td>Total Queue Time</td><td style="text-align:right">{model.total_queue_time}</td></tr>
-                <tr><td>Queued Drivers</td><td style="text-align:right">{model.total_queued_drivers}</td></tr>
+                <tr><td>Total Queue Time</td><td style="text-align:right">{kpi['total_queue_time']}</td></tr>
+                <tr><td>Queued Drivers</td><td style="text-align:right">{kpi['queued_drivers']}</td></tr>
                 <tr><td>Avg Queue Time</td><td style="text-align:right">{avg_queue_time:.2f}</td></tr>
+                <tr><td>Queue Time p50/p95/p99</td><td style="text-align:right">{kpi['queue_wait_p50']:.0f} / {kpi['queue_wait_p95']:.0f} / {kpi['queue_wait_p99']:.0f}</td></tr>
+                <tr><td>In Queue Now</td><td style="text-align:right">{kpi['queue_length']}</td></tr>
             </table>
 
             <h4 style="margin-bottom:5px; color: #444;">🅿️ Reservations</h4>
             <table style="width:100%">
-                <tr><td>Mode</td><td style="text-align:right">{getattr(model, 'reservation_mode', 'none')}</td></tr>
+                <tr><td>Mode</td><td style="text-align:right">{kpi['reservation_mode']}</td></tr>
                 <tr><td>Reservation Fee (€)</td><td style="text-align:right">€{reservation_fee:.2f}</td></tr>
                 <tr><td>Fulfilled</td><td style="text-align:right">{res_fulfilled}</td></tr>
                 <tr><td>Reservations Extra Revenue</td><td style="text-align:right">€{total_extra_revenue_from_reservations:.2f}</td></tr>
@@ -172,10 +162,10 @@ class KPIPanel(TextElement):
 
             <h4 style="margin-bottom:5px; color: #444;">💰 Financials</h4>
             <table style="width:100%">
-                <tr><td>Strategy</td><td style="text-align:right">{model.parking_strategy}</td></tr>
-                <tr><td>Rate (€/min)</td><td style="text-align:right">€{getattr(model, 'current_per_minute_rate', model.base_per_minute):.3f}</td></tr>
-                <tr><td>Total Revenue</td><td style="text-align:right">€{getattr(model, 'total_revenue', 0.0):.2f}</td></tr>
-                <tr><td>Lost (Price)</td><td style="text-align:right">{getattr(model, 'total_price_turnaways', 0)}</td></tr>
+                <tr><td>Strategy</td><td style="text-align:right">{kpi['strategy']}</td></tr>
+                <tr><td>Rate (€/min)</td><td style="text-align:right">€{kpi['rate']:.3f}</td></tr>
+                <tr><td>Total Revenue</td><td style="text-align:right">€{kpi['revenue']:.2f}</td></tr>
+                <tr><td>Lost (Price)</td><td style="text-align:right">{kpi['turnaways_price']}</td></tr>
             </table>
 
             <h4 style="margin-bottom:5px; color: #444;">📈 Occupancy</h4>
@@ -186,10 +176,13 @@ class KPIPanel(TextElement):
         </div>
         """
 
-def make_server(port=8521):
-    width, height = 50, 20
-
-    grid = CanvasGrid(agent_portrayal, width, height, 500, 360)
+def make_elements(width=50, height=20, delta=False):
+    """The grid, charts and KPI panel; a fresh set per call (delta elements keep per-viewer state)."""
+    if delta:
+        from delta_viz import DeltaGrid
+        grid = DeltaGrid(agent_portrayal, width, height, 500, 360)
+    else:
+        grid = CanvasGrid(agent_portrayal, width, height, 500, 360)
 
     # Note: canvas_width reduced slightly to 800 to accommodate sidebar
     # Main chart: occupancy and cars inside
@@ -237,16 +230,55 @@ def make_server(port=8521):
         canvas_height=250,
     )
 
-    kpi_panel = KPIPanel()
+    if delta:
+        from delta_viz import DeltaKPIPanel
+        kpi_panel = DeltaKPIPanel()
+    else:
+        kpi_panel = KPIPanel()
 
-    server = ModularServer(
+    return [grid,
+            main_chart,
+            queue_chart,
+            reservation_chart,
+            occupancy_chart,
+            kpi_panel]
+
+
+def make_server(port=8521, delta=False, frame_skip=1, sessions=False, max_sessions=8, idle_timeout=300,
+                steps_per_second=None, max_steps=1000):
+    """
+    delta=True streams the static layout once and only per-step changes
+    afterwards (see delta_viz.py). frame_skip > 1 advances the model that many
+    steps per browser frame, so the view samples the run instead of pacing it.
+
+    sessions=True gives every browser tab its own model, stepped by a
+    background thread at up to `steps_per_second` (see sessions.py); at most
+    `max_sessions` run at once and tabs idle for `idle_timeout` seconds are
+    dropped. frame_skip does not apply there: the view shows whatever step
+    the session has reached.
+    """
+    width, height = 50, 20
+    elements = make_elements(width, height, delta)
+
+    server_cls = ModularServer
+    server_kwargs = {}
+    if sessions:
+        from sessions import SessionServer
+        server_cls = SessionServer
+        server_kwargs.update(
+            element_factory=lambda: make_elements(width, height, delta),
+            max_sessions=max_sessions,
+            idle_timeout=idle_timeout,
+            steps_per_second=steps_per_second,
+        )
+    elif delta or frame_skip > 1:
+        from delta_viz import FrameSkipServer
+        server_cls = FrameSkipServer
+        server_kwargs["frame_skip"] = frame_skip
+
+    server = server_cls(
         ParkingLotModel,
-        [grid,
-          main_chart, 
-          queue_chart, 
-          reservation_chart, 
-          occupancy_chart, 
-          kpi_panel],
+        elements,
         "Minimal Private Parking Lot",
         {
             "width": width,
@@ -259,7 +291,29 @@ def make_server(port=8521):
             "arrival_prob": 0.7,  
             "has_reservation_lane": False  
         },
+        **server_kwargs,
+    )
+    server.max_steps = max_steps
+    server.port = port
+    return server
+
+
+def make_replay_server(path, port=8521):
+    """Serve a recorded trajectory (see trajectory.py) without re-simulating."""
+    import json
+    from trajectory import ReplayModel
+
+    with open(path + ".meta.json") as f:
+        meta = json.load(f)
+    width, height = meta["width"], meta["height"]
+    grid = CanvasGrid(agent_portrayal, width, height, 500, 360)
+
+    server = ModularServer(
+        ReplayModel,
+        [grid],
+        "Parking Lot Replay",
+        {"path": path},
     )
-    server.max_steps = 1000
+    server.max_steps = meta["n_steps"]
     server.port = port
-    return server
\ No newline at end of file
+    return server
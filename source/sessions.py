@@ -0,0 +1,278 @@
+# sessions.py
+"""
+One background simulation per browser tab.
+
+ModularServer keeps a single model and steps it inside the websocket
+handler. Every open tab shares that model, and a step only happens when a
+browser frame asks for one. SessionServer gives each websocket connection
+its own SimulationSession instead. Each session runs its ParkingLotModel
+in a daemon thread at its own pace (`steps_per_second`, or flat out if
+None) up to max_steps. A frame request renders the model at whatever step
+it has reached. Rendering takes the session lock, so it always sees a
+state between two steps.
+
+SessionPool caps how many sessions run at once. A tab that has not asked
+for a frame in `idle_timeout` seconds (closed, or paused with Stop) has
+its session evicted. When the pool is full, a new tab first evicts the
+session that has been idle longest. If every session is active, the new
+connection is refused with close code 1013 ("try again later").
+
+Parameter changes and Reset apply only to the tab that sent them. Session
+models do not write the end-of-day simulation_results.csv: every session
+would overwrite the same file.
+
+    python run.py --sessions --max-sessions 12 --steps-per-second 50
+"""
+import copy
+import itertools
+import threading
+import time
+
+import tornado.escape
+from mesa.visualization.ModularVisualization import ModularServer, SocketHandler
+from mesa.visualization.UserParam import UserParam
+
+
+def model_params(model_kwargs):
+    """Plain constructor arguments from ModularServer-style kwargs (UserParams resolved)."""
+    params = {}
+    for key, val in model_kwargs.items():
+        if isinstance(val, UserParam):
+            if val.param_type == "static_text":
+                continue
+            params[key] = val.value
+        else:
+            params[key] = val
+    return params
+
+
+class SimulationSession:
+    def __init__(self, session_id, model_cls, model_kwargs, elements, max_steps=None, steps_per_second=None):
+        self.session_id = session_id
+        self.model_cls = model_cls
+        self.model_kwargs = copy.deepcopy(model_kwargs)     # edits stay in this tab
+        self.elements = elements
+        self.max_steps = max_steps
+        self.steps_per_second = steps_per_second
+
+        self.lock = threading.Lock()
+        self.model = None
+        self.final_sent = False
+        self.last_seen = time.monotonic()
+        self.created = time.time()
+        self._stop = threading.Event()
+        self._thread = None
+        self._build()
+
+    def _build(self):
+        self.model = self.model_cls(**model_params(self.model_kwargs))
+        # Sessions run side by side in one working directory; none writes the end-of-day CSV
+        if hasattr(self.model, "results_path"):
+            self.model.results_path = None
+        self.model.running = True
+        self.final_sent = False
+        for element in self.elements:
+            if hasattr(element, "request_full"):
+                element.request_full()
+
+    # ---- background stepping ----
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"session-{self.session_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        interval = 1.0 / self.steps_per_second if self.steps_per_second else 0.0
+        next_step = time.monotonic()
+        while not self._stop.is_set():
+            with self.lock:
+                if not self.finished:
+                    self.model.step()
+                finished = self.finished
+            if finished:
+                # Wait for a reset (or stop) instead of spinning
+                self._stop.wait(0.2)
+                next_step = time.monotonic()
+                continue
+            if interval:
+                next_step += interval
+                self._stop.wait(max(0.0, next_step - time.monotonic()))
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    @property
+    def finished(self):
+        model = self.model
+        return not model.running or (self.max_steps is not None and getattr(model, "current_step", 0) >= self.max_steps)
+
+    # ---- viewer side ----
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_seen
+
+    def render(self):
+        """Visualization state of the model as it is now."""
+        with self.lock:
+            return [element.render(self.model) for element in self.elements]
+
+    def reset(self):
+        with self.lock:
+            self._build()
+
+    def set_param(self, name, value):
+        if name not in self.model_kwargs:
+            return
+        if isinstance(self.model_kwargs[name], UserParam):
+            self.model_kwargs[name].value = value
+        else:
+            self.model_kwargs[name] = value
+
+    def status(self):
+        return {
+            "session": self.session_id,
+            "step": getattr(self.model, "current_step", None),
+            "finished": self.finished,
+            "idle_seconds": round(self.idle_seconds(), 1),
+            "created": self.created,
+        }
+
+
+class SessionPool:
+    """At most `max_sessions` live sessions; idle ones are evicted by a reaper thread."""
+
+    def __init__(self, max_sessions=8, idle_timeout=300):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.evicted = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._stop = threading.Event()
+        self._reaper = None
+        if idle_timeout:
+            self._reaper = threading.Thread(target=self._reap, name="session-reaper", daemon=True)
+            self._reaper.start()
+
+    def open(self, make_session):
+        """Start make_session(session_id), first evicting an idle session if full; None if refused."""
+        with self._lock:
+            if len(self.sessions) >= self.max_sessions:
+                idle = max(self.sessions.values(), key=lambda s: s.idle_seconds(), default=None)
+                if idle is None or not self.idle_timeout or idle.idle_seconds() < min(self.idle_timeout, 5.0):
+                    self.refused += 1
+                    return None
+                self._drop(idle.session_id)
+            session_id = f"s{next(self._ids)}"
+            session = make_session(session_id)
+            self.sessions[session_id] = session
+        return session.start()
+
+    def get(self, session_id):
+        with self._lock:
+            return self.sessions.get(session_id)
+
+    def close(self, session_id):
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.stop()
+
+    def _drop(self, session_id):
+        session = self.sessions.pop(session_id)
+        session.stop()
+        self.evicted += 1
+
+    def evict_idle(self):
+        """Drop sessions idle longer than idle_timeout; returns their ids."""
+        with self._lock:
+            stale = [sid for sid, s in self.sessions.items() if s.idle_seconds() > self.idle_timeout]
+            for sid in stale:
+                self._drop(sid)
+        return stale
+
+    def _reap(self):
+        period = max(1.0, self.idle_timeout / 4)
+        while not self._stop.wait(period):
+            self.evict_idle()
+
+    def shutdown(self):
+        self._stop.set()
+        with self._lock:
+            sessions, self.sessions = list(self.sessions.values()), {}
+        for session in sessions:
+            session.stop()
+
+    def stats(self):
+        with self._lock:
+            live = [s.status() for s in self.sessions.values()]
+        return {"sessions": live, "max_sessions": self.max_sessions, "evicted": self.evicted, "refused": self.refused}
+
+
+class SessionSocketHandler(SocketHandler):
+    """Binds a websocket to its own SimulationSession and serves its latest state."""
+
+    session = None
+
+    def open(self):
+        app = self.application
+        self.session = app.pool.open(app.make_session)
+        if self.session is None:
+            self.close(code=1013, reason="All simulation sessions are busy; try again later.")
+            return
+        super().open()
+
+    def on_close(self):
+        if self.session is not None:
+            self.application.pool.close(self.session.session_id)
+            self.session = None
+
+    def on_message(self, message):
+        msg = tornado.escape.json_decode(message)
+        session = self.session
+        if session is None or self.application.pool.get(session.session_id) is not session:
+            # Evicted while the tab sat idle
+            self.write_message({"type": "end"})
+            return
+        session.touch()
+
+        if msg["type"] == "get_step":
+            if session.final_sent:
+                self.write_message({"type": "end"})
+                return
+            if session.finished:
+                session.final_sent = True
+            self.write_message({"type": "viz_state", "data": session.render()})
+        elif msg["type"] == "reset":
+            session.reset()
+            self.write_message({"type": "viz_state", "data": session.render()})
+        elif msg["type"] == "submit_params":
+            session.set_param(msg["param"], msg["value"])
+
+
+class SessionServer(ModularServer):
+    socket_handler = (r"/ws", SessionSocketHandler)
+
+    def __init__(self, model_cls, visualization_elements, name="Mesa Model", model_params=None, port=None,
+                 element_factory=None, max_sessions=8, idle_timeout=300, steps_per_second=None):
+        # Per-session element copies; delta elements keep per-viewer state
+        self.element_factory = element_factory or (lambda: copy.deepcopy(visualization_elements))
+        self.steps_per_second = steps_per_second
+        self.pool = SessionPool(max_sessions=max_sessions, idle_timeout=idle_timeout)
+        super().__init__(model_cls, visualization_elements, name, model_params, port)
+        # ModularServer hard-codes its /ws route; host rules added later take precedence
+        self.add_handlers(r".*", [self.socket_handler])
+
+    def reset_model(self):
+        # No shared model: each session builds its own
+        self.model = None
+
+    def make_session(self, session_id):
+        return SimulationSession(session_id, self.model_cls, self.model_kwargs, self.element_factory(),
+                                 max_steps=self.max_steps, steps_per_second=self.steps_per_second)
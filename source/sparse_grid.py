@@ -0,0 +1,82 @@
+# sparse_grid.py
+"""
+Coordinate-keyed grid for large, mostly empty layouts.
+
+Mesa's MultiGrid allocates a list for every cell of the width x height
+bounding box up front. The parking lot only ever has agents on the road
+row, the belt rows and the bay rows, and most of a multi-level garage's
+bounding box would be empty. SparseGrid keeps a dict from (x, y) to the
+agents in that cell, and a cell exists only while it holds an agent. So
+construction is O(1), and memory is proportional to the occupied cells
+(bays, gates and cars), whatever the bounding box.
+
+It offers the part of the MultiGrid API that ParkingLotModel, Driver,
+Lifecycle and the visualization use: width, height, torus, place_agent,
+move_agent, remove_agent, get_cell_list_contents,
+iter_cell_list_contents, is_cell_empty and out_of_bounds. Agents within a
+cell keep their insertion order, as in MultiGrid, so seeded runs are
+identical on both backends.
+
+    ParkingLotModel(50, 20, 10, grid_backend="sparse")
+"""
+
+
+class SparseGrid:
+    def __init__(self, width, height, torus=False):
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.cells = {}          # (x, y) -> [agents], only non-empty cells
+
+    def out_of_bounds(self, pos):
+        x, y = pos
+        return x < 0 or x >= self.width or y < 0 or y >= self.height
+
+    def torus_adj(self, pos):
+        if not self.out_of_bounds(pos):
+            return pos
+        if not self.torus:
+            raise Exception("Point out of bounds, and space non-toroidal.")
+        return pos[0] % self.width, pos[1] % self.height
+
+    def place_agent(self, agent, pos):
+        pos = self.torus_adj(pos)
+        cell = self.cells.get(pos)
+        if cell is None:
+            self.cells[pos] = [agent]
+        else:
+            cell.append(agent)
+        agent.pos = pos
+
+    def remove_agent(self, agent):
+        pos = agent.pos
+        cell = self.cells[pos]
+        cell.remove(agent)
+        if not cell:
+            del self.cells[pos]
+        agent.pos = None
+
+    def move_agent(self, agent, pos):
+        pos = self.torus_adj(pos)
+        self.remove_agent(agent)
+        self.place_agent(agent, pos)
+
+    def iter_cell_list_contents(self, cell_list):
+        cells = self.cells
+        for pos in cell_list:
+            cell = cells.get(pos)
+            if cell:
+                yield from cell
+
+    def get_cell_list_contents(self, cell_list):
+        return list(self.iter_cell_list_contents(cell_list))
+
+    def is_cell_empty(self, pos):
+        return pos not in self.cells
+
+    def occupied_cells(self):
+        """(pos, agents) for every non-empty cell."""
+        return self.cells.items()
+
+    def __len__(self):
+        return sum(len(cell) for cell in self.cells.values())
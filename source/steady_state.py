@@ -0,0 +1,232 @@
+# steady_state.py
+"""
+Warm-up detection and steady-state stopping for long runs.
+
+Every run starts with an empty lot, so averages over the whole run are
+biased low. SteadyStateMonitor is a step observer. It keeps 5-step batch
+means of occupancy, queue length and revenue per step. Every
+`check_every` steps it does two things:
+
+  * runs MSER-5 on each series and truncates the model's averaged KPIs
+    and DataCollector rows (ParkingLotModel.set_warmup) to the latest
+    warm-up estimate;
+  * builds batch-means confidence intervals on what is left, and stops the
+    run (model.running = False) once every interval is tight enough.
+
+    monitor = SteadyStateMonitor(rel_precision=0.05)
+    model.step_observers.append(monitor)
+    while model.running and model.current_step < max_steps:
+        model.step()
+    monitor.summary()
+
+or `python headless.py --steps 60000 --steady-state`.
+
+Batches cover whole days, so the confidence intervals need many days. On
+the default lot at 5% precision, Standard and Reservations runs settle
+after about 50 days (50000 steps). Dynamic Pricing's queue length is
+burstier and is still about 12% wide after 100 days; use --precision 0.15
+for it, or accept an unconverged run at the cap.
+"""
+import math
+from statistics import NormalDist
+
+# Two-sided 95% Student t quantiles by degrees of freedom
+_T975 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+         9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 19: 2.093, 20: 2.086, 24: 2.064,
+         29: 2.045, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980}
+
+
+def t_quantile(df, confidence=0.95):
+    """Two-sided Student t critical value (table for 95%, normal otherwise)."""
+    if confidence == 0.95:
+        known = [d for d in _T975 if d <= df]
+        if known and df <= 120:
+            return _T975[max(known)]
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def mser(values, max_fraction=0.5):
+    """
+    MSER truncation point: the number of leading values to delete that
+    minimises the variance of the remaining mean, searched over the first
+    `max_fraction` of the series. Returns None if the minimum sits at the
+    edge of the search range (no steady state detected yet).
+    """
+    n = len(values)
+    if n < 4:
+        return None
+    limit = int(n * max_fraction)
+    # Suffix sums make every candidate O(1)
+    suffix_sum = [0.0] * (n + 1)
+    suffix_sq = [0.0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        suffix_sum[i] = suffix_sum[i + 1] + values[i]
+        suffix_sq[i] = suffix_sq[i + 1] + values[i] * values[i]
+
+    best_d, best = 0, math.inf
+    for d in range(limit + 1):
+        m = n - d
+        mean = suffix_sum[d] / m
+        stat = (suffix_sq[d] - m * mean * mean) / (m * m)
+        if stat < best:
+            best_d, best = d, stat
+    if best_d >= limit:
+        return None
+    return best_d
+
+
+def batch_means_ci(values, n_batches=20, confidence=0.95, cycle=1):
+    """
+    (mean, half-width) from `n_batches` non-overlapping batch means. The
+    batch size is rounded down to a multiple of `cycle`, the period of a
+    periodic series, so every batch covers whole periods. Batches that cut
+    through the daily demand cycle differ by time of day, not noise, and the
+    interval never tightens. With fewer than n_batches full periods the
+    half-width is inf.
+    """
+    size = len(values) // n_batches
+    size -= size % max(1, cycle)
+    if size == 0:
+        return (sum(values) / len(values) if values else 0.0), math.inf
+    used = values[:size * n_batches]
+    means = [sum(used[i * size:(i + 1) * size]) / size for i in range(n_batches)]
+    grand = sum(means) / n_batches
+    var = sum((m - grand) ** 2 for m in means) / (n_batches - 1)
+    return grand, t_quantile(n_batches - 1, confidence) * math.sqrt(var / n_batches)
+
+
+class _Delta:
+    """Per-step increase of a cumulative model attribute."""
+
+    def __init__(self, attr):
+        self.attr = attr
+        self.last = 0.0
+
+    def __call__(self, model):
+        value = getattr(model, self.attr)
+        delta = value - self.last
+        self.last = value
+        return delta
+
+
+def default_metrics():
+    return {
+        "occupancy": lambda m: m.current_occupancy,
+        "queue_length": lambda m: len(m.main_gate_queue),
+        "revenue_per_step": _Delta("total_revenue"),
+    }
+
+
+class SteadyStateMonitor:
+    """
+    Step observer for warm-up truncation and early stopping.
+
+    A metric has converged when its batch-means half-width is at most
+    max(rel_precision * |mean|, abs_precision). Stopping also needs at least
+    `min_batch_size` steps per batch after the warm-up.
+
+    Batches span whole multiples of `cycle_steps` (default: the model's
+    day_length_steps), so a run needs at least n_batches days past the
+    warm-up before it can stop.
+    """
+
+    BATCH = 5
+
+    def __init__(self, metrics=None, check_every=100, n_batches=10, min_batch_size=10, cycle_steps=None,
+                 rel_precision=0.05, abs_precision=0.01, confidence=0.95, truncate=True, stop=True):
+        self.metrics = metrics or default_metrics()
+        self.check_every = check_every
+        self.n_batches = n_batches
+        self.cycle_steps = cycle_steps
+        self.min_batch_size = min_batch_size
+        self.rel_precision = rel_precision
+        self.abs_precision = abs_precision
+        self.confidence = confidence
+        self.truncate = truncate
+        self.stop = stop
+
+        # 5-step batch means per metric, plus the raw sums set_warmup needs
+        self.batches = {name: [] for name in self.metrics}
+        self._partial = {name: 0.0 for name in self.metrics}
+        self._occ, self._qt, self._qd = [], [], []
+        self._partial_acc = [0.0, 0, 0]
+        self._last_qt = 0
+        self._last_qd = 0
+        self._n = 0
+
+        self.warmup_steps = 0
+        self.converged = False
+        self.converged_step = None
+        self.intervals = {}
+
+    def __call__(self, model):
+        for name, fn in self.metrics.items():
+            self._partial[name] += fn(model)
+        qt = model.total_queue_time
+        qd = model.total_queued_drivers
+        self._partial_acc[0] += model.current_occupancy
+        self._partial_acc[1] += qt - self._last_qt
+        self._partial_acc[2] += qd - self._last_qd
+        self._last_qt, self._last_qd = qt, qd
+        self._n += 1
+
+        if self._n % self.BATCH == 0:
+            for name in self.metrics:
+                self.batches[name].append(self._partial[name] / self.BATCH)
+                self._partial[name] = 0.0
+            self._occ.append(self._partial_acc[0])
+            self._qt.append(self._partial_acc[1])
+            self._qd.append(self._partial_acc[2])
+            self._partial_acc = [0.0, 0, 0]
+
+        if self._n % self.check_every == 0:
+            self.check(model)
+
+    def detect_warmup(self):
+        """Longest MSER-5 truncation over all metrics, or None if any has not settled."""
+        longest = 0
+        for series in self.batches.values():
+            d = mser(series)
+            if d is None:
+                return None
+            longest = max(longest, d)
+        return longest * self.BATCH
+
+    def check(self, model):
+        warmup = self.detect_warmup()
+        if warmup is None:
+            return
+        if self.truncate and warmup != self.warmup_steps:
+            k = warmup // self.BATCH
+            model.set_warmup(warmup, sum(self._occ[:k]), sum(self._qt[:k]), sum(self._qd[:k]))
+        self.warmup_steps = warmup
+
+        k = warmup // self.BATCH
+        cycle = (self.cycle_steps or getattr(model, "day_length_steps", None) or 1) // self.BATCH
+        settled = True
+        for name, series in self.batches.items():
+            kept = series[k:]
+            mean, hw = batch_means_ci(kept, self.n_batches, self.confidence, cycle)
+            self.intervals[name] = (mean, hw)
+            if len(kept) * self.BATCH < self.n_batches * self.min_batch_size:
+                settled = False
+            elif hw > max(self.rel_precision * abs(mean), self.abs_precision):
+                settled = False
+
+        if settled and not self.converged:
+            self.converged = True
+            self.converged_step = model.current_step
+            if self.stop:
+                model.running = False
+
+    def summary(self):
+        """Flat dict for KPI rows: warm-up, convergence and each metric's mean and half-width."""
+        out = {
+            "warmup_steps": self.warmup_steps,
+            "steady_state_converged": self.converged,
+            "steady_state_step": self.converged_step,
+        }
+        for name, (mean, hw) in self.intervals.items():
+            out[f"ss_{name}_mean"] = mean
+            out[f"ss_{name}_halfwidth"] = hw
+        return out
@@ -0,0 +1,266 @@
+# surrogate.py
+"""
+Surrogate models of the simulation: Gaussian processes trained on stored
+headless / sweep results that predict KPIs for unseen parameter combinations
+in microseconds, plus active sampling that picks the next runs where the
+surrogate is least certain.
+
+    python surrogate.py headless_results.csv --inputs arrival_prob n_spaces \
+        --suggest 8 --bounds arrival_prob=0.3:1.0 n_spaces=5:30
+
+Only NumPy is needed (it ships with Mesa).
+"""
+import argparse
+import csv
+import math
+import random
+
+import numpy as np
+
+DEFAULT_INPUTS = ["arrival_prob", "n_spaces", "reservation_base_price", "margin_of_safety", "price_a", "price_b"]
+DEFAULT_OUTPUTS = ["revenue", "avg_occupancy", "avg_queue_time"]
+
+
+def load_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def rows_to_arrays(rows, inputs, outputs):
+    """Numeric X (n, d) and Y (n, k) from result rows; rows missing a column are skipped."""
+    X, Y = [], []
+    for row in rows:
+        try:
+            x = [float(row[name]) for name in inputs]
+            y = [float(row[name]) for name in outputs]
+        except (KeyError, TypeError, ValueError):
+            continue
+        X.append(x)
+        Y.append(y)
+    return np.asarray(X, dtype=float), np.asarray(Y, dtype=float)
+
+
+class GaussianProcess:
+    """
+    GP regression with an ARD squared-exponential kernel on standardised
+    inputs and outputs. Length-scales (one per input) and the noise-to-signal
+    ratio are fitted by coordinate search on the log marginal likelihood; for
+    each of those the signal variance takes its closed-form optimum (the
+    likelihood profiled over it). Good enough for the few thousand points a
+    sweep produces.
+    """
+
+    def __init__(self, noise=0.05, n_search_rounds=3):
+        self.noise = noise
+        self.n_search_rounds = n_search_rounds
+        self.lengthscales = None
+        self.signal = 1.0
+
+    # ---------- kernel ----------
+    def _correlation(self, A, B):
+        a = A / self.lengthscales
+        b = B / self.lengthscales
+        sq = (a * a).sum(1)[:, None] + (b * b).sum(1)[None, :] - 2.0 * a @ b.T
+        return np.exp(-0.5 * np.maximum(sq, 0.0))
+
+    def _kernel(self, A, B):
+        return self.signal * self._correlation(A, B)
+
+    def _profile_likelihood(self, X, y, ratio):
+        """
+        (log marginal likelihood, signal variance) for K = signal * (R + ratio * I),
+        with signal = y' (R + ratio * I)^-1 y / n, the value that maximises it.
+        """
+        n = len(X)
+        C = self._correlation(X, X) + ratio * np.eye(n)
+        try:
+            L = np.linalg.cholesky(C)
+        except np.linalg.LinAlgError:
+            return -np.inf, self.signal
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, y))
+        signal = max(float(y @ alpha) / n, 1e-12)
+        loglik = -0.5 * n * (math.log(signal) + 1.0 + math.log(2 * math.pi)) - np.log(np.diag(L)).sum()
+        return float(loglik), signal
+
+    # ---------- fit / predict ----------
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.x_mean = X.mean(0)
+        self.x_std = np.where(X.std(0) > 0, X.std(0), 1.0)
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.0
+        Xs = (X - self.x_mean) / self.x_std
+        ys = (y - self.y_mean) / self.y_std
+
+        self.lengthscales = np.ones(X.shape[1])
+        self.signal = 1.0
+        ratio = self.noise
+        grid = [0.25, 0.5, 1.0, 2.0, 4.0]
+        for _ in range(self.n_search_rounds):
+            for d in range(X.shape[1]):
+                best = (-np.inf, self.lengthscales[d])
+                for scale in grid:
+                    self.lengthscales[d] = scale
+                    best = max(best, (self._profile_likelihood(Xs, ys, ratio)[0], scale))
+                self.lengthscales[d] = best[1]
+            best = (-np.inf, ratio)
+            for candidate in [0.01, 0.05, 0.1, 0.3]:
+                best = max(best, (self._profile_likelihood(Xs, ys, candidate)[0], candidate))
+            ratio = best[1]
+        self.signal = self._profile_likelihood(Xs, ys, ratio)[1]
+        self.noise = ratio * self.signal
+
+        K = self._kernel(Xs, Xs) + self.noise * np.eye(len(Xs))
+        self._L = np.linalg.cholesky(K)
+        self._alpha = np.linalg.solve(self._L.T, np.linalg.solve(self._L, ys))
+        self._Xs = Xs
+        return self
+
+    def predict(self, X, return_std=False):
+        Xs = (np.atleast_2d(np.asarray(X, dtype=float)) - self.x_mean) / self.x_std
+        k = self._kernel(Xs, self._Xs)
+        mean = k @ self._alpha * self.y_std + self.y_mean
+        if not return_std:
+            return mean
+        v = np.linalg.solve(self._L, k.T)
+        var = np.maximum(self.signal - (v * v).sum(0), 1e-12)
+        return mean, np.sqrt(var) * self.y_std
+
+
+class KPISurrogate:
+    """One GP per KPI over a shared set of input parameters."""
+
+    def __init__(self, inputs=None, outputs=None, noise=0.05):
+        self.inputs = list(inputs or DEFAULT_INPUTS)
+        self.outputs = list(outputs or DEFAULT_OUTPUTS)
+        self.models = {name: GaussianProcess(noise=noise) for name in self.outputs}
+        self.n_train = 0
+
+    def fit_rows(self, rows):
+        X, Y = rows_to_arrays(rows, self.inputs, self.outputs)
+        if len(X) < 2:
+            raise ValueError(f"Need at least 2 complete rows to fit, got {len(X)}.")
+        for j, name in enumerate(self.outputs):
+            self.models[name].fit(X, Y[:, j])
+        self.n_train = len(X)
+        return self
+
+    def _matrix(self, params):
+        if isinstance(params, dict):
+            params = [params]
+        return np.array([[float(p[name]) for name in self.inputs] for p in params])
+
+    def predict(self, params):
+        """{kpi: value} for one parameter dict, or {kpi: array} for a list."""
+        X = self._matrix(params)
+        out = {name: gp.predict(X) for name, gp in self.models.items()}
+        if isinstance(params, dict):
+            return {name: float(v[0]) for name, v in out.items()}
+        return out
+
+    def predict_with_std(self, params):
+        X = self._matrix(params)
+        return {name: gp.predict(X, return_std=True) for name, gp in self.models.items()}
+
+    def uncertainty(self, params):
+        """Sum over KPIs of the predictive std relative to each KPI's spread."""
+        X = self._matrix(params)
+        total = np.zeros(len(X))
+        for gp in self.models.values():
+            _, std = gp.predict(X, return_std=True)
+            total += std / gp.y_std
+        return total
+
+
+def sample_candidates(bounds, n, rng=random):
+    """Uniform random parameter dicts; integer bounds give integer values."""
+    out = []
+    for _ in range(n):
+        point = {}
+        for name, (lo, hi) in bounds.items():
+            if isinstance(lo, int) and isinstance(hi, int):
+                point[name] = rng.randint(lo, hi)
+            else:
+                point[name] = rng.uniform(lo, hi)
+        out.append(point)
+    return out
+
+
+def suggest_next(surrogate, bounds, n=1, n_candidates=2000, rng=random):
+    """
+    The `n` candidate points with the highest predictive uncertainty, kept
+    apart from each other so one batch doesn't pile onto the same corner.
+    """
+    candidates = sample_candidates(bounds, n_candidates, rng=rng)
+    scores = surrogate.uncertainty(candidates)
+    spans = np.array([float(hi - lo) or 1.0 for lo, hi in bounds.values()])
+    X = np.array([[c[name] for name in bounds] for c in candidates]) / spans
+
+    chosen = []
+    for idx in np.argsort(-scores):
+        if all(np.linalg.norm(X[idx] - X[j]) > 0.05 for j in chosen):
+            chosen.append(idx)
+        if len(chosen) == n:
+            break
+    return [candidates[i] for i in chosen]
+
+
+def active_learning(rows, bounds, rounds, batch=4, seeds=(0,), base_params=None,
+                    processes=None, outputs=None):
+    """
+    Fit on `rows`, run the `batch` most uncertain points (each for every seed)
+    on the headless pool, refit, and repeat for `rounds`. Returns the fitted
+    surrogate and all rows (old + new).
+    """
+    from headless import run_replications
+
+    rows = list(rows)
+    surrogate = KPISurrogate(inputs=list(bounds), outputs=outputs).fit_rows(rows)
+    for _ in range(rounds):
+        points = suggest_next(surrogate, bounds, n=batch)
+        jobs = [(dict(base_params or {}, **p), seed) for p in points for seed in seeds]
+        rows.extend(run_replications(jobs, processes=processes))
+        surrogate = KPISurrogate(inputs=list(bounds), outputs=outputs).fit_rows(rows)
+    return surrogate, rows
+
+
+def _parse_bounds(items):
+    bounds = {}
+    for item in items:
+        name, _, rng = item.partition("=")
+        lo, _, hi = rng.partition(":")
+        if "." in lo or "." in hi:
+            bounds[name] = (float(lo), float(hi))
+        else:
+            bounds[name] = (int(lo), int(hi))
+    return bounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a KPI surrogate on stored results")
+    parser.add_argument("results", help="CSV written by headless.py / sweep runs")
+    parser.add_argument("--inputs", nargs="+", default=None)
+    parser.add_argument("--outputs", nargs="+", default=DEFAULT_OUTPUTS)
+    parser.add_argument("--bounds", nargs="*", default=[], help="name=lo:hi for --suggest")
+    parser.add_argument("--suggest", type=int, default=0, help="print this many next runs")
+    args = parser.parse_args()
+
+    rows = load_rows(args.results)
+    bounds = _parse_bounds(args.bounds)
+    inputs = args.inputs or list(bounds) or DEFAULT_INPUTS
+    surrogate = KPISurrogate(inputs=inputs, outputs=args.outputs).fit_rows(rows)
+    print(f"Fitted on {surrogate.n_train} rows: inputs={inputs} outputs={args.outputs}")
+    for name, gp in surrogate.models.items():
+        print(f"  {name}: lengthscales={np.round(gp.lengthscales, 2).tolist()} "
+              f"signal={gp.signal:.3g} noise={gp.noise:.3g}")
+
+    if args.suggest:
+        if not bounds:
+            parser.error("--suggest needs --bounds")
+        for point in suggest_next(surrogate, bounds, n=args.suggest):
+            print(point)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+# sweep_queue.py
+"""
+Resumable sweeps across machines, coordinated through one SQLite file.
+
+submit writes one row per (parameters, seed) job into a job table. Workers
+on any machine that can see the file claim jobs, run them with
+headless.run_scenario and write the KPI row back. No server is needed.
+
+  * Claims are atomic. A claim is a BEGIN IMMEDIATE transaction, so only
+    one worker at a time can move a job from "queued" to "running".
+  * Claims are leases. A running worker renews its lease every
+    lease_seconds / 3. If a worker dies, its job goes back to "queued"
+    once the lease expires. After max_attempts claims, the job is marked
+    "failed".
+  * Sweeps resume. Jobs are keyed by (sweep, parameters, seed, steps), so
+    submitting the same sweep again only adds missing jobs. Workers never
+    claim jobs that are already done.
+
+    python sweep_queue.py submit --db /shared/sweep.sqlite --name big \\
+        --strategies Standard "Dynamic Pricing" --seeds 200 --param arrival_prob=0.5,0.7
+    python sweep_queue.py work --db /shared/sweep.sqlite --processes 8     # on every node
+    python sweep_queue.py status --db /shared/sweep.sqlite
+    python sweep_queue.py export --db /shared/sweep.sqlite --name big --out big.csv
+
+SQLite on a shared volume relies on the filesystem's file locks. That
+holds for local disks and for NFS with working lockd. The database keeps
+the default rollback journal, because WAL mode does not work over network
+filesystems.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+STATUSES = ("queued", "running", "done", "failed")
+
+
+def job_key(params, seed, steps=None):
+    blob = json.dumps({"params": params, "seed": seed, "steps": steps}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SweepQueue:
+    def __init__(self, path="sweep_queue.sqlite", lease_seconds=600, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._conn = None
+        self._pid = None
+
+    # Connections can't cross fork(); open one per process, lazily
+    def _db(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._pid = os.getpid()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY,"
+                " sweep TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " params TEXT NOT NULL,"
+                " seed INTEGER,"
+                " steps INTEGER,"
+                " status TEXT NOT NULL DEFAULT 'queued',"
+                " worker TEXT,"
+                " lease_until REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " submitted REAL NOT NULL,"
+                " finished REAL,"
+                " code TEXT,"
+                " error TEXT,"
+                " result TEXT,"
+                " UNIQUE (sweep, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, sweep)")
+        return self._conn
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_conn"] = None
+        state["_pid"] = None
+        return state
+
+    def _transaction(self, fn):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db)
+            db.execute("COMMIT")
+            return result
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    # ---- coordinator ----
+    def submit(self, sweep, jobs, steps=None):
+        """Add (params, seed) jobs to `sweep`; returns (added, already present)."""
+        now = time.time()
+        rows = [(sweep, job_key(params, seed, steps), json.dumps(params, sort_keys=True), seed, steps, now)
+                for params, seed in jobs]
+
+        def insert(db):
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO jobs (sweep, key, params, seed, steps, submitted) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return db.total_changes - before
+
+        added = self._transaction(insert)
+        return added, len(rows) - added
+
+    def requeue_expired(self, now=None):
+        """Return expired claims to the queue (or fail them after max_attempts); returns how many."""
+        now = now if now is not None else time.time()
+        return self._transaction(lambda db: self._requeue_expired(db, now))
+
+    def _requeue_expired(self, db, now):
+        failed = db.execute(
+            "UPDATE jobs SET status = 'failed', worker = NULL, lease_until = NULL, error = 'lease expired'"
+            " WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+            (now, self.max_attempts),
+        ).rowcount
+        requeued = db.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL"
+            " WHERE status = 'running' AND lease_until < ?",
+            (now,),
+        ).rowcount
+        return failed + requeued
+
+    # ---- workers ----
+    def claim(self, worker, sweep=None):
+        """Atomically take the oldest queued job: {"id", "sweep", "params", "seed", "steps"} or None."""
+        def take(db):
+            now = time.time()
+            self._requeue_expired(db, now)
+            query = "SELECT id, sweep, params, seed, steps FROM jobs WHERE status = 'queued'"
+            args = ()
+            if sweep is not None:
+                query += " AND sweep = ?"
+                args = (sweep,)
+            row = db.execute(query + " ORDER BY id LIMIT 1", args).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1"
+                " WHERE id = ?",
+                (worker, now + self.lease_seconds, row[0]),
+            )
+            return {"id": row[0], "sweep": row[1], "params": json.loads(row[2]), "seed": row[3], "steps": row[4]}
+
+        return self._transaction(take)
+
+    def renew(self, job_id, worker):
+        """Extend `worker`'s lease on a job; False if the claim was lost."""
+        cur = self._db().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease_seconds, job_id, worker),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id, worker, row, code=None):
+        """Store a job's KPI row. The first result wins; returns False if the job was already done."""
+        cur = self._db().execute(
+            "UPDATE jobs SET status = 'done', worker = ?, lease_until = NULL, finished = ?, code = ?,"
+            " error = NULL, result = ? WHERE id = ? AND status != 'done'",
+            (worker, time.time(), code, json.dumps(row, default=str), job_id),
+        )
+        return cur.rowcount == 1
+
+    def fail(self, job_id, worker, error):
+        """Requeue a job whose run raised, or mark it failed after max_attempts."""
+        self._db().execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+            " worker = NULL, lease_until = NULL, error = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (self.max_attempts, error, job_id, worker),
+        )
+
+    # ---- reporting ----
+    def progress(self, sweep=None):
+        """{sweep: {status: count}}"""
+        out = {}
+        query = "SELECT sweep, status, COUNT(*) FROM jobs"
+        args = ()
+        if sweep is not None:
+            query += " WHERE sweep = ?"
+            args = (sweep,)
+        for name, status, count in self._db().execute(query + " GROUP BY sweep, status", args):
+            out.setdefault(name, dict.fromkeys(STATUSES, 0))[status] = count
+        return out
+
+    def code_versions(self, sweep):
+        """Distinct simulation code versions among finished jobs; more than one means mixed results."""
+        return [r[0] for r in self._db().execute(
+            "SELECT DISTINCT code FROM jobs WHERE sweep = ? AND status = 'done'", (sweep,))]
+
+    def rows(self, sweep):
+        """KPI rows of the finished jobs, in submission order."""
+        return [json.loads(r[0]) for r in self._db().execute(
+            "SELECT result FROM jobs WHERE sweep = ? AND status = 'done' ORDER BY id", (sweep,))]
+
+    def failures(self, sweep):
+        return [{"id": i, "params": json.loads(p), "seed": s, "attempts": a, "error": e}
+                for i, p, s, a, e in self._db().execute(
+                    "SELECT id, params, seed, attempts, error FROM jobs WHERE sweep = ? AND status = 'failed'"
+                    " ORDER BY id", (sweep,))]
+
+    def reset_failed(self, sweep):
+        """Give failed jobs another max_attempts claims; returns how many."""
+        return self._db().execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, error = NULL WHERE sweep = ? AND status = 'failed'",
+            (sweep,),
+        ).rowcount
+
+
+# ---------------- Worker loop ----------------
+class _LeaseKeeper(threading.Thread):
+    """Renews a claim while the job runs; its own connection, since SQLite connections stay in one thread."""
+
+    def __init__(self, queue, job_id, worker):
+        super().__init__(daemon=True)
+        self.queue = SweepQueue(queue.path, queue.lease_seconds, queue.max_attempts)
+        self.job_id = job_id
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        while not self.stopped.wait(self.queue.lease_seconds / 3):
+            if not self.queue.renew(self.job_id, self.worker):
+                self.lost = True
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def work(queue, sweep=None, worker=None, cache=None, poll=5.0, max_jobs=None, log=print):
+    """
+    Claim and run jobs until none are left. While other workers still hold
+    claims, keep polling: their leases may expire and come back to the
+    queue. Returns the number of jobs this worker finished.
+    """
+    from headless import run_scenario
+    from result_cache import code_version
+
+    worker = worker or worker_name()
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        job = queue.claim(worker, sweep)
+        if job is None:
+            counts = queue.progress(sweep)
+            if not any(c["running"] or c["queued"] for c in counts.values()):
+                break
+            time.sleep(poll)
+            continue
+
+        keeper = _LeaseKeeper(queue, job["id"], worker)
+        keeper.start()
+        try:
+            row = run_scenario(job["params"], seed=job["seed"], steps=job["steps"], cache=cache)
+        except Exception as exc:
+            keeper.stop()
+            queue.fail(job["id"], worker, f"{type(exc).__name__}: {exc}")
+            log(f"[{worker}] job {job['id']} failed: {exc}")
+            continue
+        keeper.stop()
+        if queue.complete(job["id"], worker, row, code=code_version()):
+            done += 1
+            log(f"[{worker}] job {job['id']} done (seed {job['seed']}, revenue {row['revenue']:.2f})")
+    return done
+
+
+def _work_process(path, lease_seconds, max_attempts, sweep, cache_path, poll):
+    queue = SweepQueue(path, lease_seconds, max_attempts)
+    cache = None
+    if cache_path:
+        from result_cache import ResultCache
+        cache = ResultCache(cache_path)
+    return work(queue, sweep=sweep, cache=cache, poll=poll)
+
+
+# ---------------- CLI ----------------
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def grid_jobs(strategies, seeds, param_specs=()):
+    """(params, seed) for every strategy x parameter combination x seed; specs are "name=v1,v2"."""
+    axes = []
+    for spec in param_specs:
+        name, _, values = spec.partition("=")
+        axes.append([(name, _parse_value(v)) for v in values.split(",")])
+    jobs = []
+    for strategy in strategies:
+        for combo in itertools.product(*axes):
+            params = dict(combo, parking_strategy=strategy)
+            jobs.extend((params, seed) for seed in range(seeds))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable multi-machine sweep queue")
+    parser.add_argument("command", choices=["submit", "work", "status", "export", "retry"])
+    parser.add_argument("--db", default="sweep_queue.sqlite")
+    parser.add_argument("--name", default=None, help="sweep name (default: all sweeps, or 'sweep' for submit)")
+    parser.add_argument("--strategies", nargs="*", default=["Standard", "Dynamic Pricing", "Reservations"])
+    parser.add_argument("--seeds", type=int, default=10)
+    parser.add_argument("--steps", type=int, default=None)
+    parser.add_argument("--param", action="append", default=[], help="NAME=v1,v2,... (repeatable)")
+    parser.add_argument("--processes", type=int, default=1, help="workers to start on this machine")
+    parser.add_argument("--lease", type=float, default=600, help="seconds before an unrenewed claim is requeued")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--poll", type=float, default=5.0)
+    parser.add_argument("--cache", default=None, help="SQLite result cache shared by the workers")
+    parser.add_argument("--out", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    queue = SweepQueue(args.db, lease_seconds=args.lease, max_attempts=args.max_attempts)
+    if args.command == "submit":
+        name = args.name or "sweep"
+        added, present = queue.submit(name, grid_jobs(args.strategies, args.seeds, args.param), steps=args.steps)
+        print(f"{name}: {added} jobs added, {present} already present")
+    elif args.command == "work":
+        worker_args = (args.db, args.lease, args.max_attempts, args.name, args.cache, args.poll)
+        if args.processes <= 1:
+            _work_process(*worker_args)
+        else:
+            procs = [multiprocessing.Process(target=_work_process, args=worker_args) for _ in range(args.processes)]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+    elif args.command == "status":
+        for name, counts in queue.progress(args.name).items():
+            total = sum(counts.values())
+            print(f"{name}: {counts['done']}/{total} done, {counts['running']} running, "
+                  f"{counts['queued']} queued, {counts['failed']} failed")
+            if len(queue.code_versions(name)) > 1:
+                print(f"  warning: results come from {len(queue.code_versions(name))} different model versions")
+            for f in queue.failures(name)[:5]:
+                print(f"  failed job {f['id']} (seed {f['seed']}, {f['attempts']} attempts): {f['error']}")
+    elif args.command == "retry":
+        for name in ([args.name] if args.name else list(queue.progress())):
+            print(f"{name}: {queue.reset_failed(name)} failed jobs requeued")
+    elif args.command == "export":
+        from headless import write_rows
+        name = args.name or "sweep"
+        rows = queue.rows(name)
+        write_rows(rows, args.out)
+        print(f"{len(rows)} rows of '{name}' written to '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# test_trace_reservations.py
+"""
+Trace-driven Reservations runs: recorded reserved arrivals (walk-in
+bookings) must neither jam the barrier nor leave their bays unused.
+
+    python -m pytest -q test_trace_reservations.py
+"""
+import csv
+import random
+
+from headless import build_model
+from model import Driver
+
+
+def _write_trace(path, rate, reserved_share, steps, seed=7):
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["timestamp", "duration", "reserved", "rate_paid"])
+        for t in range(steps):
+            if rng.random() < rate:
+                duration = rng.choice([rng.randint(40, 140), rng.randint(240, 300), rng.randint(300, 500)])
+                w.writerow([t, duration, int(rng.random() < reserved_share), ""])
+    return str(path)
+
+
+def _run(strategy, trace, steps):
+    model = build_model({"parking_strategy": strategy, "demand_source": ("trace", {"path": trace})}, seed=1)
+    walk_ins = []
+    spawn = model.spawn_reserved_driver
+
+    def record(res_data):
+        drv = spawn(res_data)
+        walk_ins.append(drv)
+        return drv
+
+    model.spawn_reserved_driver = record
+    for _ in range(steps):
+        model.step()
+    waiting = sum(1 for a in model.scheduler.agents if isinstance(a, Driver) and a.state == "WAITING_AT_GATE")
+    return model, waiting, [d for d in walk_ins if d.booking is not None]
+
+
+def test_busy_trace_queues_like_standard(tmp_path):
+    trace = _write_trace(tmp_path / "busy.csv", rate=0.5, reserved_share=0.2, steps=2000)
+    _, standard_waiting, _ = _run("Standard", trace, 2000)
+    model, waiting, _ = _run("Reservations", trace, 2000)
+    assert waiting <= max(2 * standard_waiting, 30)
+    assert model.parked_count > 0
+
+
+def test_light_trace_walk_ins_reach_their_bays(tmp_path):
+    trace = _write_trace(tmp_path / "light.csv", rate=0.15, reserved_share=0.2, steps=2000)
+    model, waiting, walk_ins = _run("Reservations", trace, 2000)
+    assert walk_ins
+    stuck = [d for d in walk_ins if d in model.scheduler.agents and d.state == "WAITING_AT_GATE"]
+    assert len(stuck) <= 1
+    assert waiting < 10
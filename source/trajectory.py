@@ -0,0 +1,307 @@
+# trajectory.py
+"""
+Per-driver trajectory recording and replay.
+
+TrajectoryRecorder appends one fixed-width record per driver per step
+(step, driver id, x, y, state code) to a memory-mapped binary file. Next to
+it go a per-step offset index, a per-driver index (every driver's record
+numbers, grouped by driver) and a small JSON sidecar with the lot layout and
+each driver's first/last step and slice of the driver index.
+TrajectoryReader mmaps the file read-only, so any step or any driver can be
+read without loading the day.
+ReplayModel plays a recording back through the normal web visualization.
+
+Files for path "run1":  run1.traj  run1.steps  run1.drivers  run1.meta.json
+"""
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from mesa import Agent, Model
+from mesa.space import MultiGrid
+from mesa.time import RandomActivation
+
+from model import Driver, Gate, ParkingSpace, ReservationGate, VIPParkingSpace
+
+# step (u32), driver id (u32), x (i16), y (i16), state|flags (u8), padding
+RECORD = struct.Struct("<IIhhB3x")
+
+STATES = ["ARRIVING", "APPROACHING_GATE", "WAITING_AT_GATE", "DRIVING_TO_SPOT", "PARKED", "EXITING", "EXITED"]
+STATE_CODES = {name: i for i, name in enumerate(STATES)}
+RESERVED_FLAG = 0x80
+
+
+class TrajectoryRecorder:
+    def __init__(self, path, model, initial_records=4096):
+        self.path = path
+        self._file = open(path + ".traj", "w+b")
+        self._capacity = initial_records
+        self._file.truncate(self._capacity * RECORD.size)
+        self._mm = mmap.mmap(self._file.fileno(), self._capacity * RECORD.size)
+        self.n_records = 0
+        self.step_offsets = array("Q")   # step_offsets[i] = first record of the i-th recorded step
+        self.first_step = None
+        self.drivers = {}                # driver id -> [first_step, last_step, reserved]
+        self.driver_records = {}         # driver id -> its record numbers
+        self.meta = self._layout(model)
+        self.closed = False
+
+    @staticmethod
+    def _layout(model):
+        gates = []
+        for agent in model.scheduler.agents:
+            if isinstance(agent, Gate):
+                gates.append([agent.pos[0], agent.pos[1], agent.kind, isinstance(agent, ReservationGate)])
+        spaces = [
+            [s.unique_id, s.pos[0], s.pos[1], isinstance(s, VIPParkingSpace)]
+            for s in model.parking_spaces
+        ]
+        return {
+            "width": model.grid.width,
+            "height": model.grid.height,
+            "record_size": RECORD.size,
+            "gates": gates,
+            "spaces": spaces,
+        }
+
+    def _grow(self):
+        self._mm.flush()
+        self._mm.close()
+        self._capacity *= 2
+        self._file.truncate(self._capacity * RECORD.size)
+        self._mm = mmap.mmap(self._file.fileno(), self._capacity * RECORD.size)
+
+    def record(self, model):
+        """Append the position and state of every driver on the grid."""
+        step = model.current_step
+        if self.first_step is None:
+            self.first_step = step
+        self.step_offsets.append(self.n_records)
+
+        for agent in model.scheduler.agents:
+            if not isinstance(agent, Driver) or agent.pos is None:
+                continue
+            if self.n_records >= self._capacity:
+                self._grow()
+            code = STATE_CODES.get(agent.state, 0)
+            if agent.is_reserved:
+                code |= RESERVED_FLAG
+            RECORD.pack_into(self._mm, self.n_records * RECORD.size,
+                             step, agent.unique_id, agent.pos[0], agent.pos[1], code)
+            self.n_records += 1
+
+            seen = self.drivers.get(agent.unique_id)
+            if seen is None:
+                self.drivers[agent.unique_id] = [step, step, bool(agent.is_reserved)]
+                self.driver_records[agent.unique_id] = array("Q")
+            else:
+                seen[1] = step
+            self.driver_records[agent.unique_id].append(self.n_records - 1)
+
+    def close(self):
+        if self.closed:
+            return
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(self.n_records * RECORD.size)
+        self._file.close()
+        with open(self.path + ".steps", "wb") as f:
+            self.step_offsets.tofile(f)
+        # Each driver's entry gains [offset, count] into the .drivers index
+        offset = 0
+        with open(self.path + ".drivers", "wb") as f:
+            for driver_id, records in self.driver_records.items():
+                records.tofile(f)
+                self.drivers[driver_id][3:] = [offset, len(records)]
+                offset += len(records)
+        meta = dict(self.meta)
+        meta["first_step"] = self.first_step if self.first_step is not None else 0
+        meta["n_steps"] = len(self.step_offsets)
+        meta["n_records"] = self.n_records
+        meta["drivers"] = {str(k): v for k, v in self.drivers.items()}
+        with open(self.path + ".meta.json", "w") as f:
+            json.dump(meta, f)
+        self.closed = True
+
+    def __call__(self, model):
+        # Lets the recorder be used directly as a model step observer
+        self.record(model)
+
+
+class TrajectoryReader:
+    def __init__(self, path):
+        with open(path + ".meta.json") as f:
+            self.meta = json.load(f)
+        self.offsets = array("Q")
+        with open(path + ".steps", "rb") as f:
+            self.offsets.frombytes(f.read())
+        # Recordings made before the per-driver index have no .drivers file
+        self.driver_index = None
+        if os.path.exists(path + ".drivers"):
+            self.driver_index = array("Q")
+            with open(path + ".drivers", "rb") as f:
+                self.driver_index.frombytes(f.read())
+        self.n_records = self.meta["n_records"]
+        self.first_step = self.meta["first_step"]
+        self._file = open(path + ".traj", "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.n_records else None
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    @property
+    def n_steps(self):
+        return len(self.offsets)
+
+    def _range(self, step):
+        i = step - self.first_step
+        if not 0 <= i < len(self.offsets):
+            return 0, 0
+        start = self.offsets[i]
+        end = self.offsets[i + 1] if i + 1 < len(self.offsets) else self.n_records
+        return start, end
+
+    @staticmethod
+    def _decode(raw):
+        step, driver_id, x, y, code = raw
+        return {
+            "step": step,
+            "id": driver_id,
+            "x": x,
+            "y": y,
+            "state": STATES[code & ~RESERVED_FLAG],
+            "reserved": bool(code & RESERVED_FLAG),
+        }
+
+    def step(self, step):
+        """Every driver's record at `step`."""
+        start, end = self._range(step)
+        return [self._decode(RECORD.unpack_from(self._mm, i * RECORD.size)) for i in range(start, end)]
+
+    def driver(self, driver_id):
+        """One driver's records from its first to its last recorded step."""
+        span = self.meta["drivers"].get(str(driver_id))
+        if span is None:
+            return []
+        if self.driver_index is not None and len(span) >= 5:
+            offset, count = span[3], span[4]
+            return [self._decode(RECORD.unpack_from(self._mm, i * RECORD.size))
+                    for i in self.driver_index[offset:offset + count]]
+        out = []
+        for step in range(span[0], span[1] + 1):
+            start, end = self._range(step)
+            for i in range(start, end):
+                raw = RECORD.unpack_from(self._mm, i * RECORD.size)
+                if raw[1] == driver_id:
+                    out.append(self._decode(raw))
+                    break
+        return out
+
+    def driver_summary(self, driver_id):
+        """Arrival, queue time, drive time and exit step reconstructed from states."""
+        records = self.driver(driver_id)
+        if not records:
+            return None
+        counts = {}
+        parked_at = None
+        for r in records:
+            counts[r["state"]] = counts.get(r["state"], 0) + 1
+            if r["state"] == "PARKED" and parked_at is None:
+                parked_at = r["step"]
+        return {
+            "id": driver_id,
+            "arrival_step": records[0]["step"],
+            "exit_step": records[-1]["step"],
+            "queue_steps": counts.get("WAITING_AT_GATE", 0),
+            "drive_steps": counts.get("APPROACHING_GATE", 0) + counts.get("DRIVING_TO_SPOT", 0),
+            "parked_step": parked_at,
+            "parked_steps": counts.get("PARKED", 0),
+            "exit_drive_steps": counts.get("EXITING", 0),
+            "reserved": records[0]["reserved"],
+        }
+
+
+# ---------------- Replay ----------------
+class ReplayDriver(Driver):
+    """A Driver that is only moved by the replay, never steps itself."""
+
+    def step(self):
+        pass
+
+
+class ReplayModel(Model):
+    """Replays a recorded run on a grid the normal portrayal can draw."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.reader = TrajectoryReader(path)
+        meta = self.reader.meta
+        self.grid = MultiGrid(meta["width"], meta["height"], torus=False)
+        self.scheduler = RandomActivation(self)
+        self.day_length_steps = meta["n_steps"]
+        self.current_step = self.reader.first_step - 1
+        self.occupied_count = 0
+        self.booking_engine = None       # read by ParkingSpace.release
+
+        for x, y, kind, is_reservation in meta["gates"]:
+            gate = ReservationGate(self.next_id(), self, (x, y)) if is_reservation else Gate(self.next_id(), self, (x, y), kind)
+            self.grid.place_agent(gate, (x, y))
+            self.scheduler.add(gate)
+
+        self.parking_spaces = []
+        self.space_at = {}
+        for _, x, y, _vip in meta["spaces"]:
+            space = ParkingSpace(self.next_id(), self, (x, y))
+            self.grid.place_agent(space, (x, y))
+            self.scheduler.add(space)
+            self.parking_spaces.append(space)
+            self.space_at[(x, y)] = space
+
+        self.drivers = {}
+
+    def step(self):
+        self.current_step += 1
+        records = self.reader.step(self.current_step)
+        if not records and self.current_step >= self.reader.first_step + self.reader.n_steps:
+            self.running = False
+            return
+
+        seen = set()
+        for r in records:
+            seen.add(r["id"])
+            drv = self.drivers.get(r["id"])
+            pos = (r["x"], r["y"])
+            if drv is None:
+                drv = ReplayDriver(r["id"], self, reserved=r["reserved"])
+                self.drivers[r["id"]] = drv
+                self.grid.place_agent(drv, pos)
+                self.scheduler.add(drv)
+            elif drv.pos != pos:
+                self.grid.move_agent(drv, pos)
+            drv.state = r["state"]
+
+        for driver_id in [d for d in self.drivers if d not in seen]:
+            drv = self.drivers.pop(driver_id)
+            self.grid.remove_agent(drv)
+            self.scheduler.remove(drv)
+
+        # Bays are occupied where a driver is parked
+        parked = {(r["x"], r["y"]): r for r in records if r["state"] == "PARKED"}
+        for pos, space in self.space_at.items():
+            if pos in parked and not space.occupied:
+                space.occupy(self.drivers[parked[pos]["id"]])
+            elif pos not in parked and space.occupied:
+                space.release()
+
+
+def replay_summary(path):
+    """driver_summary() for every driver in a recording."""
+    reader = TrajectoryReader(path)
+    try:
+        return [reader.driver_summary(int(d)) for d in reader.meta["drivers"]]
+    finally:
+        reader.close()